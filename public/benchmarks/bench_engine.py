@@ -0,0 +1,53 @@
+# benchmarks/bench_engine.py — dict vs array engine for one simulated year
+#
+#   cd public && python -m benchmarks.bench_engine [--sizes 100 10000 100000] [--repeat 3]
+#
+# Builds a random baseline of N units, runs simulate_one_year (dict) and
+# simulate_one_year_arrays (array) from the same state with events on, checks
+# that both produce the same states / score, and prints the best wall time.
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from clinicsim.model import E_MAX_BASE, PC50_BASE, simulate_one_year
+from clinicsim.engine import states_to_arrays, slopes_to_matrix, simulate_one_year_arrays
+from clinicsim.synthetic import make_engine_state
+
+SPLITS = {"clinics": 25, "campaigns": 35, "jobs": 30, "equity": 10}
+
+
+def best_of(fn, repeat):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter(); out = fn(); best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def run(sizes, repeat):
+    budget = 30_000_000 * 1.0
+    print(f"{'units':>8} {'dict (s)':>10} {'array (s)':>10} {'speedup':>8}  max|diff|  score")
+    for n in sizes:
+        zips, states, slopes = make_engine_state(n)
+        # Budget scales with units so per-capita spending stays comparable
+        kw = dict(city_budget=budget * n / 95, splits=SPLITS, floor_pc=30.0,
+                  E_MAX=E_MAX_BASE, PC50=PC50_BASE, events_on=True, eff_mult=1.0)
+        t_dict, (st_d, df_d, sc_d) = best_of(
+            lambda: simulate_one_year(2025, states, slopes, rng=random.Random("stable-seed"), **kw), repeat)
+        arr, sl_mat = states_to_arrays(states, zips), slopes_to_matrix(slopes, zips)
+        t_arr, (st_a, _ya, sc_a) = best_of(
+            lambda: simulate_one_year_arrays(2025, arr, sl_mat, rng=random.Random("stable-seed"), **kw), repeat)
+        ref = states_to_arrays(st_d, zips)
+        diff = max(float(np.abs(ref.values - st_a.values).max()),
+                   float(np.abs(ref.population - st_a.population).max() / ref.population.max()))
+        print(f"{n:>8} {t_dict:>10.4f} {t_arr:>10.4f} {t_dict/t_arr:>7.1f}x  {diff:.1e}  {sc_d} / {sc_a}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark dict vs array engine")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    run(args.sizes, args.repeat)
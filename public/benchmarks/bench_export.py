@@ -0,0 +1,80 @@
+# benchmarks/bench_export.py — in-memory to_csv vs streamed export of a long run
+#
+#   cd public && python -m benchmarks.bench_export [--units 10000] [--years 30]
+#
+# Simulates `--years` years (events on) from a synthetic baseline into a
+# HistoryBuffer, then runs each export in a fresh subprocess so the RSS
+# high-water mark above the built buffer is that export's own peak
+# (tracemalloc makes to_csv minutes slower, so it is not used here):
+#
+#   to_csv         to_frame().to_csv().encode()  (the old export: whole frame,
+#                  whole string, then a bytes copy)
+#   csv / csv.gz / parquet / parquet-years      clinicsim.export.export_file over
+#                  iter_frames chunks, output read back as bytes like
+#                  st.download_button does
+
+import argparse
+import json
+import random
+import subprocess
+import sys
+import time
+
+from clinicsim.synthetic import make_wide_baseline
+from clinicsim.data import load_hist
+from clinicsim.ingest import prepare_hist
+from clinicsim.model import slope_medians
+from clinicsim.tuning import stability_tune_solve
+from clinicsim.scenarios import DEFAULTS, baseline_state
+from clinicsim.engine import slope_matrix, simulate_one_year_arrays
+from clinicsim.history import HistoryBuffer
+from clinicsim.export import export_formats, export_file
+from benchmarks.bench_ingest_scale import _peak_rss_mb
+
+
+def simulated_history(units, years, seed=0):
+    hist = prepare_hist(load_hist(make_wide_baseline(units=units, seed=seed)))
+    arr = baseline_state(hist, 2025)
+    sl = slope_matrix(hist, arr.zips)
+    splits, budget = DEFAULTS["splits"], DEFAULTS["city_budget"]
+    floor_pc, E_MAX, PC50, _ = stability_tune_solve(slope_medians(hist), float(arr.population.mean()), budget, splits)
+    buf, rng = HistoryBuffer(arr.zips, capacity=years, population=arr.population), random.Random(seed)
+    for y in range(2026, 2026 + years):
+        arr, out, _ = simulate_one_year_arrays(y, arr, sl, budget, splits, floor_pc, E_MAX, PC50, True, 1.0, rng)
+        buf.append_arrays(y, out.values, out.population, out.pc, out.events, out.spend)
+    return buf
+
+def cases(buf):
+    out = {"to_csv": lambda: buf.to_frame().to_csv(index=False).encode("utf-8")}
+    for fmt in export_formats():
+        out[fmt] = lambda fmt=fmt: export_file(buf.iter_frames(buf.chunk_years()), fmt).read()
+    return out
+
+def _measure(units, years, case):
+    """Runs in the child: build the history, run one export, print a JSON record."""
+    buf = simulated_history(units, years)
+    rss0 = _peak_rss_mb()
+    t0 = time.perf_counter()
+    size = len(cases(buf)[case]())
+    secs = time.perf_counter() - t0
+    print(json.dumps({"seconds": secs, "rss_delta_mb": _peak_rss_mb() - rss0, "bytes": size,
+                      "rows": buf.n * len(buf.zips), "buffer_mb": buf.used_bytes / 2**20}))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark result export")
+    ap.add_argument("--units", type=int, default=10_000)
+    ap.add_argument("--years", type=int, default=30)
+    ap.add_argument("--measure", metavar="CASE", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.measure:
+        _measure(args.units, args.years, args.measure)
+        sys.exit(0)
+
+    print(f"{args.years} years × {args.units:,} units = {args.years * args.units:,} rows")
+    print(f"{'export':<14} {'seconds':>8} {'Δ RSS MB':>9} {'file MB':>8}")
+    for name in ["to_csv", *export_formats()]:
+        out = subprocess.run([sys.executable, "-m", "benchmarks.bench_export", "--units", str(args.units),
+                              "--years", str(args.years), "--measure", name], capture_output=True, text=True, check=True)
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{name:<14} {r['seconds']:>8.2f} {r['rss_delta_mb']:>9.1f} {r['bytes'] / 2**20:>8.1f}")
@@ -0,0 +1,51 @@
+# benchmarks/bench_impute.py — impute_groupwise vs impute_groupwise_fast on a synthetic panel
+#
+#   cd public && python -m benchmarks.bench_impute [--rows 1000000] [--missing 0.2] [--skip-reference]
+#
+# Long-format panel of units × 12 years × 9 columns (8 indicators + population),
+# shuffled, with a share of values knocked out at random and a few units whose
+# whole series is missing (so every fill strategy gets exercised).
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from clinicsim.model import INDICATORS
+from clinicsim.data import impute_groupwise, impute_groupwise_fast
+
+COLS = [n for n,_,_ in INDICATORS] + ["population"]
+
+
+def make_panel(rows, years=12, missing=0.2, seed=0):
+    rs = np.random.default_rng(seed)
+    units = max(1, rows // years)
+    df = pd.DataFrame({"zip": np.repeat([f"{i:06d}" for i in range(units)], years),
+                       "year": np.tile(np.arange(2013, 2013 + years), units)})
+    for c in COLS:
+        v = rs.uniform(0, 1, len(df)) if c != "population" else rs.lognormal(9.5, 1.0, len(df))
+        v[rs.random(len(df)) < missing] = np.nan
+        v[np.repeat(rs.random(units) < 0.01, years)] = np.nan     # ~1% of units with no data at all
+        df[c] = v
+    return df.sample(frac=1.0, random_state=seed).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark groupwise imputation")
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--missing", type=float, default=0.2)
+    ap.add_argument("--skip-reference", action="store_true", help="only time the fast path")
+    args = ap.parse_args()
+
+    df = make_panel(args.rows, missing=args.missing)
+    print(f"panel: {len(df):,} rows, {df['zip'].nunique():,} units, {int(df[COLS].isna().sum().sum()):,} gaps")
+    report = {}
+    t0 = time.perf_counter(); fast = impute_groupwise_fast(df, "zip", COLS, report=report); t_fast = time.perf_counter() - t0
+    print(f"fast:      {t_fast:8.3f} s")
+    for strategy, per_col in report.items():
+        print(f"  {strategy:<12} {sum(per_col.values()):>10,}")
+    if not args.skip_reference:
+        t0 = time.perf_counter(); ref = impute_groupwise(df, "zip", COLS); t_ref = time.perf_counter() - t0
+        diff = float(np.nanmax(np.abs(ref[COLS].to_numpy(float) - fast[COLS].to_numpy(float))))
+        print(f"reference: {t_ref:8.3f} s   speedup {t_ref/t_fast:.1f}x   max|diff| {diff:.1e}")
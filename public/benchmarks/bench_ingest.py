@@ -0,0 +1,26 @@
+# benchmarks/bench_ingest.py — cold vs warm load of the bundled (or given) CSVs
+#
+#   cd public && python -m benchmarks.bench_ingest [--hist path.csv] [--index path.csv]
+#
+# cold    = hash + parse + load_hist/impute/normalize pipeline
+# sidecar = typed Parquet/pickle sidecar read back from the cache dir
+# memory  = process-wide dict hit (what a Streamlit rerun pays)
+
+import argparse
+from pathlib import Path
+
+from clinicsim.ingest import timing_report, HAVE_PARQUET
+
+HERE = Path(__file__).resolve().parent.parent
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Cold vs warm ingest timing")
+    ap.add_argument("--hist", default=str(HERE / "combined_all_zip_data.csv"))
+    ap.add_argument("--index", default=str(HERE / "index_2025_predictions.csv"))
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    print(f"sidecar format: {'parquet' if HAVE_PARQUET else 'pickle'}")
+    for what, path in (("index", args.index), ("hist", args.hist)):
+        rep = timing_report(path, what=what, repeat=args.repeat)
+        print(f"{what:>6}: " + "  ".join(f"{k} {1000*v:8.2f} ms" for k, v in rep.items()))
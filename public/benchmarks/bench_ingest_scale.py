@@ -0,0 +1,77 @@
+# benchmarks/bench_ingest_scale.py — full vs chunked historical ingest at national scale
+#
+#   cd public && python -m benchmarks.bench_ingest_scale [--units 1000 10000 33000] [--years 26]
+#
+# Writes a synthetic wide CSV per size (clinicsim.synthetic: the bundled
+# file's column spellings, `--years` year columns per metric), then loads it
+# in a fresh subprocess per (size, mode) so the RSS high-water mark (VmHWM) is
+# that load's own peak.
+# "traced MB" is the tracemalloc peak of a second, traced load:
+#
+#   full    = load_hist(read_csv_flex(path))   (whole wide frame in memory)
+#   chunked = read_hist_chunked(path)          (header schema, usecols, dtypes)
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from clinicsim.synthetic import write_wide_baseline
+
+
+def _peak_rss_mb():
+    """Process RSS high-water mark; VmHWM resets on exec, ru_maxrss (the fallback) may not."""
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(path, mode):
+    """Runs in the child: load once for time/RSS, once more under tracemalloc; print a JSON record."""
+    import tracemalloc
+    from clinicsim.data import load_hist, read_csv_flex, read_hist_chunked
+    load = (lambda: load_hist(read_csv_flex(path))) if mode == "full" else (lambda: read_hist_chunked(path))
+    rss0 = _peak_rss_mb()
+    t0 = time.perf_counter()
+    df = load()
+    secs = time.perf_counter() - t0
+    rss1 = _peak_rss_mb()
+    del df
+    tracemalloc.start()
+    rows = len(load())
+    traced = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    print(json.dumps({"rows": rows, "seconds": secs, "rss_mb": rss1, "rss_delta_mb": rss1 - rss0, "traced_mb": traced}))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Full vs chunked ingest of synthetic national-scale wide CSVs")
+    ap.add_argument("--units", type=int, nargs="+", default=[1_000, 10_000, 33_000])
+    ap.add_argument("--years", type=int, default=26, help="year columns per metric")
+    ap.add_argument("--measure", nargs=2, metavar=("PATH", "MODE"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.measure:
+        _measure(*args.measure)
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory(prefix="clinicsim-scale-") as tmp:
+        print(f"{'units':>7} {'file MB':>8} {'cols':>5}  {'mode':<8} {'load s':>7} {'peak RSS MB':>12} {'Δ RSS MB':>9} {'traced MB':>10}")
+        for units in args.units:
+            path = write_wide_baseline(Path(tmp) / f"wide_{units}.csv", units=units, years=args.years, missing=0.0)
+            ncols = len(pd.read_csv(path, nrows=0).columns)
+            for mode in ("full", "chunked"):
+                out = subprocess.run([sys.executable, "-m", "benchmarks.bench_ingest_scale", "--measure", str(path), mode],
+                                     capture_output=True, text=True, check=True)
+                r = json.loads(out.stdout.strip().splitlines()[-1])
+                print(f"{units:>7} {path.stat().st_size / 2**20:>8.1f} {ncols:>5}  {mode:<8} {r['seconds']:>7.2f} "
+                      f"{r['rss_mb']:>12.1f} {r['rss_delta_mb']:>9.1f} {r['traced_mb']:>10.1f}")
@@ -0,0 +1,78 @@
+# benchmarks/bench_state.py — per-session state: dict of per-ZIP dicts vs StateTable
+#
+#   cd public && python -m benchmarks.bench_state [--sizes 1000 33000 100000] [--repeat 3]
+#
+# Bytes are tracemalloc growth while building one session's state, per unit:
+#
+#   start   what a new session stores: {z: state0[z].copy()} (dict) or a
+#           reference to the shared baseline table (StateTable)
+#   run     what a session stores after a run: arrays_to_states(new_arr)
+#           (fresh boxed floats) or table0.replace(new_arr) (the step's arrays)
+#
+# Serialization is pickle of each, and StateTable.to_bytes (.npz, no pickle);
+# KB of payload and best-of --repeat milliseconds to dump + load.
+
+import argparse
+import pickle
+import time
+import tracemalloc
+
+import numpy as np
+
+from clinicsim.engine import IND_NAMES, StateArrays, StateTable, arrays_to_states
+
+
+def make_arrays(n_units, seed=0):
+    rs = np.random.default_rng(seed)
+    zips = [f"{i:05d}" for i in range(n_units)]
+    return StateArrays(zips, rs.uniform(0.05, 0.9, size=(n_units, len(IND_NAMES))), rs.lognormal(9.5, 1.0, size=n_units))
+
+
+def traced_bytes(fn):
+    """Bytes still allocated by fn()'s result (tracemalloc, current after - before)."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    out = fn()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, out
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter(); fn(); best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def roundtrip(dump, load, obj, repeat):
+    data = dump(obj)
+    return len(data), best_of(lambda: load(dump(obj)), repeat)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark session state memory and serialization")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 33000, 100000])
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    print(f"{'units':>7} {'repr':<10} {'start B/unit':>12} {'run B/unit':>11} {'pickle KB':>10} {'ms':>7} "
+          f"{'npz KB':>8} {'ms':>7}")
+    for n in args.sizes:
+        arr0 = make_arrays(n)
+        state0 = arrays_to_states(arr0)
+        table0 = StateTable.from_arrays(arr0)
+        stepped = lambda: StateArrays(arr0.zips, arr0.values + 1e-3, arr0.population * 1.001)   # a step's output
+
+        d_start, _ = traced_bytes(lambda: {z: state0[z].copy() for z in arr0.zips})
+        d_run, d_states = traced_bytes(lambda: arrays_to_states(stepped()))
+        t_start, _ = traced_bytes(lambda: table0.replace(table0.to_arrays()))
+        t_run, t_table = traced_bytes(lambda: table0.replace(stepped()))
+
+        d_pk = roundtrip(lambda o: pickle.dumps(o, protocol=pickle.HIGHEST_PROTOCOL), pickle.loads, d_states, args.repeat)
+        t_pk = roundtrip(lambda o: pickle.dumps(o, protocol=pickle.HIGHEST_PROTOCOL), pickle.loads, t_table, args.repeat)
+        t_npz = roundtrip(StateTable.to_bytes, StateTable.from_bytes, t_table, args.repeat)
+        print(f"{n:>7} {'dict':<10} {d_start / n:>12.1f} {d_run / n:>11.1f} {d_pk[0] / 1024:>10.0f} "
+              f"{1000 * d_pk[1]:>7.1f} {'—':>8} {'—':>7}")
+        print(f"{n:>7} {'StateTable':<10} {t_start / n:>12.1f} {t_run / n:>11.1f} {t_pk[0] / 1024:>10.0f} "
+              f"{1000 * t_pk[1]:>7.1f} {t_npz[0] / 1024:>8.0f} {1000 * t_npz[1]:>7.1f}")
@@ -0,0 +1,186 @@
+# benchmarks/bench_warmup.py — many analysts opening the app at once on a cold server
+#
+#   cd public && python -m benchmarks.bench_warmup [--sessions 50] [--units 33000]
+#
+# Each mode starts a fresh headless `streamlit run` server with an empty
+# cache dir. --sessions websocket clients then connect at the same moment and
+# speak the browser's protocol (BackMsg / ForwardMsg protobufs). Each client
+# times, from its first rerun request:
+#
+#   interactive   the last sidebar control (the 🎯 sensitivity button) has arrived
+#   ready         the first metric of the main area (the baseline is loaded)
+#   finished      script_finished of the first run
+#   horizon       a click on "Run N years" with the default settings, request to
+#                 script_finished (a trajectory-cache hit once the default
+#                 scenario is warm)
+#
+# Memory is the server's resident set (VmRSS): "server" is its growth from
+# idle to the end of the first wave (imports, baseline, caches and the wave's
+# sessions), "per session" the growth per session of a second, equally large
+# wave opened while the first stays connected. With --units the app reads a
+# synthetic baseline of that many ZIPs (CLINICSIM_HIST).
+#
+#   inline     CLINICSIM_WARMUP=0: sessions load the baseline themselves
+#              (per-key build locks still keep it to one build)
+#   warmup     the first session starts the background warm-up; the others
+#              render their controls and wait for it
+#   prefilled  `python -m clinicsim warmup` ran before the server started
+#              (ingest sidecars on disk), then as warmup
+#
+# Before this change the controls were rendered only after the baseline, so
+# the old time to first interactive is the inline "ready" column.
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+APP = Path(__file__).resolve().parent.parent / "streamlit_app.py"
+MODES = ("inline", "warmup", "prefilled")
+
+
+# ---------------- Server ----------------
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+def start_server(env, port, timeout=60):
+    proc = subprocess.Popen([sys.executable, "-m", "streamlit", "run", str(APP), "--server.headless", "true",
+                             "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+                            cwd=APP.parent, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < timeout:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("streamlit server did not start")
+
+
+# ---------------- Client ----------------
+class Session:
+    """One browser tab: a websocket that requests reruns and times the ForwardMsgs of each."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.buttons = {}
+
+    def rerun(self, trigger=None):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        if trigger is not None:
+            w = msg.rerun_script.widget_states.widgets.add()
+            w.id, w.trigger_value = self.buttons[trigger], True
+        t0 = time.perf_counter()
+        self.ws.send(msg.SerializeToString())
+        marks = {}
+        while True:
+            f = ForwardMsg()
+            f.ParseFromString(self.ws.recv(timeout=900))
+            kind = f.WhichOneof("type")
+            if kind == "delta" and f.delta.WhichOneof("type") == "new_element":
+                el = f.delta.new_element
+                if el.WhichOneof("type") == "button":
+                    self.buttons[el.button.label] = el.button.id
+                    if el.button.label.startswith("🎯"): marks.setdefault("interactive", time.perf_counter() - t0)
+                elif el.WhichOneof("type") == "metric" and f.metadata.delta_path[0] == 0:
+                    marks.setdefault("ready", time.perf_counter() - t0)
+            elif kind == "script_finished":
+                marks["finished"] = time.perf_counter() - t0
+                return marks
+
+
+def run_mode(mode, sessions, hist, cache_dir):
+    env = dict(os.environ, CLINICSIM_CACHE_DIR=str(cache_dir))
+    if hist: env["CLINICSIM_HIST"] = str(hist)
+    if mode == "inline": env["CLINICSIM_WARMUP"] = "0"
+    if mode == "prefilled":
+        args = ["--hist", str(hist)] if hist else []
+        subprocess.run([sys.executable, "-m", "clinicsim", "warmup", "-q", *args], cwd=APP.parent, env=env, check=True)
+    port = _free_port()
+    proc = start_server(env, port)
+    hold = threading.Event()             # tabs stay connected until both waves are measured
+
+    def client(i, out, barrier, done):
+        from websockets.sync.client import connect
+        barrier.wait()
+        try:
+            with connect(f"ws://127.0.0.1:{port}/_stcore/stream", subprotocols=["streamlit"], max_size=None,
+                         ping_interval=None, open_timeout=120) as ws:
+                s = Session(ws)
+                first = s.rerun()
+                horizon_btn = next(b for b in s.buttons if b.startswith("⏩"))
+                out[i] = dict(first, horizon=s.rerun(trigger=horizon_btn)["finished"])
+                done.release()
+                hold.wait()
+        except Exception as e:
+            out[i] = {"error": f"{type(e).__name__}: {e}"}
+            done.release()
+
+    def wave():
+        out, barrier, done = [None] * sessions, threading.Barrier(sessions), threading.Semaphore(0)
+        threads = [threading.Thread(target=client, args=(i, out, barrier, done), daemon=True) for i in range(sessions)]
+        for t in threads: t.start()
+        for _ in threads: done.acquire()
+        time.sleep(1.0)
+        return out, threads
+
+    try:
+        rss = {"idle": _rss_mb(proc.pid)}
+        out, threads = wave()
+        rss["first"] = _rss_mb(proc.pid)
+        _, more = wave()
+        rss["second"] = _rss_mb(proc.pid)
+        hold.set()
+        for t in threads + more: t.join(timeout=30)
+    finally:
+        hold.set()
+        proc.terminate(); proc.wait(timeout=30)
+    return out, rss
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark cold-start time to first interactive")
+    ap.add_argument("--sessions", type=int, default=50)
+    ap.add_argument("--units", type=int, default=None, help="synthetic baseline size (default: the bundled file)")
+    ap.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="clinicsim-warmup-") as tmp:
+        hist = None
+        if args.units:
+            from clinicsim.synthetic import write_wide_baseline
+            hist = write_wide_baseline(Path(tmp) / "baseline.csv", units=args.units, years=12, seed=0)
+        print(f"{args.sessions} sessions at once, {args.units or 'bundled'} units; seconds as p50 / p95")
+        print(f"{'mode':<10} {'interactive':>13} {'ready':>13} {'finished':>13} {'horizon':>13} "
+              f"{'server MB':>10} {'MB/session':>11}")
+        for mode in args.modes:
+            out, rss = run_mode(mode, args.sessions, hist, Path(tmp) / f"cache-{mode}")
+            ok = [o for o in out if "error" not in o]
+            def pct(key):
+                v = [o[key] for o in ok if key in o]
+                return f"{np.percentile(v, 50):6.2f}/{np.percentile(v, 95):<6.2f}" if v else f"{'—':>13}"
+            per = (rss["second"] - rss["first"]) / args.sessions
+            print(f"{mode:<10} {pct('interactive'):>13} {pct('ready'):>13} {pct('finished'):>13} {pct('horizon'):>13} "
+                  f"{rss['first'] - rss['idle']:>10.0f} {per:>11.2f}")
+            errors = sorted({o["error"] for o in out if "error" in o})
+            if errors: print(f"  {len(out) - len(ok)} session errors: {errors[:3]}")
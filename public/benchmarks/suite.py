@@ -0,0 +1,155 @@
+# benchmarks/suite.py — reproducible timing suite with stored results and regression flags
+#
+#   cd public && python -m benchmarks.suite [--scales 1000 10000] [--repeat 5] [--save] [--threshold 0.25]
+#
+# For each scale a synthetic baseline (clinicsim.synthetic, fixed seed) is
+# written to a scratch CSV. The suite times, best of --repeat:
+#
+#   ingest        read_hist_source, full and chunked
+#   impute        prepare_hist (indicator defaults, groupwise imputation, slope normalization)
+#   tune          slope_medians + stability_tune_solve over 25 budgets
+#   year          one simulate_one_year_arrays step, events on
+#   horizon       run_horizon for 10 years (includes the long frame)
+#   score         compute_score_arrays and compute_score_batch on a (64, U, K) batch
+#
+# Every run is compared with the per-case median of the last --window saved
+# runs on the same machine (benchmarks/results/<host>.jsonl, git-ignored), and
+# cases slower than --threshold are flagged. --save appends this run; --fail
+# exits with status 1 when anything regressed.
+
+import argparse
+import gc
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from clinicsim.synthetic import write_wide_baseline
+from clinicsim.ingest import read_hist_source, prepare_hist
+from clinicsim.model import slope_medians
+from clinicsim.tuning import stability_tune_solve
+from clinicsim.scenarios import DEFAULTS, baseline_state
+from clinicsim.engine import slope_matrix, simulate_one_year_arrays, run_horizon, compute_score_arrays, compute_score_batch
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+SUITE_VERSION = 1      # bump when cases change meaning, so old results are not compared
+
+
+def best_of(fn, repeat, min_time=0.1):
+    """Best per-call seconds; calls are looped so one measurement lasts at least min_time (GC off, like timeit)."""
+    t0 = time.perf_counter(); fn(); once = time.perf_counter() - t0
+    loops = max(1, int(min_time / max(once, 1e-9)))
+    best = once
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            for _ in range(loops): fn()
+            best = min(best, (time.perf_counter() - t0) / loops)
+    finally:
+        gc.enable()
+    return best
+
+
+def run_scale(units, repeat, tmp):
+    path = write_wide_baseline(Path(tmp) / f"baseline_{units}.csv", units=units, years=12, missing=0.1, seed=units)
+    raw = read_hist_source(path, chunked=False)
+    hist = prepare_hist(raw)
+    arr = baseline_state(hist, 2025)
+    sl = slope_matrix(hist, arr.zips)
+    med, mean_pop = slope_medians(hist), float(arr.population.mean())
+    splits, budget = DEFAULTS["splits"], DEFAULTS["city_budget"]
+    floor_pc, E_MAX, PC50, _ = stability_tune_solve(med, mean_pop, budget, splits)
+    batch = np.broadcast_to(arr.values, (64,) + arr.values.shape)
+
+    cases = {
+        "ingest/full": lambda: read_hist_source(path, chunked=False),
+        "ingest/chunked": lambda: read_hist_source(path, chunked=True),
+        "impute": lambda: prepare_hist(raw),
+        "tune": lambda: [stability_tune_solve(slope_medians(hist), mean_pop, b, splits)
+                         for b in np.linspace(5e6, 5e8, 25)],
+        "year": lambda: simulate_one_year_arrays(2025, arr, sl, budget, splits, floor_pc, E_MAX, PC50, True, 1.0,
+                                                 random.Random(0)),
+        "horizon": lambda: run_horizon(arr, sl, 10, 2025, budget, splits, floor_pc, E_MAX, PC50, False, 1.0,
+                                       random.Random(0)),
+        "score/arrays": lambda: compute_score_arrays(arr.values, arr.population),
+        "score/batch": lambda: compute_score_batch(batch),
+    }
+    return {f"{units}/{name}": best_of(fn, repeat) for name, fn in cases.items()}
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def results_path():
+    return RESULTS_DIR / f"{platform.node() or 'local'}.jsonl"
+
+def load_runs(path=None):
+    path = Path(path or results_path())
+    if not path.exists(): return []
+    runs = [json.loads(line) for line in path.read_text().splitlines() if line.strip()]
+    return [r for r in runs if r.get("suite_version") == SUITE_VERSION]
+
+def reference(runs, window=3):
+    """Per-case median of the last `window` runs."""
+    ref = {}
+    for r in runs[-window:]:
+        for name, secs in r["cases"].items(): ref.setdefault(name, []).append(secs)
+    return {name: float(np.median(v)) for name, v in ref.items()}
+
+def compare(cases, previous, threshold):
+    """[(case, prev_s, now_s, ratio, flag)] against reference timings."""
+    rows = []
+    for name, now in cases.items():
+        prev = previous.get(name)
+        ratio = now / prev if prev else None
+        flag = "" if ratio is None else "REGRESSION" if ratio > 1 + threshold else "faster" if ratio < 1 - threshold else ""
+        rows.append((name, prev, now, ratio, flag))
+    return rows
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Timing suite on synthetic baselines")
+    ap.add_argument("--scales", type=int, nargs="+", default=[1_000, 10_000])
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--threshold", type=float, default=0.25, help="flag cases this much slower (0.25 = +25%%)")
+    ap.add_argument("--window", type=int, default=3, help="saved runs in the reference median")
+    ap.add_argument("--save", action="store_true", help="append this run to benchmarks/results/<host>.jsonl")
+    ap.add_argument("--fail", action="store_true", help="exit 1 if any case regressed")
+    args = ap.parse_args()
+
+    cases = {}
+    with tempfile.TemporaryDirectory(prefix="clinicsim-suite-") as tmp:
+        for units in args.scales:
+            cases.update(run_scale(units, args.repeat, tmp))
+
+    runs = load_runs()[-args.window:]
+    rows = compare(cases, reference(runs, args.window), args.threshold)
+    against = ", ".join(f"{r['created']} ({r.get('commit') or 'no commit'})" for r in runs) or "none saved"
+    print(f"compared with: {against}")
+    print(f"{'case':<24} {'ref ms':>10} {'now ms':>10} {'ratio':>7}")
+    for name, prev, now, ratio, flag in rows:
+        p = f"{1000 * prev:10.3f}" if prev else f"{'—':>10}"
+        r = f"{ratio:7.2f}" if ratio else f"{'':>7}"
+        print(f"{name:<24} {p} {1000 * now:10.3f} {r}  {flag}")
+
+    if args.save:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        rec = {"suite_version": SUITE_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": _commit(),
+               "python": platform.python_version(), "numpy": np.__version__, "cases": cases}
+        with open(results_path(), "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec) + "\n")
+        print(f"saved to {results_path()}")
+    if args.fail and any(flag == "REGRESSION" for *_, flag in rows):
+        sys.exit(1)
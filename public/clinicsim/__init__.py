@@ -0,0 +1,42 @@
+# clinicsim — simulation core for the Health Policy Simulator (no Streamlit imports)
+#
+# Names below resolve lazily (PEP 562): `import clinicsim` loads nothing, and
+# `clinicsim.simulate_one_year` imports only clinicsim.model (NumPy). pandas is
+# pulled in by the loaders and by functions that build frames.
+
+import importlib
+
+_EXPORTS = {
+    # model
+    "INDICATORS": "model", "E_MAX_BASE": "model", "PC50_BASE": "model",
+    "auto_stability_tune": "model", "simulate_one_year": "model", "compute_score": "model",
+    # data / ingest
+    "load_hist": "data", "impute_groupwise": "data", "impute_groupwise_fast": "data",
+    "normalize_slopes": "data", "compute_slopes": "data", "read_hist_chunked": "data", "load_hist_panel": "data",
+    "load_hist_cached": "ingest", "load_index_cached": "ingest", "load_panel_cached": "ingest",
+    # engine and friends
+    "StateArrays": "engine", "simulate_one_year_arrays": "engine", "run_horizon": "engine",
+    "states_to_arrays": "engine", "slope_matrix": "engine", "StateTable": "engine",
+    "allocate": "allocation", "allocated_dollars": "allocation", "ALLOCATION_RULES": "allocation",
+    "tuned_params": "tuning", "stability_tune_solve": "tuning",
+    "run_ensemble": "ensemble", "optimize_splits": "optimize",
+    "load_scenarios": "scenarios", "expand_scenarios": "scenarios", "run_scenarios": "scenarios",
+    "export_file": "export", "export_formats": "export",
+    "sa_baseline": "sensitivity", "run_sensitivity": "sensitivity",
+    "panel_cube": "backtest", "run_backtest": "backtest", "calibrate": "backtest",
+    "WARMUP": "warmup", "warm_default": "warmup", "shared_baseline": "warmup",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    mod = _EXPORTS.get(name)
+    if mod is None:
+        raise AttributeError(f"module 'clinicsim' has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{mod}", __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
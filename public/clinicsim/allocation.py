@@ -0,0 +1,80 @@
+# clinicsim/allocation.py — need weights and per-capita allocation rules
+#
+# One year's allocation is a units × policies per-capita matrix pc[u, p] built
+# from the policy budgets (P,), normalized need weights (U,), population (U,)
+# and the per-capita floor. Leading batch axes (replicates, candidates) work
+# the same way they do in engine.step_arrays.
+#
+#   proportional — pc = max(budget·need / pop, floor). The original model: the
+#                  floor is paid on top, so spending can exceed the budget.
+#   equal        — pc = max(budget / total pop, floor). Same caveat.
+#   capped       — pc = max(c·need / pop, floor), with c solved per policy so
+#                  spending equals the budget: floors are funded first and the
+#                  rest is redistributed by need. If the floors alone cost more
+#                  than the budget, they are scaled down pro rata.
+#
+# allocated_dollars() is what each policy actually spent (pc × population);
+# the engine reports it per year next to the budget.
+
+import numpy as np
+
+from .model import INDICATORS
+
+ALLOCATION_RULES = ("proportional", "equal", "capped")
+ALLOCATION_LABELS = {
+    "proportional": "Proportional to need (floor on top)",
+    "equal": "Equal per capita (floor on top)",
+    "capped": "Need-weighted, capped at budget",
+}
+
+# Need-weight coefficients: need = values @ NEED_W + NEED_C
+_IND_POS = {n: i for i, (n,_,_) in enumerate(INDICATORS)}
+NEED_W = np.zeros(len(INDICATORS))
+for _n, _w in [("diabetes", 0.25), ("high_bp", 0.25), ("no_doctor", 0.20),
+               ("employed", -0.15), ("health_index", -0.15)]:
+    NEED_W[_IND_POS[_n]] = _w
+NEED_C = 0.30
+
+
+def need_weights_arrays(values):
+    """Normalized need per unit; works on (U, K) or batched (..., U, K) values."""
+    needs = values @ NEED_W + NEED_C
+    tot = needs.sum(axis=-1, keepdims=True)
+    return needs / np.where(tot == 0, 1.0, tot)
+
+def _capped(d, w, pop, floor_pc):
+    """Water-filling: floored units get the floor, the rest c·w/pop with one c per policy."""
+    shape = np.broadcast_shapes(d.shape, w.shape, np.shape(floor_pc))
+    floor_dollars = np.broadcast_to(floor_pc * pop, shape)
+    w = np.broadcast_to(w, shape)
+    floored = np.zeros(shape, dtype=bool)
+    # c only decreases as units join the floored set, so this ends within U rounds
+    while True:
+        W = np.where(floored, 0.0, w).sum(axis=-2, keepdims=True)
+        F = np.where(floored, floor_dollars, 0.0).sum(axis=-2, keepdims=True)
+        c = (d - F) / np.where(W > 0, W, 1.0)
+        nxt = floored | (c * w < floor_dollars)
+        if (nxt == floored).all(): break
+        floored = nxt
+    pc = np.where(floored, floor_dollars, c * w) / pop
+    # floors alone over budget: everyone gets the floor scaled down pro rata
+    total_floor = floor_dollars.sum(axis=-2, keepdims=True)
+    scale = np.where(total_floor > d, d / np.where(total_floor > 0, total_floor, 1.0), 1.0)
+    return np.where(total_floor > d, np.broadcast_to(floor_pc, shape) * scale, pc)
+
+def allocate(dollars, weights, pop, floor_pc, rule="proportional"):
+    """Per-capita allocation (..., U, P) from policy dollars (..., P), need weights (..., U) and population (..., U)."""
+    d = np.expand_dims(dollars, -2)
+    pop = np.maximum(1.0, pop)[..., None]
+    if rule == "proportional":
+        return np.maximum(d * weights[..., None] / pop, floor_pc)
+    if rule == "equal":
+        return np.maximum(np.broadcast_to(d / pop.sum(axis=-2, keepdims=True), np.broadcast_shapes(d.shape, pop.shape)),
+                          floor_pc)
+    if rule == "capped":
+        return _capped(d, weights[..., None], pop, floor_pc)
+    raise ValueError(f"Unknown allocation rule {rule!r} (expected one of {ALLOCATION_RULES})")
+
+def allocated_dollars(pc, pop):
+    """Dollars actually allocated per policy (..., P): per-capita allocation × the population it was paid to."""
+    return (pc * np.maximum(1.0, pop)[..., None]).sum(axis=-2)
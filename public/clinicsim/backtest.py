@@ -0,0 +1,278 @@
+# clinicsim/backtest.py — replay the historical panel to score and calibrate the simulator
+#
+# The long panel (data.load_hist_panel) becomes a dense cube obs[u, y, k]
+# (NaN = not observed). It holds observed years only (through
+# data.PANEL_MAX_YEAR, 2024): the file's Index_2025 column is the model's
+# own prediction, so it is neither a replay target nor a calibration target. A backtest starts every ZIP at an origin year, with
+# each indicator at its last observation at or before the origin. It then
+# runs the array engine forward with the given policy settings (events off)
+# and compares the projection with every later observation:
+#
+#   per (ZIP, indicator) and per indicator: n, RMSE, MAE, plus the same for
+#   persistence (no change), the reference any model should beat
+#
+# Slopes are fitted on the pre-origin observations only (OLS per ZIP and
+# indicator, so no look-ahead). Cells with fewer than two pre-origin points
+# fall back to the file's slope columns, read as percentage points per year.
+#
+# Calibration searches a slope scale per indicator and eff_mult. Origins and
+# candidates are leading batch axes of engine.step_arrays, so one replay
+# covers every ZIP × origin × candidate:
+#   1. eff_mult grid at slope scale 1
+#   2. at the best eff_mult, per-indicator slope scales: candidate c applies
+#      scale c to every indicator and each indicator keeps its best scale
+#      (indicators only interact through need weights and population)
+#   3. eff_mult grid again at those scales
+#   4. before / after replays
+# That is |eff_mults| × 2 + |scales| + 4 replays (about 50) rather than the
+# full scale × eff product, which matters once the panel is national.
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .engine import IND_NAMES, policy_matrices, budget_by_policy, step_arrays
+from .profiling import profiled
+
+FILE_SLOPE_UNITS = 0.01          # slope columns are percentage points per year
+MAX_BATCH_CELLS = 4_000_000      # origins × candidates × units × indicators per replay batch
+_DEFAULTS = np.array([{"diabetes": 0.10, "disabled": 0.08, "employed": 0.60, "health_index": 0.50, "high_bp": 0.25,
+                       "kidney_disease": 0.03, "bipoc": 0.50, "no_doctor": 0.12}.get(n, 0.0) for n in IND_NAMES])
+
+
+@dataclass
+class PanelCube:
+    zips: list
+    years: np.ndarray        # (Y,)
+    obs: np.ndarray          # (U, Y, K) observed levels, NaN where missing
+    population: np.ndarray   # (U,)
+    file_slopes: np.ndarray  # (U, K) per year, 0–1 scale
+
+def panel_cube(panel):
+    """Long panel (zip, year, indicators, population, *_slope) -> PanelCube."""
+    codes, zips = pd.factorize(panel["zip"].astype(str), sort=True)
+    ycodes, years = pd.factorize(panel["year"].astype(int), sort=True)
+    obs = np.full((len(zips), len(years), len(IND_NAMES)), np.nan)
+    obs[codes, ycodes] = panel.reindex(columns=IND_NAMES).to_numpy(dtype=float)
+    first = pd.DataFrame({"code": codes}).drop_duplicates().index.to_numpy()
+    order = np.argsort(codes[first])
+    pop = panel["population"].to_numpy(dtype=float)[first][order] if "population" in panel else np.full(len(zips), 2e4)
+    pop = np.where(np.isnan(pop) | (pop <= 0), 20000.0, np.maximum(100.0, pop))
+    slopes = panel.reindex(columns=[f"{n}_slope" for n in IND_NAMES]).to_numpy(dtype=float)[first][order]
+    return PanelCube([str(z) for z in zips], np.asarray(years, dtype=int), obs, pop,
+                     np.nan_to_num(slopes) * FILE_SLOPE_UNITS)
+
+_CUBES = OrderedDict()    # id(panel) -> (panel, cube, default origins), shared by sessions
+_CUBE_LOCK = threading.Lock()
+
+@profiled()
+def cached_cube(panel, maxsize=4):
+    """(panel_cube, default_origins) for `panel`, reused while the same frame is passed (e.g. from load_panel_cached)."""
+    with _CUBE_LOCK:
+        hit = _CUBES.get(id(panel))
+        if hit is not None and hit[0] is panel:
+            _CUBES.move_to_end(id(panel))
+            return hit[1], hit[2]
+        cube = panel_cube(panel)
+        origins = default_origins(cube)
+        _CUBES[id(panel)] = (panel, cube, origins)
+        while len(_CUBES) > maxsize: _CUBES.popitem(last=False)
+    return cube, origins
+
+
+# ---------------- Origin state ----------------
+def start_state(cube, origin):
+    """(values (U, K), observed (U, K)): last observation at or before `origin`.
+
+    Unobserved cells start at the indicator's cross-ZIP mean (or the model
+    default) and are left out of the error scores.
+    """
+    upto = cube.obs[:, cube.years <= origin]
+    if upto.shape[1] == 0:          # origin before the first panel year: nothing observed yet
+        observed, vals = np.zeros((cube.obs.shape[0], cube.obs.shape[2]), dtype=bool), None
+    else:
+        seen = ~np.isnan(upto)
+        rows = np.maximum.accumulate(np.where(seen, np.arange(upto.shape[1])[None, :, None], -1), axis=1)[:, -1]
+        observed = rows >= 0
+        vals = np.take_along_axis(upto, np.maximum(rows, 0)[:, None, :], 1)[:, 0]
+    cnt = observed.sum(axis=0)
+    if vals is None:
+        return np.broadcast_to(_DEFAULTS, observed.shape).copy(), observed
+    fill = np.where(cnt > 0, np.where(observed, vals, 0.0).sum(axis=0) / np.maximum(cnt, 1), _DEFAULTS)
+    return np.where(observed, vals, fill), observed
+
+def fit_slopes(cube, origin):
+    """(slopes (U, K), fitted (U, K)): OLS slope per cell over years <= origin; the file slope where < 2 points."""
+    sel = cube.years <= origin
+    y = cube.obs[:, sel]
+    t = (cube.years[sel] - origin).astype(float)[None, :, None]         # centred: no cancellation in den
+    m = ~np.isnan(y)
+    n = m.sum(axis=1)
+    tm = np.where(m, t, 0.0); ym = np.where(m, y, 0.0)
+    sx, sy = tm.sum(axis=1), ym.sum(axis=1)
+    sxx, sxy = (tm * tm).sum(axis=1), (tm * ym).sum(axis=1)
+    den = n * sxx - sx * sx
+    fitted = (n >= 2) & (den > 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = (n * sxy - sx * sy) / den
+    return np.where(fitted, slope, cube.file_slopes), fitted
+
+def default_origins(cube, count=3):
+    """The `count` years whose replay scores the most (cell, later observation) pairs."""
+    later = ~np.isnan(cube.obs)
+    score = []
+    for i, y in enumerate(cube.years):
+        _, observed = start_state(cube, y)
+        score.append(int((later[:, i + 1:] & observed[:, None, :]).sum()))
+    best = np.argsort(score)[::-1][:count]
+    return sorted(int(cube.years[i]) for i in best if score[i] > 0)
+
+
+# ---------------- Replay ----------------
+def replay_errors(cube, origins, slope_scale, eff_mult, dollars, floor_pc, emax, pc50, rule="proportional",
+                  slopes="fit"):
+    """Squared / absolute error sums of every candidate against all later observations.
+
+    slope_scale (C, K) and eff_mult (C,) define C candidates. Returns sse (C, U, K),
+    sae (C, U, K) and the observation count n (U, K), summed over origins and years.
+    """
+    slope_scale = np.atleast_2d(np.asarray(slope_scale, dtype=float))
+    eff_mult = np.broadcast_to(np.asarray(eff_mult, dtype=float), (len(slope_scale),))
+    C, (U, _, K) = len(slope_scale), cube.obs.shape
+    starts, masks, slope_o = [], [], []
+    for o in origins:
+        v, observed = start_state(cube, o)
+        starts.append(v); masks.append(observed)
+        slope_o.append(fit_slopes(cube, o)[0] if slopes == "fit" else cube.file_slopes)
+    starts, masks, slope_o = np.stack(starts), np.stack(masks), np.stack(slope_o)       # (O, U, K)
+    origins = np.asarray(origins)
+    horizon = int(cube.years.max() - origins.min())
+    target = {int(y): i for i, y in enumerate(cube.years)}
+
+    sse, sae = np.zeros((C, U, K)), np.zeros((C, U, K))
+    n = np.zeros((U, K))
+    batch = max(1, MAX_BATCH_CELLS // max(1, len(origins) * U * K))
+    for s in range(0, C, batch):
+        e = min(C, s + batch)
+        vals = np.broadcast_to(starts[:, None], (len(origins), e - s, U, K)).copy()
+        pops = np.broadcast_to(cube.population, (len(origins), e - s, U)).copy()
+        sl = slope_o[:, None] * slope_scale[None, s:e, None, :]
+        em = eff_mult[s:e][None, :, None, None]
+        for h in range(1, horizon + 1):
+            vals, pops, _ = step_arrays(vals, pops, sl, dollars, floor_pc, emax, pc50, em, None, rule)
+            for o, origin in enumerate(origins):
+                yi = target.get(int(origin) + h)
+                if yi is None: continue
+                ok = masks[o] & ~np.isnan(cube.obs[:, yi])
+                diff = np.where(ok, vals[o] - np.nan_to_num(cube.obs[:, yi]), 0.0)
+                sse[s:e] += diff ** 2
+                sae[s:e] += np.abs(diff)
+                if s == 0: n += ok
+    return sse, sae, n
+
+def _policy(city_budget, splits, E_MAX, PC50):
+    emax, pc50 = policy_matrices(E_MAX, PC50) if isinstance(E_MAX, dict) else (E_MAX, PC50)
+    return budget_by_policy(city_budget, splits), emax, pc50
+
+def _indicator_rmse(sse, n):
+    """(C, U, K) sums -> (C, K) RMSE per indicator (NaN where nothing was scored)."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.sqrt(sse.sum(axis=1) / n.sum(axis=0))
+
+def _objective(rmse):
+    return np.nanmean(rmse, axis=-1)
+
+
+# ---------------- Results ----------------
+@dataclass
+class BacktestResult:
+    origins: list
+    zips: list
+    slope_scale: np.ndarray  # (K,)
+    eff_mult: float
+    indicators: pd.DataFrame # indicator, n, rmse, mae, persistence_rmse, persistence_mae, skill
+    by_zip: pd.DataFrame     # zip, indicator, n, rmse, mae, persistence_rmse
+    seconds: float
+
+    @property
+    def rmse(self):
+        return float(np.nanmean(self.indicators["rmse"]))
+
+@profiled()
+def run_backtest(cube, origins, city_budget, splits, floor_pc, E_MAX, PC50, slope_scale=1.0, eff_mult=1.0,
+                 rule="proportional", slopes="fit"):
+    """Replay from each origin with one parameter set; errors per ZIP and indicator, with persistence alongside."""
+    t0 = time.perf_counter()
+    dollars, emax, pc50 = _policy(city_budget, splits, E_MAX, PC50)
+    scale = np.broadcast_to(np.asarray(slope_scale, dtype=float), (len(IND_NAMES),))
+    cand = np.stack([scale, np.zeros(len(IND_NAMES))])                      # model, then persistence
+    sse, sae, n = replay_errors(cube, origins, cand, [eff_mult, 0.0], dollars, floor_pc, emax, pc50, rule, slopes)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rmse_z, mae_z = np.sqrt(sse / n), sae / n
+        nk = n.sum(axis=0)
+        rmse_k, mae_k = np.sqrt(sse.sum(axis=1) / nk), sae.sum(axis=1) / nk
+    ind = pd.DataFrame({"indicator": IND_NAMES, "n": nk.astype(int), "rmse": rmse_k[0], "mae": mae_k[0],
+                        "persistence_rmse": rmse_k[1], "persistence_mae": mae_k[1]})
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ind["skill"] = 1.0 - ind["rmse"] / ind["persistence_rmse"]      # > 0: beats persistence
+    U, K = n.shape
+    by_zip = pd.DataFrame({"zip": np.repeat(np.asarray(cube.zips, dtype=object), K),
+                           "indicator": np.tile(IND_NAMES, U), "n": n.reshape(-1).astype(int),
+                           "rmse": rmse_z[0].reshape(-1), "mae": mae_z[0].reshape(-1),
+                           "persistence_rmse": rmse_z[1].reshape(-1)})
+    by_zip = by_zip[by_zip["n"] > 0].reset_index(drop=True)
+    return BacktestResult(list(origins), cube.zips, scale.copy(), float(eff_mult), ind, by_zip,
+                          time.perf_counter() - t0)
+
+
+@dataclass
+class CalibrationResult:
+    slope_scale: np.ndarray  # (K,) per-indicator slope scale
+    eff_mult: float
+    grid: pd.DataFrame       # stage, slope_scale (NaN = per-indicator), eff_mult, rmse
+    before: BacktestResult   # slope scale 1, eff_mult 1
+    after: BacktestResult    # calibrated
+    candidates: int          # candidate parameter sets replayed
+    seconds: float
+
+@profiled()
+def calibrate(cube, origins, city_budget, splits, floor_pc, E_MAX, PC50, scales=None, eff_mults=None,
+              rule="proportional", slopes="fit"):
+    """Fit per-indicator slope scales and eff_mult by vectorized replay (see the module header)."""
+    t0 = time.perf_counter()
+    scales = np.linspace(0.0, 2.0, 21) if scales is None else np.asarray(scales, dtype=float)
+    eff_mults = np.linspace(0.0, 3.0, 13) if eff_mults is None else np.asarray(eff_mults, dtype=float)
+    dollars, emax, pc50 = _policy(city_budget, splits, E_MAX, PC50)
+    K, rows = len(IND_NAMES), []
+
+    def replay(cand, effs):
+        sse, _, n = replay_errors(cube, origins, cand, effs, dollars, floor_pc, emax, pc50, rule, slopes)
+        return _indicator_rmse(sse, n)                                      # (C, K)
+
+    def eff_search(stage, scale):
+        obj = _objective(replay(np.repeat(scale[None, :], len(eff_mults), axis=0), eff_mults))
+        common = scale[0] if np.all(scale == scale[0]) else np.nan
+        rows.append(pd.DataFrame({"stage": stage, "slope_scale": common, "eff_mult": eff_mults, "rmse": obj}))
+        return float(eff_mults[np.nanargmin(obj)])
+
+    # 1. eff_mult at slope scale 1
+    best_eff = eff_search(1, np.ones(K))
+
+    # 2. per-indicator slope scale at that eff_mult
+    rmse = replay(np.repeat(scales[:, None], K, axis=1), np.full(len(scales), best_eff))     # (S, K)
+    rows.append(pd.DataFrame({"stage": 2, "slope_scale": scales, "eff_mult": best_eff, "rmse": _objective(rmse)}))
+    best_scale = np.where(np.isnan(rmse).all(axis=0), 1.0, scales[np.nanargmin(np.nan_to_num(rmse, nan=np.inf), axis=0)])
+
+    # 3. eff_mult again at those scales
+    best_eff = eff_search(3, best_scale)
+    grid = pd.concat(rows, ignore_index=True)
+
+    # 4. score before / after
+    before = run_backtest(cube, origins, city_budget, splits, floor_pc, E_MAX, PC50, 1.0, 1.0, rule, slopes)
+    after = run_backtest(cube, origins, city_budget, splits, floor_pc, E_MAX, PC50, best_scale, best_eff, rule, slopes)
+    return CalibrationResult(best_scale, best_eff, grid, before, after, len(grid) + 4,
+                             time.perf_counter() - t0)
@@ -0,0 +1,213 @@
+# clinicsim/cli.py — command line entry point (python -m clinicsim ...)
+#
+#   python -m clinicsim run sweep.json -o results.parquet            # all cores
+#   python -m clinicsim run sweep.yaml -o out/results.csv --workers 4 --zip-level
+#   python -m clinicsim run sweep.json --dry-run                     # list scenarios only
+#   python -m clinicsim sensitivity --method sobol --samples 10000 -o sa.csv
+#   python -m clinicsim backtest --origins 2014 2015 2018 --calibrate
+#   python -m clinicsim warmup                                       # fill the ingest sidecars before a server starts
+#   python -m clinicsim geo build                                    # simplified TopoJSON tiers + size report
+#   python -m clinicsim geo values --years 10                        # per-year values for the site's map
+#
+# Run from the folder that contains clinicsim/ (public/), or put it on PYTHONPATH.
+
+import argparse
+import sys
+import time
+
+
+def _cmd_run(args):
+    from .scenarios import load_scenarios, expand_scenarios, run_scenarios, write_results
+    spec = load_scenarios(args.scenarios)
+    if args.hist: spec["hist"] = args.hist
+    if args.dry_run:
+        import pandas as pd
+        scenarios = expand_scenarios(spec)
+        table = pd.DataFrame([{k: v for k, v in s.items() if k != "splits"} | s["splits"] for s in scenarios])
+        print(table.to_string(index=False))
+        return 0
+
+    def progress(done, total):
+        if not args.quiet and (done == total or done % max(1, total // 20) == 0):
+            print(f"\r{done}/{total} scenarios", end="" if done < total else "\n", file=sys.stderr, flush=True)
+
+    summary, zip_df, info = run_scenarios(spec, workers=args.workers, zip_level=args.zip_level, progress=progress)
+    out = write_results(summary, args.output)
+    written = [out]
+    if zip_df is not None:
+        zpath = out.with_name(out.name.replace(out.suffix, "") + "_zips" + out.suffix) if out.suffix != ".gz" \
+            else out.with_name(out.name[:-len(".csv.gz")] + "_zips.csv.gz")
+        written.append(write_results(zip_df, zpath))
+    if not args.quiet:
+        print(f"{info['scenarios']} scenarios × {info['units']} ZIPs on {info['workers']} worker(s): "
+              f"setup {info['setup_s']:.2f} s, total {info['total_s']:.2f} s", file=sys.stderr)
+        for p in written: print(f"wrote {p}", file=sys.stderr)
+    return 0
+
+
+def _cmd_sensitivity(args):
+    from .scenarios import DEFAULTS, load_baseline, baseline_state
+    from .engine import slope_matrix
+    from .model import E_MAX_BASE, PC50_BASE, slope_medians
+    from .tuning import stability_tune_solve
+    from .sensitivity import FACTOR_GROUPS, sa_baseline, run_sensitivity
+    hist = load_baseline({"hist": args.hist, "index": args.index, "start_year": args.start_year})
+    arr = baseline_state(hist, args.start_year)
+    budget, splits = args.budget, DEFAULTS["splits"]
+    if args.no_stability:
+        floor_pc, E_MAX, PC50 = 25.0, E_MAX_BASE, PC50_BASE
+    else:
+        floor_pc, E_MAX, PC50, _ = stability_tune_solve(slope_medians(hist), float(arr.population.mean()), budget, splits)
+    base = sa_baseline(arr, slope_matrix(hist, arr.zips), args.years, budget, splits, floor_pc, E_MAX, PC50,
+                       events=not args.no_events, rule=args.rule)
+    res = run_sensitivity(base, args.method, args.samples, ranges={g: tuple(args.range) for g in FACTOR_GROUPS},
+                          workers=args.workers)
+    print(res.table.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    if not args.quiet:
+        print(f"{res.samples:,} runs × {len(res.zips)} ZIPs × {args.years} years in {res.seconds:.2f} s", file=sys.stderr)
+    if args.output:
+        from .scenarios import write_results
+        print(f"wrote {write_results(res.table, args.output)}", file=sys.stderr)
+    return 0
+
+
+def _cmd_backtest(args):
+    from .scenarios import DEFAULTS, baseline_state
+    from .data import load_hist, load_hist_panel, read_csv_flex
+    from .ingest import prepare_hist
+    from .model import E_MAX_BASE, PC50_BASE, slope_medians
+    from .tuning import stability_tune_solve
+    from .backtest import panel_cube, default_origins, run_backtest, calibrate
+    raw = read_csv_flex(args.hist)
+    cube = panel_cube(load_hist_panel(raw))
+    origins = args.origins or default_origins(cube)
+    bad = [o for o in origins if not cube.years[0] <= o < cube.years[-1]]
+    if bad:
+        print(f"origins must lie in {cube.years[0]}–{cube.years[-1] - 1} (observed years before the last one); "
+              f"got {', '.join(map(str, bad))}", file=sys.stderr)
+        return 2
+    budget, splits = args.budget, DEFAULTS["splits"]
+    if args.no_stability:
+        floor_pc, E_MAX, PC50 = 25.0, E_MAX_BASE, PC50_BASE
+    else:
+        hist = prepare_hist(load_hist(raw))
+        pop = float(baseline_state(hist, int(cube.years[-1]) + 1).population.mean())
+        floor_pc, E_MAX, PC50, _ = stability_tune_solve(slope_medians(hist), pop, budget, splits)
+    bt_args = (cube, origins, budget, splits, floor_pc, E_MAX, PC50)
+    if args.calibrate:
+        res = calibrate(*bt_args, rule=args.rule, slopes=args.slopes)
+        table = res.after.indicators.assign(uncalibrated_rmse=res.before.indicators["rmse"], slope_scale=res.slope_scale)
+        note = f"eff_mult {res.eff_mult:.2f}, {res.candidates} parameter sets"
+    else:
+        res = run_backtest(*bt_args, eff_mult=args.eff_mult, rule=args.rule, slopes=args.slopes)
+        table, note = res.indicators, f"eff_mult {args.eff_mult:.2f}"
+    print(table.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    if not args.quiet:
+        print(f"origins {', '.join(map(str, origins))} × {len(cube.zips)} ZIPs: {note} in {res.seconds:.2f} s",
+              file=sys.stderr)
+    if args.output:
+        from .scenarios import write_results
+        print(f"wrote {write_results(table, args.output)}", file=sys.stderr)
+    return 0
+
+
+def _cmd_warmup(args):
+    from pathlib import Path
+    from .warmup import warm_default
+    times = warm_default(Path(args.index), Path(args.hist), args.start_year)
+    if not args.quiet:
+        for step, secs in times.items():
+            print(f"{step:<10} {1000 * secs:9.1f} ms", file=sys.stderr)
+    return 0
+
+
+def _cmd_geo(args):
+    from .geo import build_tiers, build_report, write_values, GEO_DIR
+    if args.action == "values":
+        from .scenarios import load_baseline, run_scenarios
+        spec = {"hist": args.hist, "index": args.index, "start_year": args.start_year, "years": args.years}
+        _, zip_df, _ = run_scenarios(spec, workers=1, zip_level=True, hist_df=load_baseline(spec))
+        path = write_values(zip_df, geo_dir=args.out or GEO_DIR)
+        if not args.quiet:
+            print(f"wrote {path} ({zip_df['zip'].nunique()} ZIPs × {args.years} years)", file=sys.stderr)
+        return 0
+    rows = build_tiers(geo_dir=args.out or GEO_DIR)
+    if args.no_report:
+        return 0
+    import pandas as pd
+    rep = pd.DataFrame(build_report(rows, geo_dir=args.out or GEO_DIR))
+    base = rep.iloc[0]
+    rep["size_vs_html"] = rep["bytes"] / base["bytes"]
+    print(rep.to_string(index=False, float_format=lambda v: f"{v:,.3f}"))
+    return 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m clinicsim", description="Headless Health Policy Simulator")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run a scenario grid and write results")
+    run.add_argument("scenarios", help="scenario file (.json, or .yaml/.yml with PyYAML)")
+    run.add_argument("-o", "--output", default="results.parquet", help="output .parquet, .csv or .csv.gz")
+    run.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    run.add_argument("--zip-level", action="store_true", help="also write per-ZIP rows to <output>_zips")
+    run.add_argument("--hist", default=None, help="override the scenario file's historical baseline")
+    run.add_argument("--dry-run", action="store_true", help="print the expanded scenarios and exit")
+    run.add_argument("-q", "--quiet", action="store_true")
+    run.set_defaults(func=_cmd_run)
+
+    sa = sub.add_parser("sensitivity", help="global sensitivity of the score to E_MAX, PC50, caps and event rates")
+    sa.add_argument("--method", choices=["sobol", "morris"], default="sobol")
+    sa.add_argument("--samples", type=int, default=10_000, help="model runs (default 10000)")
+    sa.add_argument("--range", type=float, nargs=2, default=[0.5, 1.5], metavar=("LO", "HI"),
+                    help="multiplier range for every factor (default 0.5 1.5)")
+    sa.add_argument("--years", type=int, default=10)
+    sa.add_argument("--budget", type=float, default=30_000_000.0)
+    sa.add_argument("--rule", choices=["proportional", "equal", "capped"], default="proportional")
+    sa.add_argument("--no-events", action="store_true", help="leave out the event-rate factors")
+    sa.add_argument("--no-stability", action="store_true", help="perturb the untuned base tables")
+    sa.add_argument("--hist", default="combined_all_zip_data.csv")
+    sa.add_argument("--index", default="index_2025_predictions.csv")
+    sa.add_argument("--start-year", type=int, default=2025)
+    sa.add_argument("--workers", type=int, default=1)
+    sa.add_argument("-o", "--output", default=None, help="also write the ranked table (.csv, .csv.gz, .parquet)")
+    sa.add_argument("-q", "--quiet", action="store_true")
+    sa.set_defaults(func=_cmd_sensitivity)
+
+    bt = sub.add_parser("backtest", help="replay the historical panel and score (or calibrate) the simulator")
+    bt.add_argument("--origins", type=int, nargs="+", default=None, help="origin years (default: best-covered three)")
+    bt.add_argument("--slopes", choices=["fit", "file"], default="fit", help="pre-origin OLS or the file's slope columns")
+    bt.add_argument("--calibrate", action="store_true", help="fit per-indicator slope scales and eff_mult")
+    bt.add_argument("--eff-mult", type=float, default=1.0)
+    bt.add_argument("--budget", type=float, default=30_000_000.0)
+    bt.add_argument("--rule", choices=["proportional", "equal", "capped"], default="proportional")
+    bt.add_argument("--no-stability", action="store_true", help="replay with the untuned base tables")
+    bt.add_argument("--hist", default="combined_all_zip_data.csv")
+    bt.add_argument("-o", "--output", default=None, help="also write the per-indicator table (.csv, .csv.gz, .parquet)")
+    bt.add_argument("-q", "--quiet", action="store_true")
+    bt.set_defaults(func=_cmd_backtest)
+
+    wu = sub.add_parser("warmup", help="prepare the default baseline and scenario (writes the ingest sidecars)")
+    wu.add_argument("--hist", default="combined_all_zip_data.csv")
+    wu.add_argument("--index", default="index_2025_predictions.csv")
+    wu.add_argument("--start-year", type=int, default=2025)
+    wu.add_argument("-q", "--quiet", action="store_true")
+    wu.set_defaults(func=_cmd_warmup)
+
+    geo = sub.add_parser("geo", help="build simplified ZCTA geometry (TopoJSON) or per-year map values")
+    geo.add_argument("action", choices=["build", "values"])
+    geo.add_argument("--out", default=None, help="output folder (default: public/geo)")
+    geo.add_argument("--no-report", action="store_true", help="skip the size / timing comparison")
+    geo.add_argument("--years", type=int, default=10, help="values: simulated years of the default scenario")
+    geo.add_argument("--hist", default="combined_all_zip_data.csv")
+    geo.add_argument("--index", default="index_2025_predictions.csv")
+    geo.add_argument("--start-year", type=int, default=2025)
+    geo.add_argument("-q", "--quiet", action="store_true")
+    geo.set_defaults(func=_cmd_geo)
+
+    args = ap.parse_args(argv)
+    t0 = time.perf_counter()
+    rc = args.func(args)
+    if not getattr(args, "quiet", False):
+        print(f"done in {time.perf_counter() - t0:.2f} s", file=sys.stderr)
+    return rc
@@ -0,0 +1,404 @@
+# clinicsim/data.py — CSV loading, column normalization, imputation and slope handling
+#
+# Pure pandas; the cached entry points built on top of these live in ingest.py.
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from .model import INDICATORS
+from .profiling import profiled
+
+# ---------------- Utilities ----------------
+def norm_cols(df):
+    df = df.copy()
+    df.columns = [str(c).strip().lower().replace(" ", "_") for c in df.columns]
+    return df
+
+@profiled()
+def impute_groupwise(df, group_key, cols):
+    df = df.sort_values([group_key, "year"]).reset_index(drop=True).copy()
+    for c in cols:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+            filled = (
+                df.groupby(group_key, sort=False)[c]
+                  .apply(lambda s: s.ffill().bfill())
+                  .reset_index(level=0, drop=True)
+            )
+            df[c] = filled
+            grp_mean = df.groupby(group_key, sort=False)[c].transform("mean")
+            df[c] = df[c].fillna(grp_mean)
+            df[c] = df[c].fillna(df[c].mean())
+            df[c] = df[c].fillna(0.0)
+    return df
+
+IMPUTE_STRATEGIES = ("ffill", "bfill", "group_mean", "global_mean", "zero")
+
+@profiled()
+def impute_groupwise_fast(df, group_key, cols, report=None):
+    """Same result as impute_groupwise, filled for all columns at once.
+
+    Sorts once (skipped if already in (group_key, year) order), then does a
+    segment-wise ffill/bfill over the sorted group boundaries with NumPy
+    accumulate, one bincount group mean, the column mean and finally 0.0.
+    Columns without gaps are left untouched. If `report` is a dict it receives
+    {strategy: {column: n_filled}} for the strategies in IMPUTE_STRATEGIES.
+    """
+    keys = df[group_key]
+    years = df["year"].to_numpy()
+    k = keys.cat.codes.to_numpy() if isinstance(keys.dtype, pd.CategoricalDtype) else keys.to_numpy()
+    try:
+        in_order = len(df) <= 1 or bool(((k[1:] > k[:-1]) | ((k[1:] == k[:-1]) & (years[1:] >= years[:-1]))).all())
+    except TypeError:
+        in_order = False
+    out = df.reset_index(drop=True) if in_order else df.sort_values([group_key, "year"]).reset_index(drop=True)
+
+    cols = [c for c in cols if c in out.columns]
+    counts = {s: dict.fromkeys(cols, 0) for s in IMPUTE_STRATEGIES}
+    vals = np.column_stack([pd.to_numeric(out[c], errors="coerce").to_numpy(dtype=float) for c in cols]) \
+        if cols else np.empty((len(out), 0))
+    gaps = np.isnan(vals)
+    todo = np.flatnonzero(gaps.any(axis=0))
+    if len(todo) and len(out):
+        v = vals[:, todo]
+        codes = pd.factorize(out[group_key])[0]
+        seg = np.concatenate(([0], np.cumsum(codes[1:] != codes[:-1])))
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        ends = np.r_[starts[1:], len(out)] - 1
+        n, rows = len(out), np.arange(len(out))[:, None]
+        valid = ~np.isnan(v)
+
+        # ffill: last valid row at or above, if it is inside the same group
+        last = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+        ok = (last >= starts[seg][:, None]) & ~valid
+        filled = v.copy()
+        filled[ok] = v[last[ok], np.nonzero(ok)[1]]
+        n_ffill = ok.sum(axis=0)
+        # bfill: next valid row at or below, same group
+        nxt = np.minimum.accumulate(np.where(valid, rows, n)[::-1], axis=0)[::-1]
+        ok = (nxt <= ends[seg][:, None]) & np.isnan(filled)
+        filled[ok] = v[nxt[ok], np.nonzero(ok)[1]]
+        n_bfill = ok.sum(axis=0)
+        # group mean of the filled column, then column mean, then 0
+        fin = ~np.isnan(filled)
+        g_sum = np.stack([np.bincount(seg, weights=np.where(fin[:, j], filled[:, j], 0.0), minlength=len(starts))
+                          for j in range(filled.shape[1])], axis=1)
+        g_cnt = np.stack([np.bincount(seg, weights=fin[:, j], minlength=len(starts))
+                          for j in range(filled.shape[1])], axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            g_mean = (g_sum / g_cnt)[seg]
+        ok = np.isnan(filled) & ~np.isnan(g_mean)
+        filled[ok] = g_mean[ok]; n_gmean = ok.sum(axis=0)
+        fin = ~np.isnan(filled)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            c_mean = np.where(fin, filled, 0.0).sum(axis=0) / fin.sum(axis=0)
+        ok = np.isnan(filled) & ~np.isnan(c_mean)[None, :]
+        filled[ok] = np.broadcast_to(c_mean, filled.shape)[ok]; n_cmean = ok.sum(axis=0)
+        n_zero = np.isnan(filled).sum(axis=0)
+        filled[np.isnan(filled)] = 0.0
+
+        for j, t in enumerate(todo):
+            c = cols[t]
+            out[c] = filled[:, j]
+            for name, arr in zip(IMPUTE_STRATEGIES, (n_ffill, n_bfill, n_gmean, n_cmean, n_zero)):
+                counts[name][c] = int(arr[j])
+    for t in np.flatnonzero(~gaps.any(axis=0)):
+        c = cols[t]
+        if not pd.api.types.is_numeric_dtype(out[c]):
+            out[c] = vals[:, t]
+    if report is not None:
+        report.update(counts)
+    return out
+
+def ensure_indicator_columns(df):
+    defaults = {"diabetes":0.10,"disabled":0.08,"employed":0.60,"health_index":0.50,
+                "high_bp":0.25,"kidney_disease":0.03,"bipoc":0.50,"no_doctor":0.12,
+                "population":20000}
+    out = df.copy()
+    for name,_,_ in INDICATORS:
+        if name not in out.columns:
+            out[name] = defaults.get(name, 0.0)
+    if "population" not in out.columns:
+        out["population"] = defaults["population"]
+    return out
+
+# ---------------- Data loading ----------------
+@profiled()
+def read_csv_flex(path_or_buf):
+    try:    return pd.read_csv(path_or_buf, encoding="utf-8-sig")
+    except: return pd.read_csv(path_or_buf, engine="python", sep=None)
+
+def load_index_2025(df):
+    df = norm_cols(df)
+    if "zip" not in df.columns or "equityscore" not in df.columns:
+        raise ValueError(f"Expected columns: ['zip','equityscore']. Found: {list(df.columns)}")
+    df["zip"] = df["zip"].astype(str).str.zfill(5)
+    df["equityscore"] = pd.to_numeric(df["equityscore"], errors="coerce")
+    df["equityscore"] = df["equityscore"].fillna(df["equityscore"].median()).fillna(0.0)
+    return df[["zip","equityscore"]].drop_duplicates("zip").reset_index(drop=True)
+
+SLOPE_MAP = {
+    "diabetes_slope": "diabetes",
+    "disabled_slope": "disabled",
+    "hibp_slope": "high_bp",
+    "kidney_slope": "kidney_disease",
+    "healthindex_slope": "health_index",
+    "bipoc_slope": "bipoc",
+    "nodoc_slope": "no_doctor",
+    "employed_slope": "employed",
+}
+
+class HistSchema:
+    """Which header columns load_hist reads: output name -> source column as spelled in the file."""
+
+    def __init__(self, zip_col, base, slopes, population):
+        self.zip_col = zip_col
+        self.base = base               # metric -> latest-year source column
+        self.slopes = slopes           # metric -> slope source column
+        self.population = population   # source column or None
+
+    @property
+    def usecols(self):
+        cols = [self.zip_col, *self.base.values(), *self.slopes.values()]
+        if self.population: cols.append(self.population)
+        return list(dict.fromkeys(cols))
+
+    @property
+    def dtypes(self):
+        """Explicit read dtypes: ZIP as text, everything else float64."""
+        return {c: (str if c == self.zip_col else np.float64) for c in self.usecols}
+
+def hist_schema(columns):
+    """Resolve load_hist's renames, latest-year and slope columns once from a header."""
+    names = {}   # normalized name -> source column (first spelling wins)
+    for c in columns:
+        names.setdefault(str(c).strip().lower().replace(" ", "_"), c)
+
+    # Normalize year columns for starting levels
+    for y in range(2014, 2026):
+        if f"index_{y}" in names:
+            names[f"health_index_{y}"] = names.pop(f"index_{y}")
+    for y in [2017, 2019, 2021, 2022, 2023, 2024, 2025]:
+        if f"high_blood_pressure_{y}" in names:
+            names[f"high_bp_{y}"] = names.pop(f"high_blood_pressure_{y}")
+
+    if "zip" not in names:
+        raise ValueError("Historical CSV must include 'zip'.")
+
+    def _pick_latest_year_col(prefix):
+        candidates = []
+        for c in names:
+            if c.startswith(f"{prefix}_"):
+                tail = c.split(f"{prefix}_", 1)[1]
+                try:
+                    yr = int(tail.split("-")[0])
+                    candidates.append((yr, c))
+                except ValueError:
+                    pass
+        if not candidates: return None
+        return max(candidates)[1]
+
+    base_cols = {}
+    for m in ["diabetes","high_bp","kidney_disease","health_index"]:
+        c_latest = _pick_latest_year_col(m)
+        if c_latest: base_cols[m] = c_latest
+    nodoc_cols = [c for c in names if c.startswith("no_doctor_")]
+    if nodoc_cols: base_cols["no_doctor"] = sorted(nodoc_cols)[-1]
+    bipoc_cols = [c for c in names if c.startswith("bipoc_")]
+    if bipoc_cols: base_cols["bipoc"] = sorted(bipoc_cols)[-1]
+
+    return HistSchema(names["zip"], {k: names[c] for k, c in base_cols.items()},
+                      {v: names[k] for k, v in SLOPE_MAP.items() if k in names},
+                      names.get("population"))
+
+def _hist_rows(df, schema):
+    """load_hist's output columns for the rows of `df` (a whole file or one chunk)."""
+    df = df.reset_index(drop=True)
+    zips = df[schema.zip_col].astype(str).str.zfill(5)
+    out = pd.DataFrame({"zip": zips}).drop_duplicates().reset_index(drop=True)
+    for k, src in schema.base.items():
+        out[k] = pd.to_numeric(df[src], errors="coerce")
+
+    # Copy slopes
+    for metric, src in schema.slopes.items():
+        out[f"{metric}_slope"] = pd.to_numeric(df[src], errors="coerce").fillna(0.0)
+
+    if schema.population:
+        out["population"] = pd.to_numeric(df[schema.population], errors="coerce")
+    return out
+
+def _finish_hist(out):
+    # Scale to 0–1 if needed
+    if "health_index" in out.columns and pd.notna(out["health_index"]).any():
+        try:
+            if float(out["health_index"].max()) > 1.5:
+                out["health_index"] = out["health_index"] / 100.0
+        except: pass
+
+    out["year"] = 2024
+    return out
+
+@profiled()
+def load_hist(df):
+    return _finish_hist(_hist_rows(df, hist_schema(df.columns)))
+
+@profiled()
+def read_hist_chunked(path_or_buf, chunksize=20_000, stats=None):
+    """load_hist(read_csv_flex(...)) without holding the wide file in memory.
+
+    The header is read once and resolved with hist_schema; the body is then
+    parsed in `chunksize`-row chunks with usecols and explicit dtypes, so only
+    the ~15 needed columns of one chunk are ever materialized. Duplicate ZIPs
+    keep their first row. When `stats` (a dict) is given it receives rows,
+    chunks, columns read and the tracemalloc peak in MB (tracing costs time,
+    so it only runs then).
+    """
+    import tracemalloc
+    trace = stats is not None and not tracemalloc.is_tracing()
+    if trace: tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        if hasattr(path_or_buf, "seek"): path_or_buf.seek(0)
+        header = pd.read_csv(path_or_buf, encoding="utf-8-sig", nrows=0).columns
+        schema = hist_schema(header)
+        parts = []
+        for dtype in (schema.dtypes, str):
+            if hasattr(path_or_buf, "seek"): path_or_buf.seek(0)
+            try:
+                reader = pd.read_csv(path_or_buf, encoding="utf-8-sig", usecols=schema.usecols,
+                                     dtype=dtype, chunksize=chunksize)
+                parts = [_hist_rows(chunk, schema) for chunk in reader]
+                break
+            except ValueError:
+                if dtype is str: raise
+                # non-numeric cells: parse as text and coerce like load_hist does
+        out = pd.concat(parts, ignore_index=True) if parts else _hist_rows(pd.DataFrame(columns=schema.usecols), schema)
+        if len(parts) > 1:
+            out = out.drop_duplicates("zip").reset_index(drop=True)
+        out = _finish_hist(out)
+        peak = tracemalloc.get_traced_memory()[1] if trace else 0
+    finally:
+        if trace: tracemalloc.stop()
+    if stats is not None:
+        stats.update({"rows": len(out), "chunks": len(parts), "columns_read": len(schema.usecols),
+                      "columns_total": len(header), "peak_mb": peak / 2**20 if trace else None,
+                      "seconds": time.perf_counter() - t0})
+    return out
+
+# ---------------- Long panel (every observed year) ----------------
+# Column prefixes (normalized) of year-stamped level columns -> indicator
+PANEL_PREFIXES = {
+    "diabetes": "diabetes", "disability": "disabled", "disabled": "disabled", "employed": "employed",
+    "index": "health_index", "health_index": "health_index", "high_blood_pressure": "high_bp", "high_bp": "high_bp",
+    "kidney_disease": "kidney_disease", "bipoc": "bipoc", "no_doctor": "no_doctor",
+}
+# Last observed year. Later columns (Index_2025) are the model's own predictions, the
+# series in index_2025_predictions.csv, so the panel leaves them out.
+PANEL_MAX_YEAR = 2024
+
+def panel_columns(columns, window_year="mid", max_year=PANEL_MAX_YEAR):
+    """Year-stamped level columns of a wide header: source column -> (indicator, year).
+
+    Single years ("Index_2014") map to that year, 5-year windows
+    ("employed_2012-2016") to their midpoint, or to their end year with
+    window_year="end". Columns ending after `max_year` are skipped (None keeps all).
+    """
+    out = {}
+    for c in columns:
+        prefix, _, tail = str(c).strip().lower().replace(" ", "_").rpartition("_")
+        metric = PANEL_PREFIXES.get(prefix)
+        if metric is None: continue
+        first, _, last = tail.partition("-")
+        try:
+            y0 = int(first); y1 = int(last) if last else y0
+        except ValueError:
+            continue
+        if max_year is not None and y1 > max_year: continue
+        out[c] = (metric, (y0 + y1) // 2 if window_year == "mid" else y1)
+    return out
+
+@profiled()
+def load_hist_panel(df, window_year="mid", max_year=PANEL_MAX_YEAR):
+    """Every observed year-stamped level of a wide baseline in long form (through `max_year`).
+
+    Columns: zip, year, the indicators (0–1; an indicator whose values exceed
+    1.5 is taken as percent and divided by 100), population and the file's
+    <indicator>_slope columns as given. One row per (zip, year) with at least
+    one observation; indicators a year does not cover stay NaN.
+    """
+    names = {str(c).strip().lower().replace(" ", "_"): c for c in df.columns}
+    if "zip" not in names:
+        raise ValueError("Historical CSV must include 'zip'.")
+    df = df.drop_duplicates(names["zip"]).reset_index(drop=True)
+    zips = df[names["zip"]].astype(str).str.zfill(5).to_numpy()
+    cols = panel_columns(df.columns, window_year, max_year)
+    years = sorted({y for _, y in cols.values()})
+    ind = [n for n,_,_ in INDICATORS]
+    cube = np.full((len(zips), len(years), len(ind)), np.nan)
+    for src, (metric, y) in cols.items():
+        v = pd.to_numeric(df[src], errors="coerce").to_numpy(dtype=float)
+        cell = cube[:, years.index(y), ind.index(metric)]
+        cube[:, years.index(y), ind.index(metric)] = np.where(np.isnan(v), cell, v)
+    for k in range(len(ind)):
+        if np.nanmax(cube[..., k], initial=0.0) > 1.5:
+            cube[..., k] /= 100.0
+
+    u, t = np.nonzero(~np.isnan(cube).all(axis=2))
+    out = pd.DataFrame({"zip": zips[u], "year": np.asarray(years, dtype=int)[t]})
+    for k, n in enumerate(ind): out[n] = cube[u, t, k]
+    if "population" in names:
+        out["population"] = pd.to_numeric(df[names["population"]], errors="coerce").to_numpy(dtype=float)[u]
+    for col, metric in SLOPE_MAP.items():
+        if col in names:
+            out[f"{metric}_slope"] = pd.to_numeric(df[names[col]], errors="coerce").to_numpy(dtype=float)[u]
+    return out
+
+# ---------------- Slope normalization & calibration ----------------
+@profiled()
+def normalize_slopes(hist_df):
+    """Convert slopes to per-year fractions if they appear to be in % points or multi-year deltas."""
+    for m,_,_ in INDICATORS:
+        col = f"{m}_slope"
+        if col in hist_df.columns:
+            s = pd.to_numeric(hist_df[col], errors="coerce")
+            if s.isna().all(): 
+                hist_df[col] = 0.0
+                continue
+            med = float(s.abs().median())
+            # Heuristic conversions:
+            # If median |slope| > 0.05 (5pp), probably in 0–100 scale -> divide by 100
+            if med > 0.05:
+                s = s / 100.0
+            # If column name carries a 5-year window (common in rolling stats), divide by 5 (best-effort)
+            # (We can't infer reliably, so skip unless user asks)
+            hist_df[col] = s.fillna(0.0)
+    return hist_df
+
+@profiled()
+def compute_slopes(hist_df):
+    slopes = {}
+    for z, g in hist_df.groupby("zip"):
+        row = g.iloc[0]
+        entry = {}
+        for m,_,_ in INDICATORS:
+            col = f"{m}_slope"
+            val = row[col] if col in g.columns else 0.0
+            entry[m] = float(val) if pd.notna(val) else 0.0
+        slopes[z] = entry
+    return slopes
+
+def synthesize_from_equity(eq_df, start_year):
+    base = eq_df.copy()
+    base["year"] = start_year - 1
+    eq_min, eq_max = base["equityscore"].min(), base["equityscore"].max()
+    span = (eq_max - eq_min) if (eq_max - eq_min) != 0 else 1.0
+    base["health_index"] = (base["equityscore"] - eq_min) / span
+    base["employed"] = base["health_index"].clip(0,1)*0.4 + 0.4
+    for c in ["diabetes","high_bp","no_doctor","kidney_disease","disabled"]:
+        base[c] = (1 - base["health_index"]).clip(0,1)*0.2 + 0.2
+    base["bipoc"] = 0.5
+    base["population"] = 20000
+    cols = ["zip","year","population"] + [n for n,_,_ in INDICATORS]
+    return base[cols]
@@ -0,0 +1,329 @@
+# clinicsim/engine.py — array-backed simulation engine
+#
+# Same model as model.simulate_one_year, but the state is a units × indicators
+# float matrix with aligned population / slope arrays, and one year is a
+# handful of batched NumPy operations instead of a per-ZIP Python loop.
+#
+# Column order follows INDICATORS, policy order follows POLICY_TARGETS and
+# event order follows EVENT_TEMPLATES, so results (including the order in which
+# random events are drawn) match the dict implementation.
+#
+# Sessions keep their state between runs as a StateTable: the same arrays,
+# read-only, so every session can start from one shared baseline without
+# copying it (rather than a dict of per-ZIP dicts of boxed floats).
+#
+# pandas is only imported inside the functions that build frames, so the
+# engine (and model) import with NumPy alone.
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from .model import (
+    INDICATORS, POLICY_TARGETS, ANNUAL_CAPS, EVENT_TEMPLATES, EVENT_RATES, SCORE_DISP_COLS, score_from_moments,
+)
+from .allocation import need_weights_arrays, allocate, allocated_dollars
+from .profiling import profiled
+
+IND_NAMES = [n for n,_,_ in INDICATORS]
+IND_POS = {n: i for i, n in enumerate(IND_NAMES)}
+POLICIES = list(POLICY_TARGETS)
+EVENT_NAMES = [name for name,_ in EVENT_TEMPLATES]
+
+# Fixed per-indicator tables
+CAPS = np.array([ANNUAL_CAPS.get(n, 0.02) for n in IND_NAMES])
+EVENT_EFFECTS = np.array([[eff.get(n, 0.0) for n in IND_NAMES] for _, eff in EVENT_TEMPLATES])
+EVENT_P = np.array([EVENT_RATES[name] for name in EVENT_NAMES])
+# Indicators that get the non-worsening bias (small negative deltas -> 0)
+NON_WORSENING = np.array([n in ("employed", "health_index") for n in IND_NAMES])
+
+
+
+@dataclass
+class StateArrays:
+    """Per-unit state: values[u, k] is indicator k of zips[u]."""
+    zips: list
+    values: np.ndarray       # (U, K) float64, 0–1
+    population: np.ndarray   # (U,)   float64
+
+    def copy(self):
+        return StateArrays(list(self.zips), self.values.copy(), self.population.copy())
+
+
+@dataclass
+class YearArrays:
+    """Output of one simulated year (the array analogue of df_year)."""
+    year: int
+    zips: list
+    values: np.ndarray       # (U, K)
+    population: np.ndarray   # (U,)
+    pc: np.ndarray           # (U, P) per-capita allocation by policy
+    events: np.ndarray       # (U, E) bool, event fired
+    spend: np.ndarray = None # (P,) dollars actually allocated by policy (floors included)
+
+    def to_frame(self):
+        """Long-format frame with the same columns as simulate_one_year's df_year."""
+        return long_frame(np.full(len(self.zips), self.year), self.zips, self.values,
+                          self.population, self.pc, self.events)
+
+
+def event_labels(events):
+    """(N, E) bool mask -> comma-joined event names per row ("" when none fired)."""
+    labels = np.full(events.shape[0], "", dtype=object)
+    for r in np.flatnonzero(events.any(axis=1)):
+        labels[r] = ", ".join(EVENT_NAMES[e] for e in np.flatnonzero(events[r]))
+    return labels
+
+def long_frame(year, zips, values, population, pc, events):
+    """Build one long-format result frame from flat (N, ...) row arrays."""
+    import pandas as pd
+    df = pd.DataFrame({"year": year, "zip": zips, "population": population,
+                       "events": event_labels(events)})
+    for k, n in enumerate(IND_NAMES): df[n] = values[:, k]
+    for p, pol in enumerate(POLICIES): df[f"pc_{pol}"] = pc[:, p]
+    return df
+
+
+# ---------------- Conversions ----------------
+def states_to_arrays(states, zips=None):
+    zips = list(states) if zips is None else list(zips)
+    values = np.array([[states[z].get(n, 0.5) for n in IND_NAMES] for z in zips], dtype=float).reshape(len(zips), len(IND_NAMES))
+    pop = np.array([states[z].get("population", 20000) for z in zips], dtype=float)
+    return StateArrays(zips, values, pop)
+
+def arrays_to_states(arr):
+    states = {}
+    for z, row, pop in zip(arr.zips, arr.values.tolist(), arr.population.tolist()):
+        s = dict(zip(IND_NAMES, row)); s["population"] = pop
+        states[z] = s
+    return states
+
+def slopes_to_matrix(slopes, zips):
+    """compute_slopes-style dict {zip: {metric: slope}} -> (U, K) matrix aligned with zips."""
+    return np.array([[slopes.get(z, {}).get(n, 0.0) for n in IND_NAMES] for z in zips], dtype=float).reshape(len(zips), len(IND_NAMES))
+
+def slope_matrix(hist_df, zips):
+    """(U, K) slope matrix straight from hist_df (first row per ZIP, like compute_slopes)."""
+    import pandas as pd
+    cols = [f"{n}_slope" for n in IND_NAMES]
+    first = hist_df.drop_duplicates("zip").set_index("zip").reindex(list(zips))
+    mat = first.reindex(columns=cols).apply(pd.to_numeric, errors="coerce")
+    return mat.fillna(0.0).to_numpy(dtype=float)
+
+def policy_matrices(E_MAX, PC50):
+    """E_MAX dict -> (P, K) matrix restricted to each policy's targets; PC50 dict -> (P,)."""
+    emax = np.zeros((len(POLICIES), len(IND_NAMES)))
+    for p, pol in enumerate(POLICIES):
+        for m in POLICY_TARGETS[pol]:
+            emax[p, IND_POS[m]] = E_MAX[pol].get(m, 0.0)
+    pc50 = np.array([PC50[pol] for pol in POLICIES], dtype=float)
+    return emax, pc50
+
+
+def _frozen(a):
+    v = np.asarray(a).view()
+    v.flags.writeable = False
+    return v
+
+
+# ---------------- Compact session state ----------------
+class StateTable:
+    """Immutable per-ZIP state for session storage: (U, K) values, (U,) population and a ZIP -> row index.
+
+    The arrays are read-only views, so a table built from the shared baseline costs no copy of it; stepping
+    makes a new table (replace) that shares the ZIP list and index with the one it came from.
+    """
+    __slots__ = ("zips", "values", "population", "_index")
+
+    def __init__(self, zips, values, population, index=None):
+        self.zips = zips
+        self.values = _frozen(values)
+        self.population = _frozen(population)
+        self._index = index
+
+    @classmethod
+    def from_arrays(cls, arr):
+        return cls(arr.zips, arr.values, arr.population)
+
+    @classmethod
+    def from_states(cls, states, zips=None):
+        return cls.from_arrays(states_to_arrays(states, zips))
+
+    def replace(self, arr):
+        """Table holding arr's values; keeps this table's ZIP list and index when arr has the same ZIPs."""
+        if arr.zips is self.zips or list(arr.zips) == list(self.zips):
+            return StateTable(self.zips, arr.values, arr.population, self._index)
+        return StateTable.from_arrays(arr)
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = {z: i for i, z in enumerate(self.zips)}
+        return self._index
+
+    def __len__(self):
+        return len(self.zips)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.population.nbytes
+
+    def to_arrays(self):
+        """StateArrays over the same (read-only) buffers, for the array engine."""
+        return StateArrays(self.zips, self.values, self.population)
+
+    def to_states(self):
+        return arrays_to_states(self.to_arrays())
+
+    def state(self, z):
+        """One ZIP's state dict, like states[z]."""
+        i = self.index[z]
+        s = dict(zip(IND_NAMES, self.values[i].tolist())); s["population"] = float(self.population[i])
+        return s
+
+    # Persistence: the ZIP list and two arrays; the index is rebuilt on first use
+    def __getstate__(self):
+        return {"zips": list(self.zips), "values": np.asarray(self.values), "population": np.asarray(self.population)}
+
+    def __setstate__(self, d):
+        self.__init__(d["zips"], d["values"], d["population"])
+
+    def to_bytes(self):
+        """Uncompressed .npz payload (no pickle) of the ZIPs, values and population."""
+        import io
+        buf = io.BytesIO()
+        np.savez(buf, zips=np.asarray(self.zips, dtype=str), values=self.values, population=self.population)
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        import io
+        with np.load(io.BytesIO(data), allow_pickle=False) as f:
+            return cls(f["zips"].tolist(), f["values"], f["population"])
+
+
+# ---------------- Simulation ----------------
+def budget_by_policy(city_budget, splits):
+    """Dollars per policy (P,), after normalizing the splits to 100%."""
+    total = sum(splits.values()) or 1.0
+    sp = np.array([100.0*splits[p]/total for p in POLICIES])
+    return city_budget * (sp/100.0)
+
+def draw_events(rng, n_units, events_on):
+    """(U, E) event mask; draws rng.random() in the same zip-major order as the dict engine."""
+    if not events_on or n_units == 0:
+        return np.zeros((n_units, len(EVENT_NAMES)), dtype=bool)
+    u = np.array([rng.random() for _ in range(n_units * len(EVENT_NAMES))]).reshape(n_units, -1)
+    return u < EVENT_P
+
+def step_arrays(values, pop, slope_mat, dollars, floor_pc, emax, pc50, eff_mult, events=None, rule="proportional",
+                caps=None):
+    """One model year on batched arrays.
+
+    values (..., U, K), pop (..., U), slope_mat (U, K), dollars (..., P) per policy,
+    events (..., U, E) bool or None. floor_pc / eff_mult may be scalars or arrays that
+    broadcast against (..., U, P) / (..., U, K), and emax may be (P, K) or
+    (..., 1, P, K) per batch member, so replicate or candidate axes can be stacked
+    in front. `rule` is one of allocation.ALLOCATION_RULES; `caps` (default CAPS)
+    may be (..., 1, K) per batch member. Returns (new_values, new_pop, pc).
+    """
+    pc = allocate(dollars, need_weights_arrays(values), pop, floor_pc, rule)
+
+    sat = 1.0 - np.exp(-np.maximum(pc, 0.0) / np.maximum(1e-9, pc50))
+    applied = np.broadcast_to(slope_mat, values.shape).copy()
+    for p in range(len(POLICIES)):
+        applied += eff_mult * emax[..., p, :] * sat[..., p, None]
+
+    if events is not None:
+        for e in range(len(EVENT_NAMES)):
+            if events[..., e].any():
+                applied += events[..., e, None] * EVENT_EFFECTS[e]
+
+    caps = CAPS if caps is None else caps
+    delta = np.clip(applied, -caps, caps)
+    delta[..., NON_WORSENING] = np.where((delta[..., NON_WORSENING] < 0) & (delta[..., NON_WORSENING] > -0.002),
+                                         0.0, delta[..., NON_WORSENING])
+    new_values = np.clip(values + delta, 0.0, 1.0)
+    new_pop = np.maximum(100, pop * (1.0 + 0.002*(new_values[..., IND_POS["employed"]] - 0.6)))
+    return new_values, new_pop, pc
+
+@profiled()
+def simulate_one_year_arrays(year, arr, slope_mat, city_budget, splits, floor_pc, E_MAX, PC50, events_on, eff_mult, rng,
+                             rule="proportional"):
+    """Array version of simulate_one_year (plus allocation rules). Returns (new StateArrays, YearArrays, score)."""
+    emax, pc50 = policy_matrices(E_MAX, PC50) if isinstance(E_MAX, dict) else (E_MAX, PC50)
+    events = draw_events(rng, len(arr.zips), events_on)
+    new_values, new_pop, pc = step_arrays(arr.values, arr.population, slope_mat,
+                                          budget_by_policy(city_budget, splits), floor_pc,
+                                          emax, pc50, eff_mult, events, rule)
+    new_arr = StateArrays(arr.zips, new_values, new_pop)
+    out = YearArrays(year, arr.zips, new_values, new_pop, pc, events, allocated_dollars(pc, arr.population))
+    return new_arr, out, compute_score_arrays(new_values)
+
+def moments(values, weights=None):
+    """Citywide (mean, std) per indicator of a (U, K) matrix as name -> value dicts.
+
+    Unweighted std uses ddof=1 like pandas; with population `weights` both moments
+    are population-weighted.
+    """
+    if weights is None:
+        mean = values.mean(axis=0)
+        std = values.std(axis=0, ddof=1) if values.shape[0] > 1 else np.full(values.shape[1], np.nan)
+    else:
+        w = weights / weights.sum()
+        mean = w @ values
+        std = np.sqrt(w @ (values - mean)**2)
+    return dict(zip(IND_NAMES, mean.tolist())), dict(zip(IND_NAMES, std.tolist()))
+
+@profiled()
+def compute_score_arrays(values, weights=None):
+    """compute_score on a (U, K) value matrix (optionally population-weighted)."""
+    return score_from_moments(*moments(values, weights))
+
+SCORE_DISP_POS = [IND_POS[c] for c in SCORE_DISP_COLS]
+
+def compute_score_batch(values, decimals=1):
+    """compute_score over a batch: (..., U, K) values -> (...) scores (decimals=None: unrounded)."""
+    means = values.mean(axis=-2)
+    pos = lambda c: np.clip(means[..., IND_POS[c]], 0.0, 1.0)
+    inv = lambda c: np.clip(1 - means[..., IND_POS[c]], 0.0, 1.0)
+    if values.shape[-2] > 1:
+        disp = values[..., SCORE_DISP_POS].std(axis=-2, ddof=1).sum(axis=-1) / 6.0
+        equity = np.clip(1 - 2.0*disp, 0.0, 1.0)
+    else:
+        equity = np.ones(values.shape[:-2])
+    comp = (0.18*pos("employed") + 0.18*pos("health_index") +
+            0.18*inv("no_doctor") + 0.18*inv("diabetes") +
+            0.14*inv("high_bp")   + 0.04*inv("kidney_disease") +
+            0.10*equity)
+    return 100*comp if decimals is None else np.round(100*comp, decimals)
+
+@profiled()
+def run_horizon(arr, slope_mat, years, start_year, city_budget, splits, floor_pc, E_MAX, PC50, events_on, eff_mult, rng,
+                rule="proportional"):
+    """Run `years` consecutive years in one call.
+
+    Policy tables and slopes are resolved once; per-year outputs are written
+    into preallocated (years, U, ...) blocks and turned into a single long
+    frame at the end. Returns (final StateArrays, long frame, [{"year", "score", "spend"}]).
+    """
+    emax, pc50 = policy_matrices(E_MAX, PC50) if isinstance(E_MAX, dict) else (E_MAX, PC50)
+    n_units, years = len(arr.zips), int(years)
+    values = np.empty((years, n_units, len(IND_NAMES)))
+    pops = np.empty((years, n_units))
+    pcs = np.empty((years, n_units, len(POLICIES)))
+    events = np.empty((years, n_units, len(EVENT_NAMES)), dtype=bool)
+    scores = []
+    for i in range(years):
+        yr = start_year + i
+        arr, out, score = simulate_one_year_arrays(yr, arr, slope_mat, city_budget, splits, floor_pc,
+                                                   emax, pc50, events_on, eff_mult, rng, rule)
+        values[i], pops[i], pcs[i], events[i] = out.values, out.population, out.pc, out.events
+        scores.append({"year": yr, "score": score, "spend": float(out.spend.sum())})
+
+    n = years * n_units
+    df = long_frame(np.repeat(np.arange(start_year, start_year + years), n_units),
+                    np.tile(np.asarray(arr.zips, dtype=object), years),
+                    values.reshape(n, -1), pops.reshape(n), pcs.reshape(n, -1), events.reshape(n, -1))
+    return arr, df, scores
+
@@ -0,0 +1,132 @@
+# clinicsim/ensemble.py — Monte Carlo ensemble over random events
+#
+# Runs R replicates with random events ON as an extra leading axis of the
+# array engine (state is (R, U, K)), then reduces each year to percentile
+# bands per ZIP, citywide (unweighted ZIP mean, like the trends chart) and for
+# the composite score. Years run in blocks of at most BLOCK_MB of per-year
+# values, each reduced to bands before the next starts, so memory follows the
+# block size rather than replicates × years.
+#
+# Replicate r always draws from child r of SeedSequence(seed), so a replicate's
+# path does not depend on how many replicates run or how they are split across
+# worker processes.
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .engine import (
+    IND_NAMES, EVENT_NAMES, EVENT_P, policy_matrices, budget_by_policy, step_arrays, compute_score_batch,
+)
+from .profiling import profiled
+
+PERCENTILES = (5, 50, 95)
+BLOCK_MB = 64     # per-year float32 values buffered before reducing to bands
+
+
+@dataclass
+class EnsembleResult:
+    years: np.ndarray        # (Y,)
+    zips: list
+    percentiles: tuple       # (Q,)
+    zip_bands: np.ndarray    # (Y, Q, U, K)
+    city_bands: np.ndarray   # (Y, Q, K)
+    score_bands: np.ndarray  # (Y, Q)
+    replicates: int
+    seed: int
+
+    def _pcols(self):
+        return [f"p{q:g}" for q in self.percentiles]
+
+    def city_frame(self):
+        """Long frame: year, indicator, p5, p50, p95 (indicator 'score' = composite score)."""
+        Y, Q, K = self.city_bands.shape
+        df = pd.DataFrame({"year": np.repeat(self.years, K), "indicator": np.tile(IND_NAMES, Y)})
+        for q, c in enumerate(self._pcols()): df[c] = self.city_bands[:, q, :].reshape(-1)
+        sc = pd.DataFrame({"year": self.years, "indicator": "score"})
+        for q, c in enumerate(self._pcols()): sc[c] = self.score_bands[:, q]
+        return pd.concat([df, sc], ignore_index=True)
+
+    def _zip_rows(self, s, e):
+        Y, (Q, U, K) = e - s, self.zip_bands.shape[1:]
+        df = pd.DataFrame({"year": np.repeat(self.years[s:e], U*K),
+                           "zip": np.tile(np.repeat(np.asarray(self.zips, dtype=object), K), Y),
+                           "indicator": np.tile(IND_NAMES, Y*U)})
+        for q, c in enumerate(self._pcols()):
+            df[c] = self.zip_bands[s:e, q].reshape(-1)
+        return df
+
+    def zip_frame(self):
+        """Long frame: year, zip, indicator, p5, p50, p95."""
+        return self._zip_rows(0, len(self.years))
+
+    def iter_zip_frames(self, years_per_chunk=1):
+        """zip_frame() in chunks of a few years each (for clinicsim.export)."""
+        for s in range(0, len(self.years), years_per_chunk):
+            yield self._zip_rows(s, min(len(self.years), s + years_per_chunk))
+
+
+def _run_replicates(vals, pops, gens, years, slope_mat, dollars, floor_pc, emax, pc50, eff_mult, rule):
+    """Advance (R, U, K) state `years` years, one generator per replicate.
+
+    Returns (vals, pops, gens) after the last year plus per-year values (years, R, U, K)
+    float32 and scores (years, R).
+    """
+    R, U, K = vals.shape
+    out_vals = np.empty((years, R, U, K), dtype=np.float32)
+    out_scores = np.empty((years, R))
+    for i in range(years):
+        events = np.stack([g.random((U, len(EVENT_NAMES))) for g in gens]) < EVENT_P
+        vals, pops, _pc = step_arrays(vals, pops, slope_mat, dollars, floor_pc, emax, pc50, eff_mult, events, rule)
+        out_vals[i] = vals
+        out_scores[i] = compute_score_batch(vals)
+    return vals, pops, gens, out_vals, out_scores
+
+def _run_chunk(args):
+    return _run_replicates(*args)
+
+@profiled()
+def run_ensemble(arr, slope_mat, years, start_year, city_budget, splits, floor_pc, E_MAX, PC50, eff_mult,
+                 replicates=1000, seed=0, percentiles=PERCENTILES, workers=1, rule="proportional"):
+    """Run `replicates` independently seeded event paths for `years` years from `arr`.
+
+    workers > 1 splits the replicate axis over a process pool; each chunk is still
+    vectorized, and results are identical to workers=1.
+    """
+    emax, pc50 = policy_matrices(E_MAX, PC50) if isinstance(E_MAX, dict) else (E_MAX, PC50)
+    dollars = budget_by_policy(city_budget, splits)
+    gens = [np.random.default_rng(ss) for ss in np.random.SeedSequence(seed).spawn(int(replicates))]
+    R, years, (U, K) = len(gens), int(years), arr.values.shape
+    vals = np.broadcast_to(arr.values, (R, U, K)).copy()
+    pops = np.broadcast_to(arr.population, (R, U)).copy()
+    common = (slope_mat, dollars, floor_pc, emax, pc50, eff_mult, rule)
+    block = max(1, int(BLOCK_MB * 2**20 // max(1, R * U * K * 4)))
+
+    q = np.asarray(percentiles, dtype=float)
+    zip_bands = np.empty((years, len(q), U, K))
+    city_bands = np.empty((years, len(q), K))
+    score_bands = np.empty((years, len(q)))
+    chunks = [c for c in np.array_split(np.arange(R), workers) if len(c)] if workers and workers > 1 and R > 1 else []
+    ex = ProcessPoolExecutor(max_workers=len(chunks)) if chunks else None
+    try:
+        for s in range(0, years, block):
+            n = min(block, years - s)
+            if ex is None:
+                vals, pops, gens, out_vals, out_scores = _run_replicates(vals, pops, gens, n, *common)
+            else:
+                # each chunk carries its state and generators from block to block
+                parts = list(ex.map(_run_chunk, [(vals[c], pops[c], [gens[i] for i in c], n, *common) for c in chunks]))
+                vals = np.concatenate([p[0] for p in parts]); pops = np.concatenate([p[1] for p in parts])
+                gens = [g for p in parts for g in p[2]]
+                out_vals = np.concatenate([p[3] for p in parts], axis=1)
+                out_scores = np.concatenate([p[4] for p in parts], axis=1)
+            zip_bands[s:s + n] = np.percentile(out_vals, q, axis=1).transpose(1, 0, 2, 3)            # (n, Q, U, K)
+            city_bands[s:s + n] = np.percentile(out_vals.mean(axis=2), q, axis=1).transpose(1, 0, 2)  # (n, Q, K)
+            score_bands[s:s + n] = np.percentile(out_scores, q, axis=1).T                             # (n, Q)
+            del out_vals
+    finally:
+        if ex is not None: ex.shutdown()
+    return EnsembleResult(np.arange(start_year, start_year + years), list(arr.zips), tuple(percentiles),
+                          zip_bands, city_bands, score_bands, int(replicates), seed)
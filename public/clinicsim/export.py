@@ -0,0 +1,124 @@
+# clinicsim/export.py — streaming export of long result frames
+#
+# Writers consume an iterable of DataFrame chunks (a few years of rows each,
+# e.g. HistoryBuffer.iter_frames) and never hold more than one chunk plus the
+# encoded output:
+#
+#   csv            plain CSV, header once
+#   csv.gz         gzip CSV, one compressed block per chunk
+#   parquet        one row group per chunk; floats as float32, ZIP / event /
+#                  indicator labels dictionary-encoded
+#   parquet-years  Hive-style partitions year=YYYY/part-N.parquet in a .zip
+#                  archive (year comes from the path, as pyarrow.dataset and
+#                  DuckDB read it)
+#
+# export_file() writes into a spooled temp file (RAM up to SPOOL_BYTES, then
+# disk) and returns it rewound. Hand it to st.download_button as a callable
+# so nothing is encoded until the user clicks. Parquet needs pyarrow;
+# export_formats() lists only what can be written here.
+
+import gzip
+import io
+import tempfile
+import zipfile
+
+import numpy as np
+
+SPOOL_BYTES = 32 * 2**20
+DICT_COLUMNS = ("zip", "events", "indicator")
+
+# format -> (label, file suffix, MIME type)
+EXPORT_FORMATS = {
+    "csv": ("CSV", ".csv", "text/csv"),
+    "csv.gz": ("Compressed CSV", ".csv.gz", "application/gzip"),
+    "parquet": ("Parquet", ".parquet", "application/vnd.apache.parquet"),
+    "parquet-years": ("Parquet, partitioned by year", ".zip", "application/zip"),
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet export needs pyarrow (pip install pyarrow); CSV works without it.") from e
+    return pa, pq
+
+def export_formats():
+    """EXPORT_FORMATS entries that can be written in this environment."""
+    try:
+        _pyarrow()
+    except ImportError:
+        return {k: v for k, v in EXPORT_FORMATS.items() if k.startswith("csv")}
+    return dict(EXPORT_FORMATS)
+
+
+# ---------------- Writers ----------------
+def write_csv(chunks, f):
+    """CSV of all chunks into binary file object f."""
+    header = True
+    for df in chunks:
+        f.write(df.to_csv(index=False, header=header).encode("utf-8"))
+        header = False
+
+def write_csv_gz(chunks, f, compresslevel=3):
+    """gzip CSV of all chunks into binary file object f."""
+    with gzip.GzipFile(fileobj=f, mode="wb", compresslevel=compresslevel, mtime=0) as gz:
+        write_csv(chunks, gz)
+
+def arrow_table(df, drop=()):
+    """Chunk -> pyarrow Table: floats as float32, ints as int32, label columns dictionary-encoded."""
+    pa, _ = _pyarrow()
+    cols, names = [], []
+    for c in df.columns:
+        if c in drop: continue
+        s = df[c]
+        if c in DICT_COLUMNS:
+            arr = pa.array(s.astype(str).to_numpy(), type=pa.string()).dictionary_encode()
+        elif s.dtype.kind == "f":
+            arr = pa.array(s.to_numpy(dtype=np.float32))
+        elif s.dtype.kind in "iu":
+            arr = pa.array(s.to_numpy(dtype=np.int32))
+        else:
+            arr = pa.array(s.to_numpy())
+        cols.append(arr); names.append(c)
+    return pa.Table.from_arrays(cols, names=names)
+
+def write_parquet(chunks, f, compression="zstd"):
+    """Parquet with one row group per chunk into binary file object f."""
+    _, pq = _pyarrow()
+    writer = None
+    try:
+        for df in chunks:
+            table = arrow_table(df)
+            if writer is None:
+                writer = pq.ParquetWriter(f, table.schema, compression=compression)
+            writer.write_table(table.cast(writer.schema))
+    finally:
+        if writer is not None: writer.close()
+
+def write_parquet_years(chunks, f, compression="zstd"):
+    """Zip archive of year=YYYY/part-N.parquet files (the year column lives in the path)."""
+    _, pq = _pyarrow()
+    parts = {}
+    with zipfile.ZipFile(f, "w", compression=zipfile.ZIP_STORED) as zf:       # Parquet is already compressed
+        for df in chunks:
+            years = df["year"].to_numpy()
+            for y in np.unique(years):
+                sel = df.iloc[np.flatnonzero(years == y)]
+                n = parts.get(int(y), 0); parts[int(y)] = n + 1
+                buf = io.BytesIO()
+                pq.write_table(arrow_table(sel, drop=("year",)), buf, compression=compression)
+                zf.writestr(f"year={int(y)}/part-{n}.parquet", buf.getvalue())
+
+WRITERS = {"csv": write_csv, "csv.gz": write_csv_gz, "parquet": write_parquet, "parquet-years": write_parquet_years}
+
+
+def export_file(chunks, fmt="csv.gz"):
+    """Write chunks in `fmt` to a spooled temp file; returns it rewound, ready to read."""
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format {fmt!r} (expected one of {tuple(WRITERS)})")
+    f = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    WRITERS[fmt](chunks, f)
+    f.seek(0)
+    return f
@@ -0,0 +1,275 @@
+# clinicsim/geo.py — simplified ZCTA geometry as TopoJSON, built ahead of time
+#
+# Pipeline (python -m clinicsim geo build):
+#   1. features   — ZCTA GeoJSON features (by default the ones baked into the
+#                   Folium map interactive_predicted_index_map_2025.html)
+#   2. topology   — coordinates quantized to a 1e5 grid, rings cut at junctions
+#                   into arcs, shared borders stored once
+#   3. simplify   — Douglas–Peucker per arc at one tolerance per zoom tier, so
+#                   neighbouring ZCTAs stay gap-free at every tier
+#   4. write      — geo/zcta.<tier>.topo.json (delta-encoded integer arcs)
+#
+# Values are never baked in: the app joins indicator values per year by ZIP id
+# at render time, and the site joins geo/zcta.values.json (python -m clinicsim
+# geo values: the default scenario's health index per ZIP per simulated year)
+# the same way. Only predicted_index_2025 rides along in the tiers, as the
+# fallback when no values file is present. build_report() compares payload
+# size and decode/figure time against the Folium file.
+
+import gzip
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .layout import features_from_folium, FOLIUM_MAP_PATH
+
+GEO_DIR = Path(__file__).resolve().parent.parent / "geo"
+QUANTIZATION = 100_000
+# tier -> Douglas–Peucker tolerance in degrees (~1 km, ~250 m, ~60 m)
+TIERS = {"z7": 0.01, "z9": 0.0025, "z11": 0.0006}
+KEEP_PROPERTIES = ("zip", "predicted_index_2025")
+
+_DECODED = {}   # (path, mtime_ns) -> GeoJSON FeatureCollection
+
+
+# ---------------- Topology ----------------
+def _polygons(geom):
+    return [geom["coordinates"]] if geom["type"] == "Polygon" else geom["coordinates"]
+
+def _quantize(features, q=QUANTIZATION):
+    pts = np.concatenate([np.asarray(ring, dtype=float).reshape(-1, 2)
+                          for f in features for poly in _polygons(f["geometry"]) for ring in poly])
+    lo, hi = pts.min(axis=0), pts.max(axis=0)
+    scale = np.maximum(hi - lo, 1e-12) / (q - 1)
+    return lo, scale
+
+def build_topology(features, q=QUANTIZATION):
+    """Quantized rings cut at junctions into shared arcs.
+
+    Returns (arcs: list of (n, 2) int arrays, shapes: per feature a list of
+    polygons, each a list of rings, each a list of arc refs (~i = arc i reversed),
+    transform: (translate, scale)).
+    """
+    lo, scale = _quantize(features, q)
+    rings = []                                        # (feature, polygon, ring) -> list of int tuples
+    for fi, f in enumerate(features):
+        for pi, poly in enumerate(_polygons(f["geometry"])):
+            for ring in poly:
+                r = np.round((np.asarray(ring, dtype=float).reshape(-1, 2) - lo) / scale).astype(np.int64)
+                keep = np.ones(len(r), dtype=bool)
+                keep[1:] = (np.diff(r, axis=0) != 0).any(axis=1)   # drop repeats created by quantizing
+                r = [tuple(p) for p in r[keep].tolist()]
+                if len(r) > 1 and r[0] == r[-1]: r = r[:-1]
+                if len(r) >= 3: rings.append((fi, pi, r))
+
+    # a point is a junction when it is seen with different neighbours
+    seen, junction = {}, set()
+    for _, _, r in rings:
+        n = len(r)
+        for i, p in enumerate(r):
+            nb = frozenset((r[i - 1], r[(i + 1) % n]))
+            prev = seen.setdefault(p, nb)
+            if prev != nb: junction.add(p)
+
+    arc_index, arcs = {}, []
+    def arc_ref(seq):
+        key, rkey = tuple(seq), tuple(reversed(seq))
+        if key in arc_index: return arc_index[key]
+        if rkey in arc_index: return ~arc_index[rkey]
+        arc_index[key] = len(arcs); arcs.append(np.array(seq, dtype=np.int64))
+        return arc_index[key]
+
+    shapes = [[] for _ in features]
+    poly_slot = {}
+    for fi, pi, r in rings:
+        cuts = [i for i, p in enumerate(r) if p in junction]
+        if not cuts:
+            # closed arc: canonical start at the smallest point, orientation-free key
+            k = r.index(min(r)); r = r[k:] + r[:k]
+            refs = [arc_ref(r + [r[0]])]
+        else:
+            r = r[cuts[0]:] + r[:cuts[0]]
+            cuts = [c - cuts[0] for c in cuts] + [len(r)]
+            ext = r + [r[0]]
+            refs = [arc_ref(ext[a:b + 1]) for a, b in zip(cuts[:-1], cuts[1:])]
+        slot = poly_slot.get((fi, pi))
+        if slot is None:
+            slot = poly_slot[(fi, pi)] = len(shapes[fi]); shapes[fi].append([])
+        shapes[fi][slot].append(refs)
+    return arcs, shapes, (lo, scale)
+
+
+# ---------------- Simplification ----------------
+def _douglas_peucker(pts, tol, min_points=2):
+    """Keep-mask of Douglas–Peucker on an (n, 2) polyline (endpoints always kept)."""
+    n = len(pts)
+    keep = np.zeros(n, dtype=bool); keep[0] = keep[-1] = True
+    if n <= 2: return keep
+    p = pts.astype(float)
+    closed = (p[0] == p[-1]).all()
+    stack = [(0, n - 1)]
+    if closed:
+        # a loop has no baseline: split at the point farthest from the start
+        k = int(np.argmax(((p - p[0])**2).sum(axis=1)))
+        keep[k] = True
+        stack = [(0, k), (k, n - 1)]
+        min_points = max(min_points, 4)
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2: continue
+        a, b, mid = p[i], p[j], p[i + 1:j]
+        ab = b - a
+        L = np.hypot(*ab)
+        d = np.abs(ab[0] * (mid[:, 1] - a[1]) - ab[1] * (mid[:, 0] - a[0])) / L if L > 0 \
+            else np.hypot(*(mid - a).T)
+        k = int(np.argmax(d))
+        if d[k] > tol:
+            keep[i + 1 + k] = True
+            stack += [(i, i + 1 + k), (i + 1 + k, j)]
+    while keep.sum() < min(min_points, n):
+        # forced extra vertices (tiny islands / two-arc rings stay polygons)
+        cand = np.flatnonzero(~keep)
+        kept = np.flatnonzero(keep)
+        dist = np.abs(cand[:, None] - kept[None, :]).min(axis=1)
+        keep[cand[np.argmax(dist)]] = True
+    return keep
+
+def simplify_arcs(arcs, shapes, tolerance, scale):
+    """Simplified copies of `arcs` at `tolerance` degrees (quantized units follow `scale`)."""
+    tol_q = tolerance / float(np.mean(scale))
+    min_pts = np.full(len(arcs), 2)
+    for polys in shapes:
+        for poly in polys:
+            for refs in poly:
+                if len(refs) == 2:
+                    for r in refs: min_pts[r if r >= 0 else ~r] = 3
+    return [a[_douglas_peucker(a, tol_q, int(m))] for a, m in zip(arcs, min_pts)]
+
+
+# ---------------- TopoJSON ----------------
+def to_topojson(features, arcs, shapes, transform, keep_properties=KEEP_PROPERTIES):
+    lo, scale = transform
+    geoms = []
+    for f, polys in zip(features, shapes):
+        if not polys: continue
+        props = {k: f["properties"][k] for k in keep_properties if k in f["properties"]}
+        zip_id = str(f["properties"].get("zip") or f["properties"].get("ZCTA5CE10"))
+        if len(polys) == 1:
+            geoms.append({"type": "Polygon", "id": zip_id, "arcs": polys[0], "properties": props})
+        else:
+            geoms.append({"type": "MultiPolygon", "id": zip_id, "arcs": polys, "properties": props})
+    enc = []
+    for a in arcs:
+        d = a.copy(); d[1:] = np.diff(a, axis=0)
+        enc.append(d.tolist())
+    return {"type": "Topology",
+            "transform": {"scale": [float(s) for s in scale], "translate": [float(t) for t in lo]},
+            "objects": {"zcta": {"type": "GeometryCollection", "geometries": geoms}},
+            "arcs": enc}
+
+def topo_to_geojson(topo, obj="zcta"):
+    """Decode a quantized TopoJSON object into a GeoJSON FeatureCollection (feature id = ZIP)."""
+    sx, sy = topo["transform"]["scale"]; tx, ty = topo["transform"]["translate"]
+    arcs = []
+    for a in topo["arcs"]:
+        q = np.cumsum(np.asarray(a, dtype=float).reshape(-1, 2), axis=0)
+        arcs.append(np.column_stack([q[:, 0] * sx + tx, q[:, 1] * sy + ty]))
+    def ring(refs):
+        out = []
+        for r in refs:
+            seg = arcs[r] if r >= 0 else arcs[~r][::-1]
+            out.append(seg if not out else seg[1:])
+        return np.concatenate(out).round(6).tolist()
+    feats = []
+    for g in topo["objects"][obj]["geometries"]:
+        if g["type"] == "Polygon":
+            geom = {"type": "Polygon", "coordinates": [ring(r) for r in g["arcs"]]}
+        else:
+            geom = {"type": "MultiPolygon", "coordinates": [[ring(r) for r in p] for p in g["arcs"]]}
+        feats.append({"type": "Feature", "id": g.get("id"), "properties": g.get("properties", {}), "geometry": geom})
+    return {"type": "FeatureCollection", "features": feats}
+
+def tier_path(tier, geo_dir=GEO_DIR):
+    return Path(geo_dir) / f"zcta.{tier}.topo.json"
+
+def values_path(geo_dir=GEO_DIR):
+    return Path(geo_dir) / "zcta.values.json"
+
+def load_tier(tier, geo_dir=GEO_DIR):
+    """GeoJSON for one tier, decoded once per file version (None if the tier was not built)."""
+    path = tier_path(tier, geo_dir)
+    if not path.exists(): return None
+    key = (str(path), path.stat().st_mtime_ns)
+    gj = _DECODED.get(key)
+    if gj is None:
+        gj = _DECODED[key] = topo_to_geojson(json.loads(path.read_text(encoding="utf-8")))
+    return gj
+
+
+# ---------------- Build ----------------
+def _vertices(arcs):
+    return int(sum(len(a) for a in arcs))
+
+def build_tiers(features=None, tiers=TIERS, geo_dir=GEO_DIR):
+    """Write one TopoJSON file per tier; returns [{"tier", "tolerance", "vertices", "bytes", "gzip_bytes"}]."""
+    features = features_from_folium(FOLIUM_MAP_PATH) if features is None else features
+    arcs, shapes, transform = build_topology(features)
+    Path(geo_dir).mkdir(parents=True, exist_ok=True)
+    rows = [{"tier": "topology", "tolerance": 0.0, "vertices": _vertices(arcs), "bytes": None, "gzip_bytes": None}]
+    for tier, tol in tiers.items():
+        simple = simplify_arcs(arcs, shapes, tol, transform[1])
+        data = json.dumps(to_topojson(features, simple, shapes, transform), separators=(",", ":")).encode()
+        tier_path(tier, geo_dir).write_bytes(data)
+        rows.append({"tier": tier, "tolerance": tol, "vertices": _vertices(simple), "bytes": len(data),
+                     "gzip_bytes": len(gzip.compress(data, 6))})
+    return rows
+
+def write_values(zip_df, column="health_index", geo_dir=GEO_DIR, label="Simulated health index"):
+    """Write {"label", "years", "values": {year: {zip: value}}} for the site's map (index scale 0–100).
+
+    Health index values run higher = better, the opposite of predicted_index_2025,
+    so the site colours them with their own scale ('health' in ZctaChoropleth).
+
+    `zip_df` is a long frame with year, zip and `column` in [0, 1], e.g. one
+    scenario's per-ZIP output from run_scenarios(..., zip_level=True).
+    """
+    years = sorted(int(y) for y in zip_df["year"].unique())
+    values = {str(y): {str(z): round(100.0 * float(v), 2) for z, v in zip(g["zip"], g[column])}
+              for y, g in zip_df.groupby("year", sort=True)}
+    path = values_path(geo_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"label": label, "years": years, "values": values}, separators=(",", ":")),
+                    encoding="utf-8")
+    return path
+
+def build_report(rows, html_path=FOLIUM_MAP_PATH, geo_dir=GEO_DIR, repeat=3):
+    """Payload size and decode + figure-serialize time per tier against the Folium HTML."""
+    import plotly.graph_objects as go
+
+    def best(fn):
+        ts = []
+        for _ in range(repeat):
+            t0 = time.perf_counter(); fn(); ts.append(time.perf_counter() - t0)
+        return min(ts)
+
+    def render(gj):
+        ids = [f["id"] for f in gj["features"]]
+        fig = go.Figure(go.Choroplethmap(geojson=gj, locations=ids, z=np.zeros(len(ids)), featureidkey="id"))
+        return fig.to_json()
+
+    raw = Path(html_path).read_bytes()
+    features = features_from_folium(html_path)
+    base_gj = {"type": "FeatureCollection", "features": features}
+    for f in features: f["id"] = f["properties"].get("zip")
+    out = [{"tier": "folium html", "vertices": None, "bytes": len(raw), "gzip_bytes": len(gzip.compress(raw, 6)),
+            "decode_ms": 1000 * best(lambda: features_from_folium(html_path)),
+            "figure_ms": 1000 * best(lambda: render(base_gj))}]
+    for r in rows:
+        if r["bytes"] is None: continue
+        path = tier_path(r["tier"], geo_dir)
+        gj = topo_to_geojson(json.loads(path.read_text()))
+        out.append(dict(r, decode_ms=1000 * best(lambda: topo_to_geojson(json.loads(path.read_text()))),
+                        figure_ms=1000 * best(lambda: render(gj))))
+    return out
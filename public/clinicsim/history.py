@@ -0,0 +1,219 @@
+# clinicsim/history.py — preallocated columnar history of simulated years
+#
+# One float32 block of shape (capacity_years, units, fields) plus a year vector
+# and a per-(year, unit) event bitmask. Capacity doubles when full, so
+# appending N years costs O(N) amortized and there is no list of per-year
+# DataFrames to pd.concat on every rerun.
+#
+# Views are plain NumPy slices (no copies):
+#   buf.block             (n_years, U, F)
+#   buf.snapshot(year)    (U, F)
+#   buf.series(zip)       (n_years, F)
+#   buf.field(name)       (n_years, U)
+# DataFrames are only built at the edges (charts, tables, export).
+#
+# Citywide aggregates (unweighted and population-weighted mean / variance,
+# min, max), both composite scores and the dollars allocated per policy are
+# computed once per appended year from the float64 engine output, so charts
+# and scores read O(years) data.
+
+import io
+
+import numpy as np
+import pandas as pd
+
+from .model import score_from_moments
+from .engine import IND_NAMES, POLICIES, EVENT_NAMES, event_labels
+from .allocation import allocated_dollars
+
+AGG_STATS = ("mean", "var", "wmean", "wvar", "min", "max")
+
+FIELDS = IND_NAMES + ["population"] + [f"pc_{p}" for p in POLICIES]
+FIELD_POS = {f: i for i, f in enumerate(FIELDS)}
+CSV_COLUMNS = ["year", "zip", "population", "events"] + IND_NAMES + [f"pc_{p}" for p in POLICIES]
+
+
+class HistoryBuffer:
+    """Years × units × fields float32 history aligned with a fixed ZIP list."""
+
+    def __init__(self, zips, capacity=16, population=None):
+        self.zips = [str(z) for z in zips]
+        self._zip_pos = {z: i for i, z in enumerate(self.zips)}
+        self._zip_index = pd.Index(self.zips)
+        self._data = np.zeros((max(1, capacity), len(self.zips), len(FIELDS)), dtype=np.float32)
+        self._years = np.zeros(max(1, capacity), dtype=np.int32)
+        self._events = np.zeros((max(1, capacity), len(self.zips)), dtype=np.uint8)
+        self._agg = np.zeros((max(1, capacity), len(AGG_STATS), len(IND_NAMES)))
+        self._scores = np.zeros((max(1, capacity), 2))          # unweighted, population-weighted
+        self._spend = np.zeros((max(1, capacity), len(POLICIES)))
+        # population the next year's allocation is paid to (the baseline, then each appended year)
+        self._pay_pop = None if population is None else np.asarray(population, dtype=float)
+        self.n = 0
+
+    # ---------------- Appending ----------------
+    def _reserve(self, extra):
+        need = self.n + extra
+        if need <= len(self._years):
+            return
+        cap = len(self._years)
+        while cap < need: cap *= 2
+        for name in ("_data", "_years", "_events", "_agg", "_scores", "_spend"):
+            old = getattr(self, name)
+            new = np.zeros((cap,) + old.shape[1:], dtype=old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+
+    def append_arrays(self, year, values, population, pc, events, spend=None):
+        """Append one year from engine arrays aligned with self.zips.
+
+        `spend` (P,) is the engine's allocated dollars; without it, it is
+        recomputed from pc and the previous year's (or baseline) population.
+        """
+        self._reserve(1)
+        i, K = self.n, len(IND_NAMES)
+        self._data[i, :, :K] = values
+        self._data[i, :, K] = population
+        self._data[i, :, K+1:] = pc
+        self._events[i] = (events.astype(np.uint8) << np.arange(len(EVENT_NAMES), dtype=np.uint8)).sum(axis=1)
+        self._years[i] = year
+        self._aggregate(i, np.asarray(values, dtype=float), np.asarray(population, dtype=float))
+        if spend is None:
+            spend = allocated_dollars(np.asarray(pc, dtype=float), population if self._pay_pop is None else self._pay_pop)
+        self._spend[i] = spend
+        self._pay_pop = np.asarray(population, dtype=float)
+        self.n += 1
+
+    def _aggregate(self, i, values, pop):
+        U = values.shape[0]
+        mean = values.mean(axis=0)
+        var = values.var(axis=0, ddof=1) if U > 1 else np.full(values.shape[1], np.nan)
+        w = pop / pop.sum() if pop.sum() > 0 else np.full(U, 1.0 / max(1, U))
+        wmean = w @ values
+        wvar = w @ (values - wmean)**2
+        self._agg[i] = [mean, var, wmean, wvar, values.min(axis=0), values.max(axis=0)]
+        for j, (m, v) in enumerate(((mean, var), (wmean, wvar))):
+            self._scores[i, j] = score_from_moments(dict(zip(IND_NAMES, m.tolist())),
+                                                    dict(zip(IND_NAMES, np.sqrt(v).tolist())))
+
+    def append_frame(self, df):
+        """Append every year in a long-format result frame (df_year or a run_horizon frame)."""
+        years = df["year"].to_numpy()
+        for y in pd.unique(years):
+            sel = np.flatnonzero(years == y)
+            pos = self._zip_index.get_indexer(df["zip"].to_numpy()[sel].astype(str))
+            if (pos < 0).any():
+                raise ValueError("Result frame has ZIPs that are not in the history buffer.")
+            rows = df.iloc[sel]
+            values = np.zeros((len(self.zips), len(IND_NAMES))); values[pos] = rows[IND_NAMES].to_numpy(float)
+            pop = np.zeros(len(self.zips)); pop[pos] = rows["population"].to_numpy(float)
+            pc = np.zeros((len(self.zips), len(POLICIES)))
+            pc[pos] = rows[[f"pc_{p}" for p in POLICIES]].to_numpy(float)
+            events = np.zeros((len(self.zips), len(EVENT_NAMES)), dtype=bool)
+            labels = rows["events"].fillna("").astype(str).to_numpy() if "events" in rows else np.full(len(rows), "")
+            for e, name in enumerate(EVENT_NAMES):
+                events[pos, e] = [name in lab for lab in labels]
+            self.append_arrays(int(y), values, pop, pc, events)
+
+    # ---------------- Views ----------------
+    @property
+    def years(self):
+        return self._years[:self.n]
+
+    @property
+    def block(self):
+        return self._data[:self.n]
+
+    def year_pos(self, year):
+        hit = np.flatnonzero(self.years == year)
+        return int(hit[-1]) if len(hit) else None
+
+    def snapshot(self, year):
+        i = self.year_pos(year)
+        return None if i is None else self._data[i]
+
+    def series(self, z):
+        return self._data[:self.n, self._zip_pos[str(z)]]
+
+    def field(self, name):
+        return self._data[:self.n, :, FIELD_POS[name]]
+
+    def event_mask(self, rows):
+        """uint8 bitmask rows -> (..., E) bool."""
+        return (rows[..., None] >> np.arange(len(EVENT_NAMES), dtype=np.uint8)) & 1 == 1
+
+    def agg(self, stat):
+        """(n_years, K) view of one running aggregate (see AGG_STATS)."""
+        return self._agg[:self.n, AGG_STATS.index(stat)]
+
+    def city_means(self, weighted=False):
+        return self.agg("wmean" if weighted else "mean")
+
+    def scores(self, weighted=False):
+        """(n_years,) composite score per year from the stored moments."""
+        return self._scores[:self.n, int(weighted)]
+
+    def spend(self):
+        """(n_years, P) dollars actually allocated per policy (floors included)."""
+        return self._spend[:self.n]
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self._data, self._years, self._events, self._agg, self._scores, self._spend))
+
+    @property
+    def used_bytes(self):
+        return self.nbytes // len(self._years) * self.n
+
+    # ---------------- Frames ----------------
+    def _frame(self, years, zips, rows, ev_rows):
+        df = pd.DataFrame({"year": years, "zip": zips, "population": rows[:, FIELD_POS["population"]],
+                           "events": event_labels(self.event_mask(ev_rows))})
+        for f in FIELDS:
+            if f != "population": df[f] = rows[:, FIELD_POS[f]]
+        return df[CSV_COLUMNS]
+
+    def year_frame(self, year):
+        i = self.year_pos(year)
+        if i is None: return self._frame([], [], np.zeros((0, len(FIELDS))), np.zeros(0, np.uint8))
+        return self._frame(np.full(len(self.zips), self._years[i]), self.zips, self._data[i], self._events[i])
+
+    def zip_frame(self, z):
+        u = self._zip_pos[str(z)]
+        return self._frame(self.years, np.full(self.n, self.zips[u], dtype=object), self._data[:self.n, u],
+                           self._events[:self.n, u])
+
+    def to_frame(self):
+        n, U = self.n, len(self.zips)
+        return self._frame(np.repeat(self.years, U), np.tile(np.asarray(self.zips, dtype=object), n),
+                           self.block.reshape(n * U, -1), self._events[:n].reshape(-1))
+
+    # ---------------- Export ----------------
+    def chunk_years(self, rows_per_chunk=50_000):
+        """Years per export chunk so a chunk holds about rows_per_chunk rows."""
+        return max(1, rows_per_chunk // max(1, len(self.zips)))
+
+    def iter_frames(self, years_per_chunk=8, stop=None):
+        """Long frames (CSV_COLUMNS) of a few years each, over the first `stop` years (default: all).
+
+        Pass stop=buf.n to pin an export to what is stored now: later appends
+        only write past it.
+        """
+        U, stop = len(self.zips), self.n if stop is None else min(stop, self.n)
+        data, years, events = self._data, self._years, self._events
+        for s in range(0, stop, years_per_chunk):
+            e = min(stop, s + years_per_chunk)
+            yield self._frame(np.repeat(years[s:e], U), np.tile(np.asarray(self.zips, dtype=object), e - s),
+                              data[s:e].reshape((e - s) * U, -1), events[s:e].reshape(-1))
+
+    def iter_csv(self, years_per_chunk=8):
+        """CSV bytes in chunks of a few years each (header first)."""
+        yield (",".join(CSV_COLUMNS) + "\n").encode("utf-8")
+        for df in self.iter_frames(years_per_chunk):
+            yield df.to_csv(index=False, header=False).encode("utf-8")
+
+    def csv_file(self):
+        """Binary file object filled chunk by chunk from iter_csv."""
+        buf = io.BytesIO()
+        for chunk in self.iter_csv(): buf.write(chunk)
+        buf.seek(0)
+        return buf
@@ -0,0 +1,252 @@
+# clinicsim/ingest.py — cached, typed ingest of the equity index and historical baseline
+#
+# Streamlit reruns the whole script on every widget change. The loaders here
+# keep the normalized baseline (after load_hist → ensure_indicator_columns →
+# impute_groupwise → normalize_slopes) so that a rerun costs an os.stat:
+#
+#   1. memory   — process-wide LRU of MAX_FRAMES frames keyed by content hash
+#                 (shared by sessions); evicted frames a session still holds
+#                 stay findable by key (frame_key) until they are released
+#   2. sidecar  — typed columnar file in the cache dir (Parquet when pyarrow is
+#                 installed, pickle otherwise), reused across server restarts
+#   3. cold     — parse CSV and run the full pipeline, then fill 1 and 2
+#
+# Files on disk are hashed once per (path, mtime, size); uploads are hashed from
+# their bytes, so each uploaded file gets its own cache entry. Baselines of
+# CHUNKED_MIN_BYTES or more (national ZCTA panels) are parsed with
+# read_hist_chunked: schema from the header, needed columns only, in chunks.
+
+import hashlib
+import importlib.util
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .model import INDICATORS
+from .data import (
+    read_csv_flex, read_hist_chunked, load_index_2025, load_hist, load_hist_panel, ensure_indicator_columns,
+    impute_groupwise_fast, normalize_slopes, synthesize_from_equity,
+)
+from .profiling import profiled
+
+# Bump when any step of the pipeline changes so old sidecars are ignored
+PIPELINE_VERSION = "2"
+CACHE_DIR = Path(os.environ.get("CLINICSIM_CACHE_DIR", Path(tempfile.gettempdir()) / "clinicsim-cache"))
+HAVE_PARQUET = importlib.util.find_spec("pyarrow") is not None
+CHUNKED_MIN_BYTES = int(os.environ.get("CLINICSIM_CHUNKED_MIN_BYTES", 4 * 1024 * 1024))
+MAX_FRAMES = int(os.environ.get("CLINICSIM_MAX_FRAMES", 16))   # frames the memory tier keeps alive on its own
+
+_FRAMES = OrderedDict()   # cache key -> DataFrame (treat as read-only), least recently used first
+_LIVE = weakref.WeakValueDictionary()   # cache key -> every frame still referenced somewhere, evicted or not
+_FRAMES_LOCK = threading.Lock()
+_STAT_HASH = {}    # (path, mtime_ns, size) -> content hash
+LOAD_LOG = []      # {"what", "key", "tier", "seconds"} per load, newest last
+IMPUTE_REPORTS = {}  # cache key -> {strategy: {column: n_filled}} from the cold build
+CHUNK_STATS = {}     # cache key -> read_hist_chunked stats (rows, chunks, columns, peak_mb) from the cold build
+_BUILD_LOCKS = weakref.WeakValueDictionary()   # cache key -> lock while that key is read from its sidecar or built
+_LOCKS_LOCK = threading.Lock()
+
+
+# ---------------- Keys ----------------
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:24]
+
+def source_key(src):
+    """Content hash of a path or an uploaded/bytes-like source (paths hashed once per mtime/size)."""
+    if isinstance(src, (str, Path)):
+        p = Path(src)
+        st_ = p.stat()
+        stat_key = (str(p.resolve()), st_.st_mtime_ns, st_.st_size)
+        if stat_key not in _STAT_HASH:
+            _STAT_HASH[stat_key] = content_hash(p.read_bytes())
+        return _STAT_HASH[stat_key]
+    data = src.getvalue() if hasattr(src, "getvalue") else bytes(src)
+    return content_hash(data)
+
+def _source_size(src):
+    if isinstance(src, (str, Path)):
+        return Path(src).stat().st_size
+    return len(src.getvalue()) if hasattr(src, "getvalue") else len(bytes(src))
+
+def _open(src):
+    if isinstance(src, (str, Path)):
+        return src
+    return io.BytesIO(src.getvalue() if hasattr(src, "getvalue") else bytes(src))
+
+
+# ---------------- Typed frames & sidecars ----------------
+def to_typed(df):
+    """Categorical ZIP, float32 indicators/slopes, int16 year; population stays float64."""
+    out = df.copy()
+    float_cols = [n for n,_,_ in INDICATORS] + [f"{n}_slope" for n,_,_ in INDICATORS] + ["equityscore"]
+    for c in float_cols:
+        if c in out.columns:
+            out[c] = pd.to_numeric(out[c], errors="coerce").astype(np.float32)
+    if "population" in out.columns:
+        out["population"] = pd.to_numeric(out["population"], errors="coerce").astype(np.float64)
+    if "year" in out.columns:
+        out["year"] = out["year"].astype(np.int16)
+    if "zip" in out.columns:
+        out["zip"] = out["zip"].astype(str).astype("category")
+    return out
+
+def _sidecar_path(key, cache_dir):
+    return Path(cache_dir) / f"{key}.{'parquet' if HAVE_PARQUET else 'pkl'}"
+
+def _read_sidecar(path):
+    return pd.read_parquet(path) if path.suffix == ".parquet" else pd.read_pickle(path)
+
+def _write_sidecar(df, path):
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        if path.suffix == ".parquet": df.to_parquet(tmp, index=False)
+        else: df.to_pickle(tmp)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # read-only deployments: memory tier only
+
+def _build_lock(key):
+    with _LOCKS_LOCK:
+        return _BUILD_LOCKS.setdefault(key, threading.Lock())
+
+def _frame_get(key):
+    with _FRAMES_LOCK:
+        df = _FRAMES.get(key)
+        if df is not None:
+            _FRAMES.move_to_end(key)
+            return df
+    df = _LIVE.get(key)                     # evicted but still held by a session: promote it again
+    if df is not None: _frame_put(key, df)
+    return df
+
+def _frame_put(key, df):
+    with _FRAMES_LOCK:
+        _FRAMES[key] = _LIVE[key] = df
+        _FRAMES.move_to_end(key)
+        evicted = [_FRAMES.popitem(last=False)[0] for _ in range(len(_FRAMES) - MAX_FRAMES)]
+        for old in evicted:
+            if old not in _LIVE:                # nobody holds the frame any more: drop its build notes too
+                IMPUTE_REPORTS.pop(old, None); CHUNK_STATS.pop(old, None)
+
+def _cached(what, key, build, cache_dir):
+    """Return the frame for `key` from memory, then sidecar, else build() it and store it.
+
+    Misses hold a per-key lock, so concurrent sessions (or the warm-up thread) build each key once.
+    """
+    t0 = time.perf_counter()
+    tier = "memory"
+    df = _frame_get(key)
+    if df is None:
+        with _build_lock(key):
+            df, tier = _load_or_build(key, build, cache_dir)
+    LOAD_LOG.append({"what": what, "key": key, "tier": tier, "seconds": time.perf_counter() - t0})
+    del LOAD_LOG[:-50]
+    return df
+
+def _load_or_build(key, build, cache_dir):
+    tier = "memory (waited)"
+    df = _frame_get(key)
+    if df is None:
+        path = _sidecar_path(key, cache_dir) if cache_dir else None
+        if path is not None and path.exists():
+            try:
+                df, tier = _read_sidecar(path), "sidecar"
+            except Exception:
+                df = None
+        if df is None:
+            df, tier = to_typed(build()), "cold"
+            if path is not None: _write_sidecar(df, path)
+        _frame_put(key, df)
+    return df, tier
+
+
+# ---------------- Pipelines ----------------
+@profiled()
+def prepare_hist(hist_df, report=None):
+    """The normalization pipeline the app runs on every baseline."""
+    hist_df = ensure_indicator_columns(hist_df)
+    hist_df = impute_groupwise_fast(hist_df, "zip", [n for n,_,_ in INDICATORS] + ["population"], report=report)
+    return normalize_slopes(hist_df)
+
+@profiled()
+def load_index_cached(src, cache_dir=CACHE_DIR):
+    """read_csv_flex + load_index_2025, cached by file content."""
+    key = f"index-v{PIPELINE_VERSION}-{source_key(src)}"
+    return _cached("index", key, lambda: load_index_2025(read_csv_flex(_open(src))), cache_dir)
+
+def read_hist_source(src, chunked=None, stats=None):
+    """load_hist of a path/upload; chunked (None = when the source is CHUNKED_MIN_BYTES or larger)."""
+    if chunked is None:
+        chunked = _source_size(src) >= CHUNKED_MIN_BYTES
+    if chunked:
+        try:
+            return read_hist_chunked(_open(src), stats=stats)
+        except ValueError:
+            pass  # e.g. a non-comma delimiter: the sniffing reader below handles it (or raises)
+    return load_hist(read_csv_flex(_open(src)))
+
+@profiled()
+def load_hist_cached(src, cache_dir=CACHE_DIR):
+    """read_hist_source + prepare_hist, cached by file content."""
+    key = f"hist-v{PIPELINE_VERSION}-{source_key(src)}"
+    report = IMPUTE_REPORTS.setdefault(key, {})
+    stats = CHUNK_STATS.setdefault(key, {})
+    return _cached("hist", key, lambda: prepare_hist(read_hist_source(src, stats=stats), report), cache_dir)
+
+@profiled()
+def load_panel_cached(src, cache_dir=CACHE_DIR):
+    """load_hist_panel of a path/upload (every year of the wide file, long form), cached by file content."""
+    key = f"panel-v{PIPELINE_VERSION}-{source_key(src)}"
+    return _cached("panel", key, lambda: load_hist_panel(read_csv_flex(_open(src))), cache_dir)
+
+def synth_hist_cached(index_df, index_key, start_year):
+    """Fallback baseline synthesized from the equity index (memory tier only; it is cheap to rebuild)."""
+    key = f"synth-v{PIPELINE_VERSION}-{index_key}-{int(start_year)}"
+    report = IMPUTE_REPORTS.setdefault(key, {})
+    return _cached("hist (synthesized)", key, lambda: prepare_hist(synthesize_from_equity(index_df, start_year), report), None)
+
+def frame_key(df):
+    """Cache key of a frame returned by one of the loaders above (None if it did not come from here)."""
+    with _FRAMES_LOCK:
+        return next((k for k, v in list(_LIVE.items()) if v is df), None)
+
+def clear_memory_cache():
+    with _FRAMES_LOCK:
+        _FRAMES.clear(); _LIVE.clear()
+    _STAT_HASH.clear()
+
+
+# ---------------- Timing report ----------------
+def timing_report(src, what="hist", cache_dir=None, repeat=3):
+    """Cold (hash + parse + pipeline), sidecar and memory load times for one file, best of `repeat`.
+
+    Runs against a scratch cache dir and restores the live memory tier afterwards.
+    """
+    scratch = cache_dir is None
+    cache_dir = Path(tempfile.mkdtemp(prefix="clinicsim-bench-") if scratch else cache_dir)
+    loader = load_hist_cached if what == "hist" else load_index_cached
+    saved = (dict(_FRAMES), dict(_LIVE), dict(_STAT_HASH), list(LOAD_LOG))
+    times = {"cold": [], "sidecar": [], "memory": []}
+    try:
+        for _ in range(repeat):
+            for f in cache_dir.glob("*"): f.unlink()
+            clear_memory_cache()
+            for tier in ("cold", "sidecar", "memory"):
+                if tier == "sidecar": _FRAMES.clear(); _LIVE.clear()
+                t0 = time.perf_counter(); loader(src, cache_dir=cache_dir)
+                times[tier].append(time.perf_counter() - t0)
+    finally:
+        clear_memory_cache()
+        _FRAMES.update(saved[0]); _LIVE.update(saved[1]); _STAT_HASH.update(saved[2]); LOAD_LOG[:] = saved[3]
+        if scratch: shutil.rmtree(cache_dir, ignore_errors=True)
+    return {tier: min(v) for tier, v in times.items()}
@@ -0,0 +1,144 @@
+# clinicsim/layout.py — collision-free ZIP → grid-cell placement for the tile map
+#
+# Placement starts from each ZCTA's internal point (geo/zcta_centroids.csv,
+# extracted from the geometry baked into interactive_predicted_index_map_2025.html),
+# projected equirectangularly and scaled onto a grid with some spare cells.
+# ZIPs closest to a cell centre claim first; later ones take the nearest free
+# cell (widening window search), so each cell holds at most one ZIP and ZIPs keep their
+# relative geography. ZIPs without a centroid take the free cells left over, in ZIP order.
+#
+# Layouts are cached per ZIP list; the app computes one once per baseline.
+
+import csv
+import json
+import math
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+CENTROIDS_PATH = Path(__file__).resolve().parent.parent / "geo" / "zcta_centroids.csv"
+FOLIUM_MAP_PATH = Path(__file__).resolve().parent.parent / "interactive_predicted_index_map_2025.html"
+
+_LAYOUTS = OrderedDict()   # (zips tuple, slack) -> GridLayout, least recently used first
+_LAYOUT_LOCK = threading.Lock()
+
+
+class GridLayout:
+    """x/y integer cells aligned with `zips` (no two ZIPs share a cell)."""
+
+    def __init__(self, zips, x, y, n_cols, n_rows, placed_by_centroid):
+        self.zips = list(zips)
+        self.x, self.y = x, y
+        self.n_cols, self.n_rows = n_cols, n_rows
+        self.placed_by_centroid = placed_by_centroid      # (U,) bool
+
+    def cells(self):
+        return dict(zip(self.zips, zip(self.x.tolist(), self.y.tolist())))
+
+
+# ---------------- Centroids ----------------
+def features_from_folium(html_path=FOLIUM_MAP_PATH):
+    """GeoJSON features embedded in a Folium map (the first geo_json_*_add({...}) call)."""
+    text = Path(html_path).read_text(encoding="utf-8")
+    start = text.index('_add({"features"') + len("_add(")
+    obj, _ = json.JSONDecoder().raw_decode(text, start)
+    return obj["features"]
+
+def write_centroids(features, path=CENTROIDS_PATH):
+    """Write zip,lat,lon from the TIGER internal points (INTPTLAT10/INTPTLON10) of each feature."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["zip", "lat", "lon"])
+        for feat in sorted(features, key=lambda f: str(f["properties"].get("zip"))):
+            p = feat["properties"]
+            w.writerow([str(p.get("zip") or p.get("ZCTA5CE10")).zfill(5), float(p["INTPTLAT10"]), float(p["INTPTLON10"])])
+    return path
+
+def load_centroids(path=CENTROIDS_PATH):
+    """{zip: (lat, lon)} from the bundled centroid file (empty if it is missing)."""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path, newline="") as f:
+        return {row["zip"]: (float(row["lat"]), float(row["lon"])) for row in csv.DictReader(f)}
+
+
+# ---------------- Placement ----------------
+def _nearest_free(free, gx, gy):
+    """(row, col) of the free cell nearest to (gx, gy): search a window, widen until it must contain the nearest."""
+    n_rows, n_cols = free.shape
+    r0, c0 = int(round(gy)), int(round(gx))
+    r = 1
+    while True:
+        rs, re_ = max(0, r0 - r), min(n_rows, r0 + r + 1)
+        cs, ce = max(0, c0 - r), min(n_cols, c0 + r + 1)
+        fr, fc = np.nonzero(free[rs:re_, cs:ce])
+        if len(fr):
+            d = (fr + rs - gy)**2 + (fc + cs - gx)**2
+            k = int(np.argmin(d))
+            covers = rs == 0 and cs == 0 and re_ == n_rows and ce == n_cols
+            if d[k] ** 0.5 <= r - 0.5 or covers:
+                return fr[k] + rs, fc[k] + cs
+            r = int(math.ceil(d[k] ** 0.5 + 0.5))     # the nearest cell lies within this radius
+        else:
+            r *= 2
+
+def tile_grid(zips, centroids, slack=1.6, rank_mix=0.5):
+    """Greedy nearest-free-cell assignment of ZIP centroids onto a grid with ~slack×U cells."""
+    zips = [str(z) for z in zips]
+    U = len(zips)
+    has = np.array([z in centroids for z in zips])
+    latlon = np.array([centroids[z] for z in zips if z in centroids], dtype=float).reshape(-1, 2)
+
+    if len(latlon):
+        lat0 = math.radians(latlon[:, 0].mean())
+        px_, py_ = latlon[:, 1] * math.cos(lat0), latlon[:, 0]
+        w, h = max(np.ptp(px_), 1e-9), max(np.ptp(py_), 1e-9)
+    else:
+        px_ = py_ = np.zeros(0); w = h = 1.0
+    w, h = max(w / h, 0.5), 1.0                     # grid aspect, kept from collapsing to one row
+    n_cells = max(U, int(math.ceil(U * slack)))
+    n_cols = max(1, int(round(math.sqrt(n_cells * w / h))))
+    n_rows = max(1, int(math.ceil(n_cells / n_cols)))
+    while n_cols * n_rows < U: n_rows += 1
+
+    # centroid -> continuous cell coordinates (row 0 at the top). Half linear, half
+    # rank: ranks spread dense urban clusters so they do not all fight for one cell.
+    def spread(v, n):
+        if len(v) < 2: return np.zeros(len(v))
+        lin = (v - v.min()) / max(np.ptp(v), 1e-9)
+        rank = np.argsort(np.argsort(v, kind="stable"), kind="stable") / (len(v) - 1)
+        return ((1 - rank_mix) * lin + rank_mix * rank) * (n - 1)
+    gx, gy = spread(px_, n_cols), spread(-py_, n_rows)
+
+    x = np.full(U, -1); y = np.full(U, -1)
+    free = np.ones((n_rows, n_cols), dtype=bool)
+    todo = np.flatnonzero(has)
+    # ZIPs sitting closest to a cell centre claim first; the rest spiral out to the nearest free cell
+    off = np.hypot(gx - np.round(gx), gy - np.round(gy))
+    for i in np.argsort(off, kind="stable"):
+        c = _nearest_free(free, gx[i], gy[i])
+        free[c] = False
+        y[todo[i]], x[todo[i]] = c
+    ry, rx = np.nonzero(free)
+    for j, u in enumerate(np.flatnonzero(~has)):
+        x[u], y[u] = rx[j], ry[j]
+    return GridLayout(zips, x, y, n_cols, n_rows, has)
+
+def grid_layout(zips, centroids=None, slack=1.6, maxsize=8):
+    """Cached tile_grid for a ZIP list (centroids default to the bundled file; last `maxsize` lists kept)."""
+    key = (tuple(str(z) for z in zips), slack)
+    with _LAYOUT_LOCK:
+        lay = _LAYOUTS.get(key)
+        if lay is not None:
+            _LAYOUTS.move_to_end(key)
+            return lay
+    lay = tile_grid(zips, load_centroids() if centroids is None else centroids, slack)
+    with _LAYOUT_LOCK:
+        _LAYOUTS[key] = lay
+        while len(_LAYOUTS) > maxsize: _LAYOUTS.popitem(last=False)
+    return lay
@@ -0,0 +1,237 @@
+# clinicsim/model.py — model tables and the reference (dict-based) simulator
+#
+# Everything here is free of Streamlit so it can be imported by the app,
+# the array engine and the benchmarks alike.
+
+import math
+import numpy as np
+
+from .profiling import profiled
+
+# ---------------- Indicators ----------------
+INDICATORS = [
+    ("diabetes",       "↓ better", -1.0),
+    ("disabled",       "↓ better", -1.0),
+    ("employed",       "↑ better", +1.0),
+    ("health_index",   "↑ better", +1.0),
+    ("high_bp",        "↓ better", -1.0),
+    ("kidney_disease", "↓ better", -1.0),
+    ("bipoc",          "equity",    0.0),
+    ("no_doctor",      "↓ better", -1.0),
+]
+
+POLICY_TARGETS = {
+    "clinics":   ["no_doctor", "health_index", "employed"],
+    "campaigns": ["diabetes", "high_bp", "kidney_disease"],
+    "jobs":      ["employed", "disabled"],
+    "equity":    ["no_doctor", "health_index"],
+}
+
+# Base max effects at full saturation (per year on 0–1 scale)
+E_MAX_BASE = {
+    "clinics":   {"no_doctor": -0.004, "health_index": +0.003, "employed": +0.0010},
+    "campaigns": {"diabetes": -0.0035, "high_bp": -0.0035, "kidney_disease": -0.0012},
+    "jobs":      {"employed": +0.0100, "disabled": -0.0010},
+    "equity":    {"no_doctor": -0.0025, "health_index": +0.0025},
+}
+PC50_BASE = {"clinics": 120.0, "campaigns": 140.0, "jobs": 160.0, "equity": 100.0}
+
+# Tight annual caps to prevent drastic swings
+ANNUAL_CAPS = {
+    "diabetes": 0.010, "high_bp": 0.010, "kidney_disease": 0.005,
+    "no_doctor": 0.015, "employed": 0.015, "disabled": 0.006,
+    "health_index": 0.015,
+}
+
+EVENT_TEMPLATES = [
+    ("Disease outbreak", {"diabetes": +0.0015, "high_bp": +0.0020, "health_index": -0.0020}),
+    ("Clinic closure",   {"no_doctor": +0.0020, "health_index": -0.0010}),
+    ("Natural disaster", {"employed": -0.0040, "disabled": +0.0010, "health_index": -0.0030}),
+    ("Funding cut",      {"employed": -0.0015, "no_doctor": +0.0010}),
+]
+
+# Annual per-ZIP probability of each event template
+EVENT_RATES = {"Disease outbreak":0.04,"Clinic closure":0.03,"Natural disaster":0.02,"Funding cut":0.03}
+
+# ---------------- Utilities ----------------
+def clamp01(x):
+    try: x = float(x)
+    except: x = 0.0
+    return max(0.0, min(1.0, x))
+
+def diminishing_returns(pc, pc50):
+    pc = max(0.0, float(pc))
+    return 1.0 - math.exp(-pc / max(1e-9, pc50))
+
+def need_weights(states):
+    needs = {}
+    for z, s in states.items():
+        n = (s["diabetes"]*0.25 + s["high_bp"]*0.25 + s["no_doctor"]*0.20 +
+             (1 - s["employed"])*0.15 + (1 - s["health_index"])*0.15)
+        needs[z] = n
+    tot = sum(needs.values()) or 1.0
+    for z in needs: needs[z] /= tot
+    return needs
+
+def percap_from_budget(city_budget, subpct, pop, weight, floor_pc):
+    pc = (city_budget * (subpct/100.0)) * weight / max(1.0, pop)
+    return max(pc, floor_pc)
+
+# ---------------- Calibration ----------------
+def slope_medians(hist_df):
+    """Citywide median slope per indicator (the baseline trend the tuner offsets)."""
+    import pandas as pd
+    slopes_city = {f"{m}_slope": pd.to_numeric(hist_df.get(f"{m}_slope", 0.0), errors="coerce").fillna(0.0) for m,_,_ in INDICATORS}
+    return {m: float(slopes_city[f"{m}_slope"].median()) for m,_,_ in INDICATORS}
+
+@profiled()
+def auto_stability_tune(hist_df, city_budget, splits, states_preview, med=None):
+    """Choose floor and E_MAX scaling to avoid net declines for employed/health_index at defaults.
+
+    Pass `med` (from slope_medians) to skip recomputing the medians from hist_df.
+    """
+    E_MAX = {p: E_MAX_BASE[p].copy() for p in E_MAX_BASE}
+    PC50 = PC50_BASE.copy()
+    floor_pc = 30.0  # start reasonably
+
+    # Estimate typical per-capita
+    pops = [s.get("population", 20000) for s in states_preview.values()]
+    mean_pop = float(np.mean(pops)) if pops else 20000.0
+
+    # Normalize budgets
+    total = sum(splits.values()) or 1.0
+    splits = {k: 100.0*v/total for k,v in splits.items()}
+
+    # compute required pc to offset adverse median slopes for key metrics
+    if med is None:
+        med = slope_medians(hist_df)
+
+    # Helper to compute expected delta at typical pc
+    def expected_delta(metric, policy):
+        sp = splits[policy] / 100.0
+        pc = max(floor_pc, (city_budget * sp) / max(1.0, mean_pop))
+        sat = 1.0 - math.exp(-pc / PC50[policy])
+        return E_MAX[policy].get(metric, 0.0) * sat
+
+    # Increase E_MAX or floor until employed & health_index net >= +0.002 (0.2pp) citywide
+    targets = [("employed","jobs"), ("health_index","clinics")]
+    for metric, pol in targets:
+        tries = 0
+        while tries < 12:
+            base = med.get(metric, 0.0)
+            gain = expected_delta(metric, pol)
+            if base + gain >= 0.002:
+                break
+            # scale up lever and floor slightly
+            E_MAX[pol][metric] *= 1.25
+            floor_pc = min(120.0, floor_pc + 5.0)
+            tries += 1
+
+    # Keep other metrics modestly improving if adverse slope
+    for metric, pol in [("no_doctor","clinics"), ("diabetes","campaigns"), ("high_bp","campaigns")]:
+        tries = 0
+        while tries < 8:
+            base = med.get(metric, 0.0)
+            desired_sign = [x for x in INDICATORS if x[0]==metric][0][2]
+            # We want delta to be in "good" direction by at least 0.001
+            good_dir = +1 if desired_sign>0 else -1
+            gain = expected_delta(metric, pol) * good_dir
+            base_dir = base * good_dir
+            if (base_dir + gain) >= 0.001:
+                break
+            E_MAX[pol][metric] *= 1.15
+            tries += 1
+
+    return floor_pc, E_MAX, PC50
+
+# ---------------- Simulation ----------------
+@profiled()
+def simulate_one_year(year, states, slopes, city_budget, splits, floor_pc, E_MAX, PC50, events_on, eff_mult, rng):
+    total = sum(splits.values()) or 1.0
+    splits = {k: 100.0*v/total for k,v in splits.items()}
+    weights = need_weights(states)
+
+    # Events: off by default for stability
+    events_by_zip = {z: [] for z in states}
+    if events_on:
+        for z in states:
+            for name, eff in EVENT_TEMPLATES:
+                if rng.random() < EVENT_RATES[name]:
+                    events_by_zip[z].append((name, eff))
+
+    pc_alloc = {z: {p:0.0 for p in POLICY_TARGETS} for z in states}
+    for z, s in states.items():
+        pop = max(1, s.get("population", 20000))
+        w = weights[z]
+        for pol in POLICY_TARGETS:
+            pc_alloc[z][pol] = percap_from_budget(city_budget, splits[pol], pop, w, floor_pc)
+
+    new_states, rows = {}, []
+    for z, s in states.items():
+        cur = s.copy()
+        base_sl = slopes.get(z, {})
+        applied = {n: base_sl.get(n, 0.0) for n,_,_ in INDICATORS}
+
+        for pol, targets in POLICY_TARGETS.items():
+            pc = pc_alloc[z][pol]
+            sat = diminishing_returns(pc, PC50[pol])
+            for m in targets:
+                emax = E_MAX[pol].get(m, 0.0)
+                applied[m] = applied.get(m, 0.0) + eff_mult * emax * sat
+
+        for (_ename, effs) in events_by_zip[z]:
+            for k, v in effs.items():
+                applied[k] = applied.get(k, 0.0) + v
+
+        # Apply deltas with caps and a non-worsening bias for key metrics
+        for m,_,_ in INDICATORS:
+            v_now = cur.get(m, 0.5)
+            delta = applied.get(m, 0.0)
+            cap = ANNUAL_CAPS.get(m, 0.02)
+            delta = float(np.clip(delta, -cap, cap))
+
+            # Non-worsening bias for 'employed' and 'health_index' under Stability preset:
+            # if delta is slightly negative (>-0.002), clip to 0
+            if m in ("employed","health_index") and delta < 0 and delta > -0.002:
+                delta = 0.0
+
+            v_next = clamp01(v_now + delta)
+            cur[m] = v_next
+
+        pop = cur.get("population", 20000)
+        pop = max(100, pop * (1.0 + 0.002*(cur["employed"]-0.6)))
+        cur["population"] = pop
+        new_states[z] = cur
+
+        rec = {"year": year, "zip": z, "population": pop, "events": ", ".join([e[0] for e in events_by_zip[z]])}
+        for m,_,_ in INDICATORS: rec[m] = cur[m]
+        for pol in POLICY_TARGETS: rec[f"pc_{pol}"] = pc_alloc[z][pol]
+        rows.append(rec)
+
+    import pandas as pd
+    df_year = pd.DataFrame(rows)
+    score = compute_score(df_year)
+    return new_states, df_year, score
+
+SCORE_DISP_COLS = ["no_doctor","health_index","employed","diabetes","high_bp","kidney_disease"]
+
+def score_from_moments(mean, std):
+    """Composite score from citywide per-indicator means and standard deviations (mappings by name)."""
+    def inv_mean(c): return max(0.0, min(1.0, 1 - mean[c]))
+    def pos_mean(c): return max(0.0, min(1.0, mean[c]))
+    disp = 0.0
+    for c in SCORE_DISP_COLS:
+        if c in std:
+            disp += std[c]
+    disp /= 6.0
+    equity = max(0.0, min(1.0, 1 - 2.0*disp))
+    comp = (0.18*pos_mean("employed") + 0.18*pos_mean("health_index") +
+            0.18*inv_mean("no_doctor") + 0.18*inv_mean("diabetes") +
+            0.14*inv_mean("high_bp")   + 0.04*inv_mean("kidney_disease") +
+            0.10*equity)
+    return round(100*comp, 1)
+
+@profiled()
+def compute_score(df_year):
+    cols = [n for n,_,_ in INDICATORS if n in df_year.columns]
+    return score_from_moments(df_year[cols].mean(), df_year[cols].std())
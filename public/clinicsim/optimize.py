@@ -0,0 +1,214 @@
+# clinicsim/optimize.py — budget-split optimizer over the clinics/campaigns/jobs/equity simplex
+#
+# Candidates are points on a lattice over the split simplex (optionally crossed
+# with city_budget and eff_mult grids). Each candidate is tuned with
+# the closed-form stability tuner (when the stability preset is on) exactly as the app
+# would tune it, then all candidates are simulated together as a leading batch
+# axis of the array engine (events off, deterministic).
+#
+# Search loop:
+#   • constraints (min share per program, max share) filter the lattice up front
+#   • successive halving: after each checkpoint year only the best `keep_frac`
+#     candidates per (budget, eff_mult) group keep running
+#   • a refinement round re-meshes around the leaders at half the step; splits
+#     that were already scored come from the memo instead of being re-simulated
+#
+# The result is a table of every scored candidate plus its score/cost Pareto front.
+
+import itertools
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .model import E_MAX_BASE, PC50_BASE, slope_medians
+from .tuning import stability_tune_solve
+from .engine import POLICIES, policy_matrices, step_arrays, compute_score_batch, SCORE_DISP_POS
+from .allocation import allocated_dollars
+from .profiling import profiled
+
+
+@dataclass
+class OptimizeResult:
+    table: pd.DataFrame      # every completed candidate, best first
+    pareto: pd.DataFrame     # non-dominated (max score, min cost) subset
+    best: dict
+    n_evaluated: int         # candidates simulated
+    n_pruned: int            # dropped early by successive halving
+    n_memo_hits: int         # candidates served from the memo
+
+
+def simplex_lattice(step, min_share=None, max_share=None):
+    """All splits (percent, summing to 100) on a `step`-percent lattice that satisfy the bounds."""
+    min_share, max_share = min_share or {}, max_share or {}
+    n = int(round(100 / step))
+    out = []
+    for cut in itertools.combinations(range(n + len(POLICIES) - 1), len(POLICIES) - 1):
+        parts = np.diff((-1,) + cut + (n + len(POLICIES) - 1,)) - 1
+        split = parts * (100.0 / n)
+        if all(split[i] >= min_share.get(p, 0.0) - 1e-9 and split[i] <= max_share.get(p, 100.0) + 1e-9
+               for i, p in enumerate(POLICIES)):
+            out.append(tuple(float(round(v, 6)) for v in split))
+    return out
+
+def _neighbours(split, step, min_share, max_share):
+    """Splits reached by moving `step` percent from one program to another."""
+    out = []
+    for i, j in itertools.permutations(range(len(POLICIES)), 2):
+        cand = list(split); cand[i] -= step; cand[j] += step
+        if cand[i] < min_share.get(POLICIES[i], 0.0) - 1e-9 or cand[j] > max_share.get(POLICIES[j], 100.0) + 1e-9:
+            continue
+        out.append(tuple(float(round(v, 6)) for v in cand))
+    return out
+
+
+class SplitEvaluator:
+    """Batched, memoized evaluator of (split, city_budget, eff_mult) candidates."""
+
+    def __init__(self, hist_df, arr, slope_mat, years, stability=True, discount=None, checkpoints=(), keep_frac=0.5,
+                 min_keep=8, equity_floor=None, memo=None, rule="proportional"):
+        self.arr, self.slope_mat, self.years = arr, slope_mat, int(years)
+        self.rule = rule
+        self.stability, self.discount = stability, discount
+        self.checkpoints = sorted(c for c in checkpoints if 0 < c < self.years)
+        self.keep_frac, self.min_keep, self.equity_floor = keep_frac, min_keep, equity_floor
+        self.med = slope_medians(hist_df)            # shared by every tuning call
+        self.mean_pop = float(np.mean(arr.population)) if len(arr.zips) else 20000.0
+        self.memo = {} if memo is None else memo     # key -> result row (completed candidates only)
+        self.pruned = set()                          # keys dropped by halving in this run (pool-dependent, not memoized)
+        self.n_evaluated = self.n_pruned = self.n_memo_hits = 0
+
+    def _tune(self, split, budget):
+        splits = dict(zip(POLICIES, split))
+        if self.stability:
+            floor_pc, E_MAX, PC50, _ = stability_tune_solve(self.med, self.mean_pop, budget, splits)
+        else:
+            floor_pc, E_MAX, PC50 = 25.0, E_MAX_BASE, PC50_BASE
+        return floor_pc, E_MAX, PC50
+
+    def _objective(self, score_hist):
+        """score_hist (C, t) unrounded yearly scores -> (C,) objective."""
+        if self.discount is None:
+            return score_hist[:, -1]
+        w = (1.0 + self.discount) ** -np.arange(score_hist.shape[1])
+        return score_hist @ w / w.sum()
+
+    def evaluate(self, keys):
+        """Score a list of (split, budget, eff_mult) keys; returns their result rows (None = pruned)."""
+        self.n_memo_hits += sum(k in self.memo for k in keys)
+        todo = [k for k in dict.fromkeys(keys) if k not in self.memo and k not in self.pruned]
+        if todo:
+            self._run_batch(todo)
+        return [self.memo.get(k) for k in keys]
+
+    def _run_batch(self, keys):
+        C = len(keys)
+        tuned = [self._tune(split, budget) for split, budget, _ in keys]
+        mats = [policy_matrices(E_MAX, PC50) for _, E_MAX, PC50 in tuned]
+        emax = np.stack([m[0] for m in mats])[:, None]                  # (C, 1, P, K)
+        pc50 = np.stack([m[1] for m in mats])[:, None, :]               # (C, 1, P)
+        floor = np.array([t[0] for t in tuned])[:, None, None]          # (C, 1, 1)
+        eff = np.array([k[2] for k in keys], dtype=float)[:, None, None]
+        dollars = np.array([[budget * s/100.0 for s in split] for split, budget, _ in keys])   # (C, P)
+
+        U, K = self.arr.values.shape
+        values = np.broadcast_to(self.arr.values, (C, U, K)).copy()
+        pop = np.broadcast_to(self.arr.population, (C, U)).copy()
+        scores = np.empty((C, self.years))
+        cost = np.zeros(C)
+        alive = np.arange(C)
+        group = {}                                                       # (budget, eff) -> candidate ids
+        for i, (_, budget, e) in enumerate(keys): group.setdefault((budget, e), []).append(i)
+
+        for t in range(self.years):
+            prev_pop = pop
+            values, pop, pc = step_arrays(values, pop, self.slope_mat, dollars[alive], floor[alive],
+                                          emax[alive], pc50[alive], eff[alive], rule=self.rule)
+            cost[alive] += allocated_dollars(pc, prev_pop).sum(axis=1)
+            scores[alive, t] = compute_score_batch(values, decimals=None)
+            if (t + 1) in self.checkpoints and len(alive) > self.min_keep:
+                partial = self._objective(scores[alive, :t + 1])
+                keep = []
+                for ids in group.values():
+                    pos = np.flatnonzero(np.isin(alive, ids))
+                    if len(pos) == 0: continue
+                    n_keep = max(self.min_keep, int(np.ceil(len(pos) * self.keep_frac)))
+                    keep.extend(pos[np.argsort(-partial[pos], kind="stable")[:n_keep]])
+                keep = np.sort(np.array(keep, dtype=int))
+                for c in np.setdiff1d(alive, alive[keep]):
+                    self.pruned.add(keys[c])
+                self.n_pruned += len(alive) - len(keep)
+                alive, values, pop = alive[keep], values[keep], pop[keep]
+
+        equity = np.clip(1 - 2.0 * values[..., SCORE_DISP_POS].std(axis=1, ddof=1).sum(axis=-1) / 6.0, 0.0, 1.0)
+        obj = self._objective(scores[alive])
+        for j, c in enumerate(alive):
+            split, budget, e = keys[c]
+            row = dict(zip(POLICIES, split))
+            row.update(city_budget=budget, eff_mult=e, floor_pc=tuned[c][0], objective=float(obj[j]),
+                       final_score=round(float(scores[c, -1]), 1), equity_term=float(equity[j]),
+                       cost=float(cost[c]), feasible=self.equity_floor is None or equity[j] >= self.equity_floor)
+            self.memo[keys[c]] = row
+        self.n_evaluated += C
+
+
+def pareto_front(table, score="objective", cost="cost"):
+    """Rows not dominated by another row with >= score and <= cost (strictly better in one)."""
+    t = table.sort_values([cost, score], ascending=[True, False])
+    best, keep = -np.inf, []
+    for idx, sc in zip(t.index, t[score]):
+        if sc > best:
+            keep.append(idx); best = sc
+    return table.loc[keep].sort_values(cost).reset_index(drop=True)
+
+@profiled()
+def optimize_splits(hist_df, arr, slope_mat, years, budgets, eff_mults=(1.0,), step=10.0, min_share=None,
+                    max_share=None, equity_floor=None, stability=True, discount=None, prune=True, refine_top=5,
+                    batch_size=512, memo=None, rule="proportional"):
+    """Search the split simplex (× budgets × eff_mults) for the best composite score.
+
+    objective = final-year score, or the discounted mean of yearly scores when
+    `discount` (annual rate) is given. Candidates whose final equity term
+    (1 - 2·dispersion) is below `equity_floor` are kept in the table but marked
+    infeasible and excluded from `best` and the Pareto front.
+
+    `memo` may be a dict kept by the caller between calls with the same baseline,
+    years and settings (including `rule`); candidates already in it are not
+    simulated again. Only completed candidates are memoized: whether a candidate
+    survives successive halving depends on the pool it ran with, so pruned ones
+    are simulated again in a later call.
+    """
+    min_share, max_share = min_share or {}, max_share or {}
+    years = int(years)
+    checkpoints = [max(1, years // 4), max(1, years // 2)] if prune else []
+    ev = SplitEvaluator(hist_df, arr, slope_mat, years, stability=stability, discount=discount,
+                        checkpoints=checkpoints, equity_floor=equity_floor, memo=memo, rule=rule)
+    budgets = [float(b) for b in budgets]
+    eff_mults = [float(e) for e in eff_mults]
+
+    lattice = simplex_lattice(step, min_share, max_share)
+    if not lattice:
+        raise ValueError("No split satisfies the share constraints.")
+    keys = [(s, b, e) for s in lattice for b in budgets for e in eff_mults]
+    for i in range(0, len(keys), batch_size):
+        ev.evaluate(keys[i:i + batch_size])
+
+    # Refinement: half-step neighbourhood of the current leaders
+    fine = step / 2.0
+    done = [r for r in (ev.memo.get(k) for k in keys) if r is not None and r["feasible"]]
+    leaders = sorted(done, key=lambda r: -r["objective"])[:refine_top]
+    refine = []
+    for r in leaders:
+        split = tuple(r[p] for p in POLICIES)
+        refine += [(s, r["city_budget"], r["eff_mult"]) for s in _neighbours(split, fine, min_share, max_share)]
+    for i in range(0, len(refine), batch_size):
+        ev.evaluate(refine[i:i + batch_size])
+
+    scored = set(keys) | set(refine)
+    table = pd.DataFrame([r for k, r in ev.memo.items() if k in scored])
+    table = table.sort_values("objective", ascending=False).reset_index(drop=True)
+    feasible = table[table["feasible"]]
+    if feasible.empty:
+        raise ValueError("No candidate meets the equity floor.")
+    return OptimizeResult(table, pareto_front(feasible), feasible.iloc[0].to_dict(),
+                          ev.n_evaluated, ev.n_pruned, ev.n_memo_hits)
@@ -0,0 +1,228 @@
+# clinicsim/profiling.py — opt-in stage timing for the pipeline and the app
+#
+# Pipeline functions are wrapped with @profiled and app sections with
+# `with stage("figure: trends"):`. While PROFILER is disabled (the default)
+# a wrapped call costs one attribute check. When it is enabled, every stage
+# records:
+#
+#   • wall time and call count, aggregated per stage name
+#   • allocated bytes: the tracemalloc peak above the stage's starting level
+#     (only when memory tracking is on, since tracemalloc slows everything).
+#     The peak is process-wide, so a stage that overlaps a stage on another
+#     thread (a second session, the warm-up) gets no byte count rather than
+#     a mixed one.
+#   • one complete ("X") event per call for the Chrome trace, bounded to the
+#     last MAX_EVENTS calls
+#
+# Stages nest: a child's time is also counted in its parent. PROFILER is
+# process-wide, so with several app sessions open it sees all of them.
+# Enable it with CLINICSIM_PROFILE=1 or from the app's Performance panel.
+#
+# to_json() / to_chrome_trace() export the results. compare_profiles() lines
+# up two JSON exports (e.g. before/after a change) stage by stage.
+
+import functools
+import json
+import os
+import platform
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+MAX_EVENTS = 20_000
+
+
+class _Span:
+    """One timed stage; use as a context manager, or start()/stop() across a script."""
+
+    __slots__ = ("prof", "name", "t0", "cur0", "peak", "bytes", "epoch")
+
+    def __init__(self, prof, name):
+        self.prof, self.name, self.t0 = prof, name, None
+
+    def start(self):
+        self.prof._enter(self)
+        return self
+
+    def stop(self):
+        """Record the span; further calls are no-ops."""
+        if self.t0 is not None:
+            self.prof._exit(self)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+    def start(self): return self
+    def stop(self): pass
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+_NULL = _NullSpan()
+
+
+class Profiler:
+    """Per-stage wall time, call counts and (optionally) allocated bytes."""
+
+    def __init__(self, enabled=False, memory=False):
+        self.enabled = enabled
+        self.memory = memory
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._mem_open = {}       # thread id -> open memory-tracked spans
+        self._mem_epoch = 0       # bumped whenever memory-tracked spans of two threads overlap
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}                                  # name -> {"calls", "total_s", "max_s", "bytes", "max_bytes"}
+            self.events = deque(maxlen=MAX_EVENTS)           # (name, start_s, dur_s, thread id, bytes)
+            self.t_origin = time.perf_counter()
+
+    def set_memory(self, on):
+        """Turn allocation tracking on/off (starts/stops tracemalloc if this profiler owns it)."""
+        if on and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+        elif not on and getattr(self, "_owns_tracemalloc", False):
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
+        self.memory = on
+
+    # ---------------- Spans ----------------
+    def stage(self, name):
+        return _Span(self, name) if self.enabled else _NULL
+
+    def _stack(self):
+        st = getattr(self._local, "stack", None)
+        if st is None:
+            st = self._local.stack = []
+        return st
+
+    def _enter(self, span):
+        span.bytes = None
+        if self.memory and tracemalloc.is_tracing():
+            me = threading.get_ident()
+            with self._lock:
+                overlaps = any(n for t, n in self._mem_open.items() if t != me)
+                if overlaps: self._mem_epoch += 1
+                self._mem_open[me] = self._mem_open.get(me, 0) + 1
+                span.epoch = -1 if overlaps else self._mem_epoch
+            cur, pk = tracemalloc.get_traced_memory()
+            stack = self._stack()
+            if stack: stack[-1].peak = max(stack[-1].peak, pk)
+            tracemalloc.reset_peak()
+            span.cur0 = span.peak = cur
+            stack.append(span)
+        span.t0 = time.perf_counter()
+
+    def _exit(self, span):
+        dur = time.perf_counter() - span.t0
+        stack = self._stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+            span.peak = max(span.peak, tracemalloc.get_traced_memory()[1]) if tracemalloc.is_tracing() else span.peak
+            if stack: stack[-1].peak = max(stack[-1].peak, span.peak)
+            me = threading.get_ident()
+            with self._lock:
+                self._mem_open[me] -= 1
+                if not self._mem_open[me]: del self._mem_open[me]
+                overlapped = span.epoch != self._mem_epoch
+            span.bytes = None if overlapped else span.peak - span.cur0
+        with self._lock:
+            s = self.stats.get(span.name)
+            if s is None:
+                s = self.stats[span.name] = {"calls": 0, "total_s": 0.0, "max_s": 0.0, "bytes": 0, "max_bytes": 0}
+            s["calls"] += 1
+            s["total_s"] += dur
+            s["max_s"] = max(s["max_s"], dur)
+            if span.bytes is not None:
+                s["bytes"] += span.bytes
+                s["max_bytes"] = max(s["max_bytes"], span.bytes)
+            self.events.append((span.name, span.t0 - self.t_origin, dur, threading.get_ident(), span.bytes))
+        span.t0 = None
+
+    # ---------------- Reports ----------------
+    def rows(self):
+        """One dict per stage, slowest total first."""
+        with self._lock:
+            items = [(k, dict(v)) for k, v in self.stats.items()]
+        out = []
+        for name, s in sorted(items, key=lambda kv: -kv[1]["total_s"]):
+            out.append({"stage": name, "calls": s["calls"], "total_ms": 1000 * s["total_s"],
+                        "mean_ms": 1000 * s["total_s"] / s["calls"], "max_ms": 1000 * s["max_s"],
+                        "alloc_mb": s["bytes"] / 2**20 if self.memory or s["bytes"] else None,
+                        "max_alloc_mb": s["max_bytes"] / 2**20 if self.memory or s["max_bytes"] else None})
+        return out
+
+    def to_json(self, meta=None):
+        """Summary JSON (stages plus environment) for comparing runs across versions."""
+        import numpy as np
+        import pandas as pd
+        doc = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "memory_tracking": self.memory,
+               "environment": {"python": platform.python_version(), "numpy": np.__version__,
+                               "pandas": pd.__version__, "platform": platform.platform()},
+               "meta": meta or {}, "stages": self.rows()}
+        return json.dumps(doc, indent=2)
+
+    def to_chrome_trace(self):
+        """Trace Event Format JSON (chrome://tracing, Perfetto): one complete event per recorded call."""
+        with self._lock:
+            events = list(self.events)
+        tids = {}
+        trace = []
+        for name, start, dur, tid, nbytes in events:
+            ev = {"name": name, "cat": name.split(":")[0], "ph": "X", "pid": os.getpid(),
+                  "tid": tids.setdefault(tid, len(tids) + 1), "ts": 1e6 * start, "dur": 1e6 * dur}
+            if nbytes is not None: ev["args"] = {"alloc_bytes": nbytes}
+            trace.append(ev)
+        return json.dumps({"traceEvents": trace, "displayTimeUnit": "ms"})
+
+
+def compare_profiles(old, new, threshold=0.10):
+    """Stage-by-stage mean time of two to_json() exports (str, dict or path).
+
+    Returns rows {"stage", "old_ms", "new_ms", "ratio", "flag"}; flag is
+    "slower"/"faster" when the ratio moves beyond `threshold`.
+    """
+    def load(doc):
+        if isinstance(doc, dict): return doc
+        if isinstance(doc, str) and doc.lstrip().startswith("{"): return json.loads(doc)
+        with open(doc, encoding="utf-8") as f: return json.load(f)
+    a = {r["stage"]: r for r in load(old)["stages"]}
+    b = {r["stage"]: r for r in load(new)["stages"]}
+    rows = []
+    for name in list(dict.fromkeys([*a, *b])):
+        o, n = a.get(name, {}).get("mean_ms"), b.get(name, {}).get("mean_ms")
+        ratio = n / o if o and n is not None else None
+        flag = "" if ratio is None else "slower" if ratio > 1 + threshold else "faster" if ratio < 1 - threshold else ""
+        rows.append({"stage": name, "old_ms": o, "new_ms": n, "ratio": ratio, "flag": flag})
+    return rows
+
+
+# Process-wide instance used by @profiled and the app
+PROFILER = Profiler(enabled=os.environ.get("CLINICSIM_PROFILE", "") not in ("", "0"))
+
+def stage(name):
+    """Context manager timing one stage on PROFILER (a no-op while it is disabled)."""
+    return PROFILER.stage(name)
+
+def profiled(name=None):
+    """Decorator: time every call of the function as stage `name` (default: the function name)."""
+    def deco(fn):
+        label = name or fn.__name__
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return fn(*args, **kwargs)
+            with _Span(PROFILER, label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
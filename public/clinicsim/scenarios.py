@@ -0,0 +1,201 @@
+# clinicsim/scenarios.py — batch scenario sweeps without Streamlit
+#
+# A scenario file (JSON, or YAML when PyYAML is installed) names the baseline
+# and a grid of settings; every combination of the grid values is one scenario:
+#
+#   {
+#     "hist": "combined_all_zip_data.csv",      # optional; paths are relative to the file
+#     "index": "index_2025_predictions.csv",    # used to synthesize a baseline when hist is missing
+#     "start_year": 2025, "years": 10,
+#     "grid": {
+#       "city_budget": [10e6, 30e6, 60e6],
+#       "splits": [{"clinics": 25, "campaigns": 35, "jobs": 30, "equity": 10}],
+#       "eff_mult": [1.0, 1.2],
+#       "seed": [0, 1, 2]
+#     },
+#     "scenarios": [{"city_budget": 5e6, "events": true}]    # extra one-off scenarios
+#   }
+#
+# Anything not set falls back to DEFAULTS (the app's sidebar defaults). The
+# baseline is loaded and prepared once in the parent; workers receive the
+# initial state arrays through the pool initializer and return one row per
+# (scenario, year), plus per-ZIP rows when zip_level is on.
+
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from .model import E_MAX_BASE, PC50_BASE, slope_medians
+from .engine import (
+    IND_NAMES, POLICIES, StateArrays, slope_matrix, simulate_one_year_arrays, compute_score_arrays, long_frame,
+)
+from .tuning import stability_tune_solve
+
+DEFAULTS = {
+    "city_budget": 30_000_000.0,
+    "splits": {"clinics": 25, "campaigns": 35, "jobs": 30, "equity": 10},
+    "eff_mult": 1.0,
+    "seed": 0,
+    "events": False,
+    "stability": True,
+    "rule": "proportional",
+    "years": 10,
+}
+SCENARIO_KEYS = tuple(DEFAULTS)
+
+
+# ---------------- Scenario files ----------------
+def load_scenarios(path):
+    """Parse a JSON/YAML scenario file; relative baseline paths are resolved against its folder."""
+    path = Path(path)
+    text = path.read_text(encoding="utf-8")
+    if path.suffix.lower() in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError as e:
+            raise ImportError("YAML scenario files need PyYAML (pip install pyyaml); JSON works without it.") from e
+        spec = yaml.safe_load(text) or {}
+    else:
+        spec = json.loads(text)
+    for k in ("hist", "index"):
+        if spec.get(k):
+            spec[k] = str((path.parent / spec[k]).resolve())
+    return spec
+
+def expand_scenarios(spec):
+    """Cartesian product of spec["grid"] plus spec["scenarios"], each filled in from the spec and DEFAULTS."""
+    base = {k: spec.get(k, v) for k, v in DEFAULTS.items()}
+    grid = spec.get("grid") or {}
+    unknown = set(grid) - set(SCENARIO_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown grid keys: {sorted(unknown)} (expected some of {list(SCENARIO_KEYS)})")
+    axes = [(k, v if isinstance(v, list) else [v]) for k, v in grid.items()]
+    out = []
+    for combo in itertools.product(*[vals for _, vals in axes]):
+        out.append(dict(base, **dict(zip([k for k, _ in axes], combo))))
+    for extra in spec.get("scenarios") or []:
+        out.append(dict(base, **extra))
+    if not out:
+        out.append(dict(base))
+    for i, scn in enumerate(out):
+        total = sum(scn["splits"].get(p, 0.0) for p in POLICIES) or 1.0
+        scn["splits"] = {p: 100.0 * scn["splits"].get(p, 0.0) / total for p in POLICIES}
+        scn["id"] = i
+    return out
+
+
+# ---------------- Baseline ----------------
+def baseline_state(hist_df, start_year):
+    """Initial StateArrays: each ZIP's row for start_year-1, else its latest row (as the app does)."""
+    from .store import panel_index
+    idx = panel_index(hist_df)
+    rows = idx.state_rows(start_year - 1)
+    vals = rows[IND_NAMES].to_numpy(dtype=float)
+    vals = np.where(np.isnan(vals), 1.0, np.clip(vals, 0.0, 1.0))           # clamp01 semantics
+    pop = rows["population"].to_numpy(dtype=float) if "population" in rows.columns else np.full(len(idx.zips), 20000.0)
+    pop = np.where(np.isnan(pop), 100.0, np.maximum(100.0, np.where(pop == 0, 20000.0, pop)))
+    return StateArrays(list(idx.zips), vals, pop)
+
+def load_baseline(spec):
+    """hist_df for a scenario spec, through the cached ingest loaders."""
+    from .ingest import load_hist_cached, load_index_cached, synth_hist_cached, source_key
+    if spec.get("hist") and Path(spec["hist"]).exists():
+        return load_hist_cached(spec["hist"])
+    if not spec.get("index"):
+        raise ValueError("Scenario file needs a 'hist' baseline or an 'index' file to synthesize one from.")
+    return synth_hist_cached(load_index_cached(spec["index"]), source_key(spec["index"]),
+                             int(spec.get("start_year", 2025)))
+
+
+# ---------------- Running ----------------
+_CTX = {}   # per-process baseline: arr, slope_mat, med, mean_pop, start_year, zip_level
+
+def _init_worker(ctx):
+    _CTX.clear(); _CTX.update(ctx)
+
+def run_one(scn):
+    """Simulate one scenario against the worker's baseline; returns (summary rows, zip frame or None)."""
+    arr, start_year = _CTX["arr"], _CTX["start_year"]
+    if scn["stability"]:
+        floor_pc, E_MAX, PC50, _ = stability_tune_solve(_CTX["med"], _CTX["mean_pop"], scn["city_budget"], scn["splits"])
+    else:
+        floor_pc, E_MAX, PC50 = 25.0, E_MAX_BASE, PC50_BASE
+    rng = random.Random(scn["seed"])
+    params = {"scenario": scn["id"], "city_budget": scn["city_budget"], **scn["splits"], "eff_mult": scn["eff_mult"],
+              "seed": scn["seed"], "events": scn["events"], "stability": scn["stability"], "rule": scn["rule"],
+              "floor_pc": floor_pc}
+    rows, outs = [], []
+    for i in range(int(scn["years"])):
+        arr, out, score = simulate_one_year_arrays(start_year + i, arr, _CTX["slope_mat"], scn["city_budget"],
+                                                   scn["splits"], floor_pc, E_MAX, PC50, scn["events"],
+                                                   scn["eff_mult"], rng, scn["rule"])
+        rec = dict(params, year=start_year + i, score=score,
+                   weighted_score=compute_score_arrays(out.values, out.population),
+                   spend=float(out.spend.sum()), budget_gap=float(out.spend.sum()) - scn["city_budget"])
+        rec.update(zip(IND_NAMES, out.values.mean(axis=0).tolist()))
+        rows.append(rec)
+        if _CTX["zip_level"]: outs.append(out)
+    if not outs:
+        return rows, None
+    U = len(arr.zips)
+    zdf = long_frame(np.repeat([o.year for o in outs], U), np.tile(np.asarray(arr.zips, dtype=object), len(outs)),
+                     np.concatenate([o.values for o in outs]), np.concatenate([o.population for o in outs]),
+                     np.concatenate([o.pc for o in outs]), np.concatenate([o.events for o in outs]))
+    zdf.insert(0, "scenario", scn["id"])
+    return rows, zdf
+
+def run_scenarios(spec, workers=None, zip_level=False, hist_df=None, progress=None):
+    """Run every scenario in `spec` (a dict or a scenario file path).
+
+    Returns (summary frame with one row per scenario-year, per-ZIP frame or None,
+    info dict). workers=None uses every core; workers=1 runs in-process.
+    """
+    import pandas as pd
+    t0 = time.perf_counter()
+    if not isinstance(spec, dict):
+        spec = load_scenarios(spec)
+    scenarios = expand_scenarios(spec)
+    start_year = int(spec.get("start_year", 2025))
+    if hist_df is None:
+        hist_df = load_baseline(spec)
+    arr = baseline_state(hist_df, start_year)
+    ctx = {"arr": arr, "slope_mat": slope_matrix(hist_df, arr.zips), "med": slope_medians(hist_df),
+           "mean_pop": float(arr.population.mean()) if len(arr.zips) else 20000.0,
+           "start_year": start_year, "zip_level": bool(zip_level)}
+    t_setup = time.perf_counter() - t0
+
+    workers = min(int(workers or os.cpu_count() or 1), len(scenarios))
+    results = []
+    if workers <= 1:
+        _init_worker(ctx)
+        for scn in scenarios:
+            results.append(run_one(scn))
+            if progress: progress(len(results), len(scenarios))
+    else:
+        chunk = max(1, len(scenarios) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(ctx,)) as ex:
+            for res in ex.map(run_one, scenarios, chunksize=chunk):
+                results.append(res)
+                if progress: progress(len(results), len(scenarios))
+
+    summary = pd.DataFrame([r for rows, _ in results for r in rows])
+    zip_df = pd.concat([z for _, z in results], ignore_index=True) if zip_level else None
+    info = {"scenarios": len(scenarios), "units": len(arr.zips), "workers": workers,
+            "setup_s": t_setup, "total_s": time.perf_counter() - t0}
+    return summary, zip_df, info
+
+def write_results(df, path):
+    """Write a frame as Parquet (.parquet) or CSV (.csv, .csv.gz)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix == ".parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    return path
@@ -0,0 +1,310 @@
+# clinicsim/sensitivity.py — global sensitivity of the score to the model tables
+#
+# Factors are multipliers on the tables a run uses (after stability tuning
+# when that preset is on), each drawn from [lo, hi] (default 0.5–1.5):
+#
+#   emax:<policy>.<metric>   E_MAX entries (max yearly effect at saturation)
+#   pc50:<policy>            PC50 (per-capita spend at half saturation)
+#   cap:<indicator>          ANNUAL_CAPS (largest yearly change)
+#   event:<name>             EVENT_RATES (annual per-ZIP probability)
+#
+# Methods:
+#   morris  r random one-at-a-time trajectories of F+1 points on a `levels`
+#           grid; mu* (mean |elementary effect|), mu and sigma per factor
+#   sobol   Saltelli design, N × (F + 2) runs; first-order S1 and total ST
+#           (Saltelli 2010 / Jansen estimators) with bootstrap 95% half-widths
+#
+# Plus a one-at-a-time sweep (every factor at lo and at hi, the rest at 1)
+# for the tornado charts.
+#
+# Outputs are the final-year composite score (unrounded) and each ZIP's own
+# composite (the score's level terms for that ZIP, without the equity term),
+# so indices come out for the city and every ZIP from the same runs.
+#
+# Evaluation: a (S, F) multiplier matrix runs in batches as the leading axis
+# of engine.step_arrays from one shared baseline (state, slopes, policy
+# matrices, dollars per policy, and one set of uniform event draws reused by
+# every sample, so event-rate factors only move the thresholds). workers > 1
+# hands the baseline to each process once through the pool initializer and
+# splits the batches.
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .model import POLICY_TARGETS, ANNUAL_CAPS, EVENT_RATES
+from .engine import (
+    IND_NAMES, IND_POS, POLICIES, EVENT_NAMES, CAPS, EVENT_P, policy_matrices, budget_by_policy, step_arrays,
+    compute_score_batch,
+)
+from .profiling import profiled
+
+SA_METHODS = ("morris", "sobol")
+FACTOR_GROUPS = ("emax", "pc50", "cap", "event")
+DEFAULT_RANGE = (0.5, 1.5)
+BATCH = 512
+
+# Per-ZIP composite: the score's level terms (weights sum to 0.90), rescaled to 0–100
+_ZIP_W = np.zeros(len(IND_NAMES)); _ZIP_SIGN = np.zeros(len(IND_NAMES))
+for _n, _w, _s in [("employed", 0.18, +1), ("health_index", 0.18, +1), ("no_doctor", 0.18, -1),
+                   ("diabetes", 0.18, -1), ("high_bp", 0.14, -1), ("kidney_disease", 0.04, -1)]:
+    _ZIP_W[IND_POS[_n]], _ZIP_SIGN[IND_POS[_n]] = _w, _s
+
+
+def zip_composite(values):
+    """(..., U, K) -> (..., U) per-ZIP composite on 0–100 (no equity term)."""
+    v = np.clip(values, 0.0, 1.0)
+    terms = np.where(_ZIP_SIGN > 0, v, 1.0 - v) * _ZIP_W
+    return 100.0 * terms.sum(axis=-1) / _ZIP_W.sum()
+
+
+# ---------------- Factors ----------------
+def sa_factors(events=True):
+    """[(name, group)] in a fixed order; event-rate factors only when events are on."""
+    out = [(f"emax:{p}.{m}", "emax") for p in POLICIES for m in POLICY_TARGETS[p]]
+    out += [(f"pc50:{p}", "pc50") for p in POLICIES]
+    out += [(f"cap:{n}", "cap") for n in IND_NAMES if n in ANNUAL_CAPS]
+    if events:
+        out += [(f"event:{e}", "event") for e in EVENT_NAMES if e in EVENT_RATES]
+    return out
+
+def factor_bounds(factors, ranges=None, default=DEFAULT_RANGE):
+    """(F, 2) multiplier bounds; `ranges` maps a factor name or a group to (lo, hi)."""
+    ranges = ranges or {}
+    return np.array([ranges.get(name, ranges.get(group, default)) for name, group in factors], dtype=float)
+
+
+@dataclass
+class SABaseline:
+    """Everything the batched evaluator shares across samples."""
+    zips: list
+    values: np.ndarray       # (U, K)
+    population: np.ndarray   # (U,)
+    slope_mat: np.ndarray    # (U, K)
+    dollars: np.ndarray      # (P,)
+    floor_pc: float
+    emax: np.ndarray         # (P, K) at multiplier 1
+    pc50: np.ndarray         # (P,)
+    caps: np.ndarray         # (K,)
+    rates: np.ndarray        # (E,)
+    eff_mult: float
+    rule: str
+    years: int
+    draws: np.ndarray        # (Y, U, E) uniform event draws, or None when events are off
+    factors: list
+
+def sa_baseline(arr, slope_mat, years, city_budget, splits, floor_pc, E_MAX, PC50, eff_mult=1.0, events=True,
+                rule="proportional", seed=0):
+    """Precompute the shared baseline once (policy matrices, dollars, event draws)."""
+    emax, pc50 = policy_matrices(E_MAX, PC50) if isinstance(E_MAX, dict) else (E_MAX, PC50)
+    draws = np.random.default_rng(seed).random((int(years), len(arr.zips), len(EVENT_NAMES))) if events else None
+    return SABaseline(list(arr.zips), np.asarray(arr.values, float), np.asarray(arr.population, float), slope_mat,
+                      budget_by_policy(city_budget, splits), floor_pc, emax, pc50, CAPS.copy(), EVENT_P.copy(),
+                      eff_mult, rule, int(years), draws, sa_factors(events))
+
+def _tables(base, M):
+    """Multipliers (B, F) -> per-sample emax (B,1,P,K), pc50 (B,1,P), caps (B,1,K), rates (B,1,E)."""
+    B = len(M)
+    emax = np.broadcast_to(base.emax, (B,) + base.emax.shape).copy()
+    pc50 = np.broadcast_to(base.pc50, (B, len(POLICIES))).copy()
+    caps = np.broadcast_to(base.caps, (B, len(IND_NAMES))).copy()
+    rates = np.broadcast_to(base.rates, (B, len(EVENT_NAMES))).copy()
+    for f, (name, group) in enumerate(base.factors):
+        key = name.split(":", 1)[1]
+        if group == "emax":
+            pol, metric = key.split(".", 1)
+            emax[:, POLICIES.index(pol), IND_POS[metric]] *= M[:, f]
+        elif group == "pc50":
+            pc50[:, POLICIES.index(key)] *= M[:, f]
+        elif group == "cap":
+            caps[:, IND_POS[key]] *= M[:, f]
+        else:
+            rates[:, EVENT_NAMES.index(key)] *= M[:, f]
+    return emax[:, None], pc50[:, None], caps[:, None], rates[:, None]
+
+
+# ---------------- Evaluation ----------------
+def evaluate(base, M):
+    """Run every row of multipliers M (S, F); returns (final scores (S,), per-ZIP composites (S, U))."""
+    M = np.atleast_2d(np.asarray(M, dtype=float))
+    scores = np.empty(len(M))
+    zips = np.empty((len(M), len(base.values)))
+    for s in range(0, len(M), BATCH):
+        e = min(len(M), s + BATCH)
+        emax, pc50, caps, rates = _tables(base, M[s:e])
+        vals = np.broadcast_to(base.values, (e - s,) + base.values.shape).copy()
+        pops = np.broadcast_to(base.population, (e - s, len(base.population))).copy()
+        for y in range(base.years):
+            events = None if base.draws is None else base.draws[y] < rates
+            vals, pops, _ = step_arrays(vals, pops, base.slope_mat, base.dollars, base.floor_pc, emax, pc50,
+                                        base.eff_mult, events, base.rule, caps)
+        scores[s:e] = compute_score_batch(vals, decimals=None)
+        zips[s:e] = zip_composite(vals)
+    return scores, zips
+
+_CTX = {}   # per-process SABaseline
+
+def _init_worker(base):
+    _CTX["base"] = base
+
+def _evaluate_chunk(M):
+    return evaluate(_CTX["base"], M)
+
+def evaluate_parallel(base, M, workers=1):
+    """evaluate() with the sample axis split over `workers` processes (same results)."""
+    if not workers or workers <= 1 or len(M) <= BATCH:
+        return evaluate(base, M)
+    chunks = [M[s:s + BATCH] for s in range(0, len(M), BATCH)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(base,)) as ex:
+        parts = list(ex.map(_evaluate_chunk, chunks))
+    return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+
+# ---------------- Designs ----------------
+def morris_design(F, r, levels=4, rng=None):
+    """r trajectories of F+1 points in [0, 1]^F; consecutive points differ in one factor by ±delta."""
+    rng = np.random.default_rng(rng)
+    delta = levels / (2.0 * (levels - 1))
+    grid = np.arange(levels // 2) / (levels - 1)                       # base values with x + delta <= 1
+    Bstar = np.tril(np.ones((F + 1, F)), -1)
+    X = np.empty((r, F + 1, F))
+    for t in range(r):
+        x0 = rng.choice(grid, F)
+        D = rng.choice([-1.0, 1.0], F)
+        perm = rng.permutation(F)
+        pts = x0 + (delta / 2.0) * ((2.0 * Bstar - 1.0) * D + 1.0)
+        X[t] = pts[:, perm]
+    return X, delta
+
+def saltelli_design(F, n, rng=None):
+    """A, B (n, F) and the n·F AB_i rows (A with column i from B), stacked as [A; B; AB_1 … AB_F]."""
+    rng = np.random.default_rng(rng)
+    A, B = rng.random((n, F)), rng.random((n, F))
+    AB = np.repeat(A[None], F, axis=0)
+    AB[np.arange(F), :, np.arange(F)] = B.T
+    return np.concatenate([A, B, AB.reshape(F * n, F)])
+
+
+# ---------------- Estimators ----------------
+def morris_indices(X, Y, delta):
+    """Elementary effects per unit of each factor's range: (mu*, mu, sigma), each (F, ...) over outputs."""
+    r, n, F = X.shape
+    Y = Y.reshape((r, n) + Y.shape[1:])
+    dX = np.diff(X, axis=1)                                           # (r, F, F): one nonzero per step
+    which = np.abs(dX).argmax(axis=2)                                 # (r, F) factor moved at each step
+    step = np.take_along_axis(dX, which[..., None], 2)[..., 0]
+    ee = np.diff(Y, axis=1) / step.reshape(step.shape + (1,) * (Y.ndim - 2))
+    out = np.empty((F, r) + Y.shape[2:])
+    out[which.T, np.arange(r)[None, :]] = np.moveaxis(ee, 1, 0)
+    return np.abs(out).mean(axis=1), out.mean(axis=1), out.std(axis=1, ddof=1) if r > 1 else np.zeros_like(out[:, 0])
+
+def sobol_indices(Y, n, F, resamples=0, rng=None):
+    """S1, ST (F, ...) from [A; B; AB_i] outputs; with resamples > 0 also bootstrap 95% half-widths."""
+    fA, fB = Y[:n], Y[n:2 * n]
+    fAB = Y[2 * n:].reshape((F, n) + Y.shape[1:])
+
+    def est(idx):
+        a, b, ab = fA[idx], fB[idx], fAB[:, idx]
+        mean = np.concatenate([a, b]).mean(axis=0)                   # centering keeps S1 stable when the
+        a, b, ab = a - mean, b - mean, ab - mean                      # mean is large next to the spread
+        var = np.concatenate([a, b]).var(axis=0)
+        var = np.where(var > 0, var, np.nan)
+        s1 = (b * (ab - a)).mean(axis=1) / var
+        st = 0.5 * ((a - ab) ** 2).mean(axis=1) / var
+        return s1, st
+
+    s1, st = est(np.arange(n))
+    if not resamples:
+        return s1, st, None, None
+    rng = np.random.default_rng(rng)
+    boot = [est(rng.integers(0, n, n)) for _ in range(resamples)]
+    s1_ci = 1.96 * np.std([b[0] for b in boot], axis=0)
+    st_ci = 1.96 * np.std([b[1] for b in boot], axis=0)
+    return s1, st, s1_ci, st_ci
+
+
+# ---------------- Driver ----------------
+@dataclass
+class SensitivityResult:
+    method: str
+    factors: list            # [(name, group)]
+    bounds: np.ndarray       # (F, 2) multiplier ranges
+    table: pd.DataFrame      # citywide indices, most influential first
+    zips: list
+    zip_index: np.ndarray    # (F, U) main index per ZIP (ST for sobol, mu* for morris)
+    base_score: float
+    base_zip: np.ndarray     # (U,)
+    oat_score: np.ndarray    # (F, 2) final score with the factor at lo / hi
+    oat_zip: np.ndarray      # (F, 2, U)
+    samples: int
+    seconds: float
+
+    @property
+    def index_name(self):
+        return "ST" if self.method == "sobol" else "mu_star"
+
+    def zip_table(self, z):
+        """Ranked indices and tornado swings for one ZIP."""
+        u = self.zips.index(str(z))
+        df = pd.DataFrame({"factor": [n for n, _ in self.factors], "group": [g for _, g in self.factors],
+                           self.index_name: self.zip_index[:, u],
+                           "low": self.oat_zip[:, 0, u], "high": self.oat_zip[:, 1, u]})
+        df["swing"] = (df["high"] - df["low"]).abs()
+        return df.sort_values(self.index_name, ascending=False, ignore_index=True)
+
+    def tornado_frame(self, z=None):
+        """factor, low, high, base (city score, or one ZIP's composite), ordered by the main index."""
+        if z is None:
+            df = self.table[["factor", "low", "high"]].copy()
+            df["base"] = self.base_score
+        else:
+            df = self.zip_table(z)[["factor", "low", "high"]].copy()
+            df["base"] = float(self.base_zip[self.zips.index(str(z))])
+        return df
+
+@profiled()
+def run_sensitivity(base, method="sobol", samples=10_000, ranges=None, levels=4, seed=0, workers=1, resamples=100):
+    """Global sensitivity over the base's factors with about `samples` model runs (+2F for the tornado)."""
+    if method not in SA_METHODS:
+        raise ValueError(f"Unknown sensitivity method {method!r} (expected one of {SA_METHODS})")
+    t0 = time.perf_counter()
+    factors = base.factors
+    F = len(factors)
+    bounds = factor_bounds(factors, ranges)
+    lo, width = bounds[:, 0], bounds[:, 1] - bounds[:, 0]
+
+    if method == "morris":
+        r = max(2, int(samples) // (F + 1))
+        X, delta = morris_design(F, r, levels, seed)
+        unit = X.reshape(-1, F)
+    else:
+        n = max(2, int(samples) // (F + 2))
+        unit = saltelli_design(F, n, seed)
+    oat = np.ones((2 * F + 1, F))
+    oat[1 + np.arange(F), np.arange(F)] = lo
+    oat[1 + F + np.arange(F), np.arange(F)] = bounds[:, 1]
+    M = np.concatenate([lo + unit * width, oat])
+    Ys, Yz = evaluate_parallel(base, M, workers)
+    ys, yz = Ys[:len(unit)], Yz[:len(unit)]
+    o_s, o_z = Ys[len(unit):], Yz[len(unit):]
+
+    table = pd.DataFrame({"factor": [n for n, _ in factors], "group": [g for _, g in factors],
+                          "lo": bounds[:, 0], "hi": bounds[:, 1]})
+    if method == "morris":
+        mu_star, mu, sigma = morris_indices(X, ys, delta)
+        table["mu_star"], table["mu"], table["sigma"] = mu_star, mu, sigma
+        zip_index = morris_indices(X, yz, delta)[0]
+    else:
+        s1, st, s1_ci, st_ci = sobol_indices(ys, n, F, resamples, seed)
+        table["S1"], table["S1_conf"], table["ST"], table["ST_conf"] = s1, s1_ci, st, st_ci
+        zip_index = sobol_indices(yz, n, F)[1]
+    table["low"], table["high"] = o_s[1:F + 1], o_s[F + 1:]
+    table["swing"] = (table["high"] - table["low"]).abs()
+    key = "ST" if method == "sobol" else "mu_star"
+    table = table.sort_values(key, ascending=False, ignore_index=True)
+    return SensitivityResult(method, factors, bounds, table, list(base.zips), np.nan_to_num(zip_index), float(o_s[0]), o_z[0],
+                             np.stack([o_s[1:F + 1], o_s[F + 1:]], axis=1),
+                             np.stack([o_z[1:F + 1], o_z[F + 1:]], axis=1), len(M), time.perf_counter() - t0)
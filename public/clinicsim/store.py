@@ -0,0 +1,88 @@
+# clinicsim/store.py — sorted-array offset index over long (zip, year) frames
+#
+# Replaces per-ZIP / per-year boolean scans (df[df["zip"] == z]) with offsets
+# into two argsort orders built once per frame:
+#
+#   by ZIP:  rows of zip z are order[start[z]:end[z]], ascending by year
+#   by year: rows of year y are year_order[ystart[y]:yend[y]]
+#
+# so a lookup costs O(rows returned) instead of O(rows in the frame).
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+class PanelIndex:
+    """Offset index over a long frame with `key` (ZIP) and `year` columns."""
+
+    def __init__(self, df, key="zip", year="year"):
+        self.df = df
+        codes, uniques = pd.factorize(df[key], sort=True)
+        years = pd.to_numeric(df[year], errors="coerce").to_numpy(dtype=float)
+        keep = np.flatnonzero(codes >= 0)
+        codes, years_k = codes[keep], years[keep]
+
+        self.zips = [str(z) for z in uniques]
+        self._zip_pos = {z: i for i, z in enumerate(self.zips)}
+        sub = np.lexsort((years_k, codes))                       # stable: by zip, then year
+        self.order = keep[sub]
+        self.order_years = years_k[sub]
+        counts = np.bincount(codes, minlength=len(self.zips))
+        self.ends = np.cumsum(counts)
+        self.starts = self.ends - counts
+
+        ok = ~np.isnan(years)
+        yo = np.flatnonzero(ok)[np.argsort(years[ok], kind="stable")]
+        self.year_order = yo
+        self.years, ystart, ycount = np.unique(years[yo], return_index=True, return_counts=True)
+        self._year_pos = {int(y): (int(s), int(s + c)) for y, s, c in zip(self.years, ystart, ycount)}
+
+    # ---------------- Positions ----------------
+    def positions(self, z):
+        """Row positions (iloc) of one ZIP, ascending by year; empty if unknown."""
+        i = self._zip_pos.get(str(z))
+        if i is None: return self.order[:0]
+        return self.order[self.starts[i]:self.ends[i]]
+
+    def year_positions(self, y):
+        s, e = self._year_pos.get(int(y), (0, 0))
+        return self.year_order[s:e]
+
+    def state_positions(self, year):
+        """One row per ZIP (in self.zips order): the row for `year`, else the ZIP's latest row."""
+        gid = np.repeat(np.arange(len(self.zips)), self.ends - self.starts)
+        hit = np.flatnonzero(self.order_years == year)
+        first = np.full(len(self.zips), len(self.order))
+        np.minimum.at(first, gid[hit], hit)                      # first row matching `year`
+        pos = np.where(first < len(self.order), first, self.ends - 1)   # else latest row (g.tail(1))
+        return self.order[pos]
+
+    # ---------------- Frames ----------------
+    def rows(self, z):
+        return self.df.iloc[self.positions(z)]
+
+    def year_rows(self, y):
+        return self.df.iloc[self.year_positions(y)]
+
+    def state_rows(self, year):
+        return self.df.iloc[self.state_positions(year)]
+
+    def year_list(self):
+        return [int(y) for y in self.years]
+
+
+_INDEXES = OrderedDict()   # id(df) -> (df, PanelIndex); holds df so ids are not reused
+
+def panel_index(df, key="zip", year="year", maxsize=8):
+    """PanelIndex for `df`, reused while the same frame object is passed (e.g. from the ingest cache)."""
+    k = (id(df), key, year)
+    hit = _INDEXES.get(k)
+    if hit is not None and hit[0] is df:
+        _INDEXES.move_to_end(k)
+        return hit[1]
+    idx = PanelIndex(df, key, year)
+    _INDEXES[k] = (df, idx)
+    while len(_INDEXES) > maxsize: _INDEXES.popitem(last=False)
+    return idx
@@ -0,0 +1,96 @@
+# clinicsim/synthetic.py — synthetic baselines in load_hist's wide schema
+#
+# make_wide_baseline() produces a frame with the columns (and spellings) of
+# combined_all_zip_data.csv, at any scale:
+#
+#   zip, <metric>_slope × 8,
+#   diabetes_Y, Index_Y, "high blood pressure_Y", "kidney disease_Y"    (single years)
+#   disability_/employed_/bipoc_/"no doctor_" Y-4-Y                      (5-year windows)
+#   population
+#
+# Each unit has a latent health factor that drives all of its levels, so need
+# weights and score dispersion behave like real data. Each series drifts along
+# the unit's own slope (in percentage points per year, like the bundled file).
+# Cells are knocked out at `missing`, and a few units lose a whole metric, so
+# every imputation fallback is exercised. Output is fully determined by `seed`.
+#
+# make_engine_state() skips the wide schema: uniform per-ZIP states and slopes
+# in the engine's own dict form, shared by the engine benchmark and tests.
+
+import numpy as np
+
+SLOPE_COLUMNS = {
+    "diabetes_slope": "diabetes", "disabled_slope": "disability", "hibp_slope": "high blood pressure",
+    "kidney_slope": "kidney disease", "healthindex_slope": "Index", "bipoc_slope": "bipoc",
+    "nodoc_slope": "no doctor", "employed_slope": "employed",
+}
+# column prefix -> (level range in %, sign of the latent health factor, 5-year window?)
+SERIES = {
+    "diabetes":            ((5, 20), -1, False),
+    "Index":               ((5, 95), +1, False),
+    "high blood pressure": ((20, 45), -1, False),
+    "kidney disease":      ((1, 5), -1, False),
+    "disability":          ((5, 20), -1, True),
+    "employed":            ((40, 70), +1, True),
+    "bipoc":               ((20, 95), -1, True),
+    "no doctor":           ((3, 20), -1, True),
+}
+SLOPE_DISTS = ("normal", "laplace", "student_t")
+
+
+def _slopes(rs, dist, scale, n):
+    if dist == "normal": return rs.normal(0.0, scale, n)
+    if dist == "laplace": return rs.laplace(0.0, scale / np.sqrt(2), n)
+    if dist == "student_t": return scale * rs.standard_t(3, n) / np.sqrt(3)
+    raise ValueError(f"Unknown slope distribution {dist!r} (expected one of {SLOPE_DISTS})")
+
+def make_wide_baseline(units=1000, years=12, missing=0.1, slope_dist="normal", slope_scale=0.3, pop_sigma=1.0,
+                       end_year=2025, seed=0):
+    """Wide baseline frame of `units` ZIP-like units × `years` year columns per metric.
+
+    slope_scale is the spread of the per-unit slopes (pp/year), pop_sigma the
+    log-normal sigma of population (larger = more skewed), missing the share of
+    level cells left empty.
+    """
+    import pandas as pd
+    rs = np.random.default_rng(seed)
+    health = rs.normal(0.0, 1.0, units)                                  # latent factor
+    cols = {"zip": [f"{i:05d}" for i in range(1, units + 1)]}
+    slopes = {}
+    for col, prefix in SLOPE_COLUMNS.items():
+        slopes[prefix] = _slopes(rs, slope_dist, slope_scale, units)
+        cols[col] = slopes[prefix].round(4)
+    t = np.arange(years)[::-1]                                           # years before end_year
+    for prefix, ((lo, hi), sign, window) in SERIES.items():
+        mid, half = (lo + hi) / 2, (hi - lo) / 2
+        level = np.clip(mid + half * np.tanh(0.6 * sign * health + rs.normal(0.0, 0.4, units)), lo * 0.5, hi * 1.2)
+        block = level[:, None] - slopes[prefix][:, None] * t[None, :] + rs.normal(0.0, 0.3, (units, years))
+        block = np.clip(block, 0.0, 100.0).round(1)
+        block[rs.random(block.shape) < missing] = np.nan
+        block[rs.random(units) < 0.02] = np.nan                          # ~2% of units without this metric
+        for j, y in enumerate(range(end_year - years + 1, end_year + 1)):
+            name = f"{prefix}_{y - 4}-{y}" if window else f"{prefix}_{y}"
+            cols[name] = block[:, j]
+    pop = rs.lognormal(9.5, pop_sigma, units).round()
+    pop[rs.random(units) < missing / 4] = np.nan
+    cols["population"] = pop
+    return pd.DataFrame(cols)
+
+def write_wide_baseline(path, **kwargs):
+    """make_wide_baseline(**kwargs) written as CSV; returns the path."""
+    make_wide_baseline(**kwargs).to_csv(path, index=False)
+    return path
+
+def make_engine_state(units, seed=0):
+    """(zips, states, slopes) of `units` random units: {zip: {indicator: 0–1, "population"}}, {zip: {indicator: slope}}."""
+    from .engine import IND_NAMES
+    rs = np.random.default_rng(seed)
+    zips = [f"{i:05d}" for i in range(units)]
+    vals = rs.uniform(0.05, 0.9, size=(units, len(IND_NAMES)))
+    sl = rs.normal(0.0, 0.004, size=(units, len(IND_NAMES)))
+    pop = rs.lognormal(9.5, 1.0, size=units)
+    states, slopes = {}, {}
+    for u, z in enumerate(zips):
+        states[z] = dict(zip(IND_NAMES, vals[u].tolist())); states[z]["population"] = float(pop[u])
+        slopes[z] = dict(zip(IND_NAMES, sl[u].tolist()))
+    return zips, states, slopes
@@ -0,0 +1,203 @@
+# clinicsim/trajcache.py — content-addressed cache of simulated trajectories
+#
+# A trajectory is everything a run from the baseline state produces for one
+# setting: per-year values / population / per-capita spend / events / score,
+# plus the exact float64 state and RNG state after each year, so that
+#
+#   • asking again for <= the cached number of years is a lookup (hit)
+#   • asking for more years continues from the stored final state and RNG
+#     state (extend) instead of re-running from the baseline
+#
+# Keys hash (baseline key, start_year, budget, normalized splits, eff_mult,
+# events flag, seed, stability flag, allocation rule). Memory is an LRU
+# bounded in MB (Trajectory.nbytes, RNG states included: each is the 625-word
+# Mersenne Twister state as uint32, about 2.5 KB, instead of a getstate()
+# tuple of boxed ints at ~24 KB); an optional disk tier pickles entries to
+# CACHE_DIR/trajectories and is checked before re-simulating. The cache is
+# shared by every session (and the warm-up thread): storage is guarded by a
+# lock, and run() holds a per-key lock so one setting is simulated once.
+
+import hashlib
+import os
+import pickle
+import random
+import threading
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from .engine import StateArrays, simulate_one_year_arrays, policy_matrices
+
+
+@dataclass
+class Trajectory:
+    start_year: int
+    zips: list
+    values: np.ndarray       # (Y, U, K) float64 state after each year
+    population: np.ndarray   # (Y, U) float64
+    pc: np.ndarray           # (Y, U, P) float32 per-capita allocation
+    events: np.ndarray       # (Y, U, E) bool
+    scores: list             # engine score per year
+    rng_states: np.ndarray   # (Y, 625) uint32 MT state after each year; (1, 625) when events are off
+    spend: np.ndarray = None # (Y, P) dollars actually allocated by policy
+
+    @property
+    def n(self):
+        return len(self.scores)
+
+    @property
+    def years(self):
+        return np.arange(self.start_year, self.start_year + self.n)
+
+    @property
+    def nbytes(self):
+        return (self.values.nbytes + self.population.nbytes + self.pc.nbytes + self.events.nbytes
+                + self.spend.nbytes + self.rng_states.nbytes)
+
+    def state_at(self, n):
+        """StateArrays after the first n years (exact: states are kept in float64)."""
+        return StateArrays(self.zips, self.values[n - 1].copy(), self.population[n - 1].copy())
+
+    def rng_at(self, n):
+        # Without events the RNG is never drawn from, so one stored state serves every year
+        rng = random.Random()
+        rng.setstate(_unpack_rng(self.rng_states[min(n, len(self.rng_states)) - 1]))
+        return rng
+
+
+def _pack_rng(rng):
+    """624-word Mersenne Twister state + position as uint32 (gauss_next is unused: the engine only draws random())."""
+    return np.array(rng.getstate()[1], dtype=np.uint32)
+
+def _unpack_rng(row):
+    return (3, tuple(int(w) for w in row), None)
+
+
+def trajectory_key(baseline_key, start_year, city_budget, splits, eff_mult, events_on, seed, stability,
+                   rule="proportional"):
+    total = sum(splits.values()) or 1.0
+    norm = tuple(sorted((k, round(100.0 * v / total, 9)) for k, v in splits.items()))
+    raw = repr((baseline_key, int(start_year), float(city_budget), norm, round(float(eff_mult), 9),
+                bool(events_on), int(seed), bool(stability), str(rule)))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+class TrajectoryCache:
+    """LRU of Trajectory objects bounded by `max_mb`, with an optional pickle tier in `disk_dir`."""
+
+    def __init__(self, max_mb=256, disk_dir=None):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._run_locks = weakref.WeakValueDictionary()   # key -> lock, dropped once no run holds or waits on it
+        self.bytes = 0
+        self.stats = {"hits": 0, "extends": 0, "misses": 0, "evictions": 0, "disk_hits": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ---------------- Storage ----------------
+    def _disk_path(self, key):
+        return self.disk_dir / f"{key}-v2.pkl"     # v2: packed RNG states
+
+    def get(self, key):
+        with self._lock:
+            traj = self._entries.get(key)
+            if traj is not None:
+                self._entries.move_to_end(key)
+                return traj
+        if self.disk_dir is not None and self._disk_path(key).exists():
+            try:
+                with open(self._disk_path(key), "rb") as f:
+                    traj = pickle.load(f)
+            except Exception:
+                return None
+            self._count("disk_hits")
+            self._store(key, traj)
+        return traj
+
+    def put(self, key, traj):
+        self._store(key, traj)
+        if self.disk_dir is not None:
+            try:
+                self.disk_dir.mkdir(parents=True, exist_ok=True)
+                tmp = self._disk_path(key).with_suffix(".tmp")
+                with open(tmp, "wb") as f:
+                    pickle.dump(traj, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, self._disk_path(key))
+            except OSError:
+                pass  # read-only deployments: memory tier only
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _store(self, key, traj):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None: self.bytes -= old.nbytes
+            if traj.nbytes > self.max_bytes:
+                return
+            self._entries[key] = traj
+            self.bytes += traj.nbytes
+            while self.bytes > self.max_bytes:
+                _, ev = self._entries.popitem(last=False)
+                self.bytes -= ev.nbytes
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear(); self.bytes = 0
+
+    # ---------------- Running ----------------
+    def run(self, key, years, arr0, slope_mat, start_year, city_budget, splits, floor_pc, E_MAX, PC50,
+            events_on, eff_mult, seed, rule="proportional"):
+        """Trajectory with at least `years` years for this setting; returns (trajectory, "hit"|"extend"|"miss")."""
+        with self._lock:
+            lock = self._run_locks.setdefault(key, threading.Lock())
+        with lock:
+            return self._run(key, years, arr0, slope_mat, start_year, city_budget, splits, floor_pc, E_MAX, PC50,
+                             events_on, eff_mult, seed, rule)
+
+    def _run(self, key, years, arr0, slope_mat, start_year, city_budget, splits, floor_pc, E_MAX, PC50,
+             events_on, eff_mult, seed, rule):
+        traj = self.get(key)
+        if traj is not None and traj.n >= years:
+            self._count("hits")
+            return traj, "hit"
+        if traj is None:
+            self._count("misses")
+            status, arr, rng, done = "miss", arr0, random.Random(seed), 0
+        else:
+            self._count("extends")
+            status, arr, rng, done = "extend", traj.state_at(traj.n), traj.rng_at(traj.n), traj.n
+
+        emax, pc50 = policy_matrices(E_MAX, PC50) if isinstance(E_MAX, dict) else (E_MAX, PC50)
+        outs, scores, rng_states = [], [], []
+        for i in range(done, years):
+            arr, out, score = simulate_one_year_arrays(start_year + i, arr, slope_mat, city_budget, splits, floor_pc,
+                                                       emax, pc50, events_on, eff_mult, rng, rule)
+            outs.append(out); scores.append(score)
+            if events_on or not rng_states: rng_states.append(_pack_rng(rng))
+        new = Trajectory(start_year, list(arr0.zips),
+                         np.stack([o.values for o in outs]), np.stack([o.population for o in outs]),
+                         np.stack([o.pc for o in outs]).astype(np.float32), np.stack([o.events for o in outs]),
+                         scores, np.stack(rng_states), np.stack([o.spend for o in outs]))
+        if traj is not None:
+            new = Trajectory(start_year, traj.zips,
+                             np.concatenate([traj.values, new.values]),
+                             np.concatenate([traj.population, new.population]),
+                             np.concatenate([traj.pc, new.pc]), np.concatenate([traj.events, new.events]),
+                             traj.scores + scores,
+                             np.concatenate([traj.rng_states, new.rng_states]) if events_on else traj.rng_states,
+                             np.concatenate([traj.spend, new.spend]))
+        self.put(key, new)
+        return new, status
+
+
+# Process-wide instance shared by every app session
+TRAJECTORIES = TrajectoryCache(max_mb=float(os.environ.get("CLINICSIM_TRAJ_CACHE_MB", 256)))
@@ -0,0 +1,138 @@
+# clinicsim/tuning.py — closed-form, memoized stability tuning
+#
+# auto_stability_tune (model.py) steps toward its thresholds: up to 12 rounds of
+# E_MAX ×1.25 and floor +5 for employed/health_index, then up to 8 rounds of
+# E_MAX ×1.15 for no_doctor/diabetes/high_bp. Every round re-evaluates
+#
+#   gain(k) = E0 · r^k · (1 - exp(-pc(k) / PC50)),   pc(k) = max(floor(k), budget·share / mean_pop)
+#
+# so the number of rounds can be solved directly:
+#   • floor fixed (second phase): k = ceil(log((thr - base) / gain0) / log r), clipped
+#   • floor moving (first phase): first k in 0..11 whose closed-form gain(k) passes
+#
+# Results are memoized per (baseline key, mean population, budget, normalized
+# splits) in a process-wide LRU, and slope medians per baseline key, so a rerun
+# with unchanged inputs is one dict lookup.
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from .model import INDICATORS, E_MAX_BASE, PC50_BASE, slope_medians
+from .profiling import profiled
+
+FLOOR_START, FLOOR_STEP, FLOOR_CAP = 30.0, 5.0, 120.0
+KEY_TARGETS = [("employed", "jobs"), ("health_index", "clinics")]        # net >= +0.002, up to 12 rounds ×1.25
+SIDE_TARGETS = [("no_doctor", "clinics"), ("diabetes", "campaigns"), ("high_bp", "campaigns")]  # >= 0.001, 8 × 1.15
+GOOD_DIR = {m: (1 if s > 0 else -1) for m, _, s in INDICATORS}
+
+_TUNED = OrderedDict()   # (baseline key, mean_pop, budget, splits) -> (floor_pc, E_MAX, PC50, diag)
+_MEDIANS = OrderedDict() # baseline key -> slope medians
+_CACHE_LOCK = threading.Lock()
+CACHE_STATS = {"hits": 0, "misses": 0}
+
+
+# ---------------- Solve ----------------
+def _sat(pc, pc50):
+    return 1.0 - math.exp(-pc / pc50)
+
+@profiled()
+def stability_tune_solve(med, mean_pop, city_budget, splits):
+    """Closed-form equivalent of auto_stability_tune; returns (floor_pc, E_MAX, PC50, diag)."""
+    t0 = time.perf_counter()
+    E_MAX = {p: E_MAX_BASE[p].copy() for p in E_MAX_BASE}
+    PC50 = PC50_BASE.copy()
+    total = sum(splits.values()) or 1.0
+    share = {k: v / total for k, v in splits.items()}
+    pc_budget = {p: city_budget * share[p] / max(1.0, mean_pop) for p in share}
+    floor_pc = FLOOR_START
+    steps, required = {}, {}
+
+    # Phase 1: lever and floor move together; gain(k) is closed-form, take the first k that passes
+    for metric, pol in KEY_TARGETS:
+        e0, base = E_MAX[pol].get(metric, 0.0), med.get(metric, 0.0)
+        floor_k = lambda k: min(FLOOR_CAP, floor_pc + FLOOR_STEP * k)
+        n = next((k for k in range(12)
+                  if base + e0 * 1.25**k * _sat(max(floor_k(k), pc_budget[pol]), PC50[pol]) >= 0.002), 12)
+        E_MAX[pol][metric] = e0 * 1.25**n
+        floor_pc = floor_k(n)
+        steps[metric] = n
+
+    # Phase 2: floor is fixed, so the round count is a logarithm
+    for metric, pol in SIDE_TARGETS:
+        e0, g = E_MAX[pol].get(metric, 0.0), GOOD_DIR[metric]
+        base = med.get(metric, 0.0) * g
+        gain0 = e0 * (_sat(max(floor_pc, pc_budget[pol]), PC50[pol])) * g
+        need = 0.001 - base
+        if base + gain0 >= 0.001: n = 0
+        elif gain0 <= 0: n = 8
+        else:
+            n = min(8, max(1, math.ceil(math.log(need / gain0) / math.log(1.15))))
+            # guard the ceil against rounding at exact boundaries
+            while n > 0 and base + gain0 * 1.15**(n - 1) >= 0.001: n -= 1
+            while n < 8 and base + gain0 * 1.15**n < 0.001: n += 1
+        E_MAX[pol][metric] = e0 * 1.15**n
+        steps[metric] = n
+        required[metric] = need / gain0 if gain0 > 0 else math.inf
+
+    for metric, pol in KEY_TARGETS:
+        gain1 = E_MAX_BASE[pol][metric] * (_sat(max(floor_pc, pc_budget[pol]), PC50[pol]))
+        required[metric] = (0.002 - med.get(metric, 0.0)) / gain1 if gain1 > 0 else math.inf
+
+    diag = {"floor_pc": floor_pc, "steps": steps,
+            "scale": {m: E_MAX[p][m] / E_MAX_BASE[p][m] for m, p in KEY_TARGETS + SIDE_TARGETS},
+            "required_scale": required,          # continuous E_MAX multiple that just meets each threshold
+            "solve_ms": 1000 * (time.perf_counter() - t0)}
+    return floor_pc, E_MAX, PC50, diag
+
+
+# ---------------- Cache ----------------
+def baseline_medians(hist_df, baseline_key=None, maxsize=16):
+    """slope_medians, computed once per baseline key (last `maxsize` baselines kept)."""
+    if baseline_key is None:
+        return slope_medians(hist_df)
+    with _CACHE_LOCK:
+        med = _MEDIANS.get(baseline_key)
+        if med is not None:
+            _MEDIANS.move_to_end(baseline_key)
+            return med
+    med = slope_medians(hist_df)
+    with _CACHE_LOCK:
+        _MEDIANS[baseline_key] = med
+        while len(_MEDIANS) > maxsize: _MEDIANS.popitem(last=False)
+    return med
+
+def baseline_hash(hist_df):
+    """Content key for frames that did not come through the ingest cache."""
+    import pandas as pd
+    cols = [f"{m}_slope" for m, _, _ in INDICATORS if f"{m}_slope" in hist_df.columns]
+    return "frame-" + str(int(pd.util.hash_pandas_object(hist_df[cols], index=False).sum()))
+
+@profiled()
+def tuned_params(hist_df, city_budget, splits, mean_pop, baseline_key=None, maxsize=256):
+    """Memoized stability_tune_solve; diag["cache"] says whether this call was a hit.
+
+    The returned E_MAX / PC50 dicts are shared with the cache: treat them as read-only.
+    """
+    if baseline_key is None:
+        baseline_key = baseline_hash(hist_df)
+    total = sum(splits.values()) or 1.0
+    norm = tuple(sorted((k, round(100.0 * v / total, 9)) for k, v in splits.items()))
+    key = (baseline_key, round(float(mean_pop), 6), float(city_budget), norm)
+    with _CACHE_LOCK:
+        hit = _TUNED.get(key)
+        if hit is not None:
+            CACHE_STATS["hits"] += 1
+            _TUNED.move_to_end(key)
+        else:
+            CACHE_STATS["misses"] += 1
+    if hit is not None:
+        floor_pc, E_MAX, PC50, diag = hit
+        return floor_pc, E_MAX, PC50, dict(diag, cache="hit")
+    med = baseline_medians(hist_df, baseline_key)
+    floor_pc, E_MAX, PC50, diag = stability_tune_solve(med, mean_pop, city_budget, splits)
+    with _CACHE_LOCK:
+        _TUNED[key] = (floor_pc, E_MAX, PC50, diag)
+        while len(_TUNED) > maxsize: _TUNED.popitem(last=False)
+    return floor_pc, E_MAX, PC50, dict(diag, cache="miss")
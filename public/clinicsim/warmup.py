@@ -0,0 +1,247 @@
+# clinicsim/warmup.py — background warm-up of the default baseline and scenario
+#
+# A cold app run used to block on the whole pipeline before anything rendered:
+# CSV parse, load_hist, imputation, slope normalization, state0, stability
+# tuning. WARMUP runs these steps once per process on a background thread:
+#
+#   index → hist → baseline (state0 + slope matrix) → tune → default scenario
+#   → backtest panel (when the historical file exists)
+#
+# The results go into the process-wide caches the app already reads
+# (ingest memory tier, tuned_params memo, TRAJECTORIES, shared_baseline), so
+# every session that arrives later finds them warm. A session that arrives
+# while the warm-up runs renders its page shell and controls, then waits for
+# the steps the page needs (through "tune") instead of starting its own copy
+# of the pipeline. The ingest
+# loaders and TrajectoryCache.run hold per-key build locks, so a load that
+# does start during the warm-up waits for the running build.
+#
+# Streamlit has no server-start hook, so the first script run in a process
+# calls WARMUP.start() (CLINICSIM_WARMUP=0 turns it off). `python -m clinicsim
+# warmup` runs the same steps in the foreground, which writes the ingest
+# sidecars; run it before `streamlit run` and the warm-up starts from them.
+#
+# SESSIONS keeps one record per app session: time to first interactive (the
+# controls are on the page), time to ready (the baseline is loaded) and
+# approx_nbytes of its session state, not counting objects shared through
+# the caches.
+
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+
+import numpy as np
+
+from .engine import StateArrays, StateTable, slope_matrix
+
+STEPS = ("index", "hist", "baseline", "tune", "scenario", "panel")
+STEP_LABELS = {"index": "Loading equity index", "hist": "Preparing historical baseline",
+               "baseline": "Building initial state", "tune": "Tuning stability preset",
+               "scenario": "Simulating the default scenario", "panel": "Preparing the backtest panel"}
+
+
+# ---------------- Shared baseline ----------------
+@dataclass
+class Baseline:
+    arr: StateArrays         # read-only views of table's arrays
+    slope_mat: np.ndarray    # (U, K)
+    table: StateTable        # what a new session starts from (no copy)
+
+_BASELINES = OrderedDict()   # (id(hist_df), start_year) -> (hist_df, Baseline)
+_BASELINE_LOCK = threading.Lock()
+
+def shared_baseline(hist_df, start_year, maxsize=8):
+    """baseline_state + slope_matrix as a read-only StateTable, built once per (frame, start_year) for all sessions."""
+    from .scenarios import baseline_state
+    k = (id(hist_df), int(start_year))
+    with _BASELINE_LOCK:
+        hit = _BASELINES.get(k)
+        if hit is not None and hit[0] is hist_df:
+            _BASELINES.move_to_end(k)
+            return hit[1]
+        table = StateTable.from_arrays(baseline_state(hist_df, int(start_year)))
+        base = Baseline(table.to_arrays(), slope_matrix(hist_df, table.zips), table)
+        _BASELINES[k] = (hist_df, base)
+        while len(_BASELINES) > maxsize: _BASELINES.popitem(last=False)
+    return base
+
+
+# ---------------- Warm-up ----------------
+class _Stopped(Exception):
+    pass
+
+def warm_default(idx_path, hist_path, start_year=2025, spec=None, on_step=None):
+    """Run the app's default pipeline into the process-wide caches; returns {step: seconds}.
+
+    on_step(name) is called before each step; returning False stops there.
+    """
+    from .ingest import load_index_cached, load_hist_cached, synth_hist_cached, source_key, frame_key
+    from .model import E_MAX_BASE, PC50_BASE
+    from .scenarios import DEFAULTS
+    from .trajcache import TRAJECTORIES, trajectory_key
+    from .tuning import tuned_params
+    spec = {**DEFAULTS, **(spec or {})}
+    times, ctx = {}, {}
+
+    def step(name, fn):
+        if on_step and on_step(name) is False:
+            raise _Stopped(name)
+        t0 = time.perf_counter()
+        ctx[name] = fn()
+        times[name] = time.perf_counter() - t0
+
+    step("index", lambda: load_index_cached(idx_path))
+    step("hist", lambda: load_hist_cached(hist_path) if hist_path and hist_path.exists() else
+         synth_hist_cached(ctx["index"], source_key(idx_path), start_year))
+    hist = ctx["hist"]
+    step("baseline", lambda: shared_baseline(hist, start_year))
+    base = ctx["baseline"]
+    pop = base.arr.population
+    step("tune", lambda: tuned_params(hist, spec["city_budget"], spec["splits"],
+                                      float(pop.mean()) if len(pop) else 20000.0, baseline_key=frame_key(hist))
+         if spec["stability"] else (25.0, E_MAX_BASE, PC50_BASE, {}))
+    floor_pc, E_MAX, PC50, _ = ctx["tune"]
+    key = trajectory_key(frame_key(hist), start_year, spec["city_budget"], spec["splits"], spec["eff_mult"],
+                         spec["events"], spec["seed"], spec["stability"], spec["rule"])
+    step("scenario", lambda: TRAJECTORIES.run(key, int(spec["years"]), base.arr, base.slope_mat, start_year,
+                                              spec["city_budget"], spec["splits"], floor_pc, E_MAX, PC50,
+                                              spec["events"], spec["eff_mult"], int(spec["seed"]), spec["rule"]))
+    if hist_path and hist_path.exists():
+        from .backtest import cached_cube
+        from .ingest import load_panel_cached
+        step("panel", lambda: cached_cube(load_panel_cached(hist_path)))
+    return times
+
+
+class Warmup:
+    """warm_default on a background thread, started once per process; sessions poll progress() / wait()."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._finished = False
+        self.step = None
+        self.times = {}
+        self.error = None
+        self.started = self.finished = None
+
+    def start(self, idx_path, hist_path, start_year=2025, spec=None):
+        """Start the warm-up unless it already ran or is running in this process."""
+        with self._lock:
+            if self._thread is None:
+                self.started = time.perf_counter()
+                self._thread = threading.Thread(target=self._run, args=(idx_path, hist_path, start_year, spec),
+                                                name="clinicsim-warmup")
+                self._thread.start()
+        return self
+
+    def _run(self, idx_path, hist_path, start_year, spec):
+        try:
+            self.times = warm_default(idx_path, hist_path, start_year, spec, on_step=self._on_step)
+        except _Stopped:
+            pass
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"     # sessions fall back to loading inline
+        finally:
+            with self._cond:
+                self.step, self.finished, self._finished = None, time.perf_counter(), True
+                self._cond.notify_all()
+
+    def _on_step(self, name):
+        with self._cond:
+            self.step = name
+            self._cond.notify_all()
+        # Not a daemon thread: a daemon stopped mid-step can hang interpreter exit, so on
+        # shutdown (the main thread has ended) the warm-up finishes its step and returns
+        return threading.main_thread().is_alive()
+
+    @property
+    def ready(self):
+        return self._finished
+
+    def done(self, step=None):
+        """True once `step` (default: every step) has finished, or the warm-up has stopped."""
+        if self._finished:
+            return True
+        cur = self.step
+        return step is not None and cur in STEPS and STEPS.index(cur) > STEPS.index(step)
+
+    def wait(self, step=None, timeout=None):
+        """Block until done(step) or `timeout` seconds; returns done(step)."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.done(step), timeout)
+
+    def progress(self):
+        """(fraction done, label) for a progress bar."""
+        if self.ready:
+            return 1.0, "Ready"
+        i = STEPS.index(self.step) if self.step in STEPS else 0
+        return i / len(STEPS), f"{STEP_LABELS.get(self.step, 'Starting')}…"
+
+    @property
+    def seconds(self):
+        return None if self.finished is None else self.finished - self.started
+
+# Process-wide instance shared by every app session
+WARMUP = Warmup()
+
+
+# ---------------- Session report ----------------
+SESSIONS = deque(maxlen=500)   # {"ttfi_s", "ready_s", "warm", "bytes"} per session, newest last
+
+SAMPLE_ITEMS = 512             # larger containers are sized from this many evenly spaced items
+
+def _sample(items):
+    """Evenly spaced items and the factor that scales their total to all of them (positions are
+    deterministic, so a dict copy samples the same entries as its original)."""
+    n = len(items)
+    if n <= SAMPLE_ITEMS:
+        return items, 1
+    return [items[i] for i in np.linspace(0, n - 1, SAMPLE_ITEMS).astype(int)], n / SAMPLE_ITEMS
+
+def approx_nbytes(obj, seen=None):
+    """Rough deep size: array/frame buffers plus Python containers (large ones sampled), each object counted once."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes if obj.base is None or id(obj.base) not in seen else 0
+    if hasattr(obj, "memory_usage") and hasattr(obj, "columns"):                # DataFrame
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        items, scale = _sample(list(obj.items()))
+        size += scale * sum(approx_nbytes(k, seen) + approx_nbytes(v, seen) for k, v in items)
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        items, scale = _sample(list(obj))
+        size += scale * sum(approx_nbytes(v, seen) for v in items)
+    elif hasattr(obj, "__dict__"):
+        size += approx_nbytes(vars(obj), seen)
+    elif hasattr(obj, "__slots__"):
+        size += sum(approx_nbytes(getattr(obj, s), seen) for s in obj.__slots__ if hasattr(obj, s))
+    return size
+
+def session_nbytes(state, shared=()):
+    """approx_nbytes of a session's state, leaving out `shared` objects (cache entries it only points to)."""
+    seen = set()
+    for o in shared: approx_nbytes(o, seen)                 # marks their contents (e.g. floats a dict copy reuses)
+    return sum(approx_nbytes(v, seen) for v in state.values())
+
+def session_summary():
+    """Counts and percentiles over SESSIONS."""
+    recs = list(SESSIONS)
+    if not recs:
+        return {}
+    ttfi = np.array([r["ttfi_s"] for r in recs])
+    ready = np.array([r["ready_s"] for r in recs if r.get("ready_s") is not None])
+    mem = np.array([r["bytes"] for r in recs if r.get("bytes") is not None])
+    out = {"sessions": len(recs), "ttfi_p50_s": float(np.median(ttfi)), "ttfi_p95_s": float(np.percentile(ttfi, 95))}
+    if len(ready):
+        out.update(ready_p50_s=float(np.median(ready)), ready_p95_s=float(np.percentile(ready, 95)))
+    if len(mem):
+        out.update(session_mb_mean=float(mem.mean() / 2**20), session_mb_max=float(mem.max() / 2**20))
+    return out
@@ -1,4 +1,3 @@
-
 # app.py — Health Policy Simulator (Stability-Tuned)
 # Goal: realistic, stable dynamics (no runaway drops), with unit-safe slopes and event toggle.
 #
@@ -18,582 +17,715 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-import random, hashlib, math
+import random, os, time
 from pathlib import Path
 
-st.set_page_config(page_title="Health Policy Simulator (Stable)", layout="wide")
+from clinicsim.model import (
+    INDICATORS, E_MAX_BASE, PC50_BASE,
+    simulate_one_year,
+)
+from clinicsim.engine import (
+    states_to_arrays, simulate_one_year_arrays, run_horizon,
+)
+from clinicsim.allocation import ALLOCATION_RULES, ALLOCATION_LABELS
+from clinicsim.data import compute_slopes
+from clinicsim.ingest import (
+    load_index_cached, load_hist_cached, load_panel_cached, synth_hist_cached, source_key, frame_key, timing_report,
+    LOAD_LOG, IMPUTE_REPORTS, CHUNK_STATS, CACHE_DIR,
+)
+from clinicsim.tuning import tuned_params
+from clinicsim.trajcache import TRAJECTORIES, trajectory_key
+from clinicsim.warmup import WARMUP, SESSIONS, shared_baseline, session_nbytes, session_summary
+from clinicsim.history import HistoryBuffer, FIELD_POS
+from clinicsim.layout import grid_layout
+from clinicsim.geo import TIERS as GEO_TIERS, tier_path as geo_tier_path, load_tier as load_geo_tier
+from clinicsim.ensemble import run_ensemble
+from clinicsim.optimize import optimize_splits
+from clinicsim.export import export_formats, export_file
+from clinicsim.sensitivity import SA_METHODS, FACTOR_GROUPS, sa_baseline, run_sensitivity
+from clinicsim.backtest import cached_cube, run_backtest, calibrate
+from clinicsim.profiling import PROFILER, stage, compare_profiles
 
-# ---------------- Indicators ----------------
-INDICATORS = [
-    ("diabetes",       "↓ better", -1.0),
-    ("disabled",       "↓ better", -1.0),
-    ("employed",       "↑ better", +1.0),
-    ("health_index",   "↑ better", +1.0),
-    ("high_bp",        "↓ better", -1.0),
-    ("kidney_disease", "↓ better", -1.0),
-    ("bipoc",          "equity",    0.0),
-    ("no_doctor",      "↓ better", -1.0),
-]
-
-POLICY_TARGETS = {
-    "clinics":   ["no_doctor", "health_index", "employed"],
-    "campaigns": ["diabetes", "high_bp", "kidney_disease"],
-    "jobs":      ["employed", "disabled"],
-    "equity":    ["no_doctor", "health_index"],
-}
-
-# Base max effects at full saturation (per year on 0–1 scale)
-E_MAX_BASE = {
-    "clinics":   {"no_doctor": -0.004, "health_index": +0.003, "employed": +0.0010},
-    "campaigns": {"diabetes": -0.0035, "high_bp": -0.0035, "kidney_disease": -0.0012},
-    "jobs":      {"employed": +0.0100, "disabled": -0.0010},
-    "equity":    {"no_doctor": -0.0025, "health_index": +0.0025},
-}
-PC50_BASE = {"clinics": 120.0, "campaigns": 140.0, "jobs": 160.0, "equity": 100.0}
-
-# Tight annual caps to prevent drastic swings
-ANNUAL_CAPS = {
-    "diabetes": 0.010, "high_bp": 0.010, "kidney_disease": 0.005,
-    "no_doctor": 0.015, "employed": 0.015, "disabled": 0.006,
-    "health_index": 0.015,
-}
-
-EVENT_TEMPLATES = [
-    ("Disease outbreak", {"diabetes": +0.0015, "high_bp": +0.0020, "health_index": -0.0020}),
-    ("Clinic closure",   {"no_doctor": +0.0020, "health_index": -0.0010}),
-    ("Natural disaster", {"employed": -0.0040, "disabled": +0.0010, "health_index": -0.0030}),
-    ("Funding cut",      {"employed": -0.0015, "no_doctor": +0.0010}),
-]
+st.set_page_config(page_title="Health Policy Simulator (Stable)", layout="wide")
 
 # ---------------- Utilities ----------------
-def norm_cols(df):
-    df = df.copy()
-    df.columns = [str(c).strip().lower().replace(" ", "_") for c in df.columns]
-    return df
-
-def clamp01(x):
-    try: x = float(x)
-    except: x = 0.0
-    return max(0.0, min(1.0, x))
-
-def diminishing_returns(pc, pc50):
-    pc = max(0.0, float(pc))
-    return 1.0 - math.exp(-pc / max(1e-9, pc50))
-
-def impute_groupwise(df, group_key, cols):
-    df = df.sort_values([group_key, "year"]).reset_index(drop=True).copy()
-    for c in cols:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors="coerce")
-            filled = (
-                df.groupby(group_key, sort=False)[c]
-                  .apply(lambda s: s.ffill().bfill())
-                  .reset_index(level=0, drop=True)
-            )
-            df[c] = filled
-            grp_mean = df.groupby(group_key, sort=False)[c].transform("mean")
-            df[c] = df[c].fillna(grp_mean)
-            df[c] = df[c].fillna(df[c].mean())
-            df[c] = df[c].fillna(0.0)
-    return df
-
-def ensure_indicator_columns(df):
-    defaults = {"diabetes":0.10,"disabled":0.08,"employed":0.60,"health_index":0.50,
-                "high_bp":0.25,"kidney_disease":0.03,"bipoc":0.50,"no_doctor":0.12,
-                "population":20000}
-    out = df.copy()
-    for name,_,_ in INDICATORS:
-        if name not in out.columns:
-            out[name] = defaults.get(name, 0.0)
-    if "population" not in out.columns:
-        out["population"] = defaults["population"]
-    return out
-
-# ---------------- Data loading ----------------
-def read_csv_flex(path_or_buf):
-    try:    return pd.read_csv(path_or_buf, encoding="utf-8-sig")
-    except: return pd.read_csv(path_or_buf, engine="python", sep=None)
-
-def load_index_2025(df):
-    df = norm_cols(df)
-    if "zip" not in df.columns or "equityscore" not in df.columns:
-        raise ValueError(f"Expected columns: ['zip','equityscore']. Found: {list(df.columns)}")
-    df["zip"] = df["zip"].astype(str).str.zfill(5)
-    df["equityscore"] = pd.to_numeric(df["equityscore"], errors="coerce")
-    df["equityscore"] = df["equityscore"].fillna(df["equityscore"].median()).fillna(0.0)
-    return df[["zip","equityscore"]].drop_duplicates("zip").reset_index(drop=True)
-
-def load_hist(df):
-    df = norm_cols(df)
-
-    slope_map = {
-        "diabetes_slope": "diabetes",
-        "disabled_slope": "disabled",
-        "hibp_slope": "high_bp",
-        "kidney_slope": "kidney_disease",
-        "healthindex_slope": "health_index",
-        "bipoc_slope": "bipoc",
-        "nodoc_slope": "no_doctor",
-        "employed_slope": "employed",
-    }
-    present_slopes = {v: k for k, v in slope_map.items() if k in df.columns}
-
-    # Normalize year columns for starting levels
-    for y in range(2014, 2026):
-        col = f"index_{y}".lower()
-        if col in df.columns:
-            df.rename(columns={col: f"health_index_{y}"}, inplace=True)
-    for y in [2017, 2019, 2021, 2022, 2023, 2024, 2025]:
-        c1 = f"high_blood_pressure_{y}".lower()
-        if c1 in df.columns:
-            df.rename(columns={c1: f"high_bp_{y}"}, inplace=True)
-    for y in [2018, 2019, 2020, 2021, 2022]:
-        c1 = f"kidney_disease_{y}".lower().replace("_"," ")
-        c2 = f"kidney_disease_{y}".lower()
-        if c1 in df.columns:
-            df.rename(columns={c1: c2}, inplace=True)
-    for c in list(df.columns):
-        if c.startswith("no doctor_"):
-            df.rename(columns={c: c.replace("no doctor_", "no_doctor_")}, inplace=True)
-
-    if "zip" not in df.columns:
-        raise ValueError("Historical CSV must include 'zip'.")
-    df["zip"] = df["zip"].astype(str).str.zfill(5)
-
-    def _pick_latest_year_col(prefix):
-        candidates = []
-        for c in df.columns:
-            if c.startswith(f"{prefix}_"):
-                tail = c.split(f"{prefix}_", 1)[1]
-                try:
-                    yr = int(tail.split("-")[0])
-                    candidates.append((yr, c))
-                except:
-                    pass
-        if not candidates: return None
-        return max(candidates)[1]
-
-    base_cols = {}
-    for m in ["diabetes","high_bp","kidney_disease","health_index"]:
-        c_latest = _pick_latest_year_col(m)
-        if c_latest: base_cols[m] = c_latest
-    nodoc_cols = [c for c in df.columns if c.startswith("no_doctor_")]
-    if nodoc_cols: base_cols["no_doctor"] = sorted(nodoc_cols)[-1]
-    bipoc_cols = [c for c in df.columns if c.startswith("bipoc_")]
-    if bipoc_cols: base_cols["bipoc"] = sorted(bipoc_cols)[-1]
-
-    out = pd.DataFrame({"zip": df["zip"]}).drop_duplicates().reset_index(drop=True)
-    for k, src in base_cols.items():
-        out[k] = pd.to_numeric(df[src], errors="coerce")
-
-    # Copy slopes
-    for metric, src in present_slopes.items():
-        out[f"{metric}_slope"] = pd.to_numeric(df[src], errors="coerce").fillna(0.0)
-
-    if "population" in df.columns:
-        out["population"] = pd.to_numeric(df["population"], errors="coerce")
-
-    # Scale to 0–1 if needed
-    if "health_index" in out.columns and pd.notna(out["health_index"]).any():
-        try:
-            if float(out["health_index"].max()) > 1.5:
-                out["health_index"] = out["health_index"] / 100.0
-        except: pass
-
-    out["year"] = 2024
-    return out
-
-# ---------------- Slope normalization & calibration ----------------
-def normalize_slopes(hist_df):
-    """Convert slopes to per-year fractions if they appear to be in % points or multi-year deltas."""
-    for m,_,_ in INDICATORS:
-        col = f"{m}_slope"
-        if col in hist_df.columns:
-            s = pd.to_numeric(hist_df[col], errors="coerce")
-            if s.isna().all(): 
-                hist_df[col] = 0.0
-                continue
-            med = float(s.abs().median())
-            # Heuristic conversions:
-            # If median |slope| > 0.05 (5pp), probably in 0–100 scale -> divide by 100
-            if med > 0.05:
-                s = s / 100.0
-            # If column name carries a 5-year window (common in rolling stats), divide by 5 (best-effort)
-            # (We can't infer reliably, so skip unless user asks)
-            hist_df[col] = s.fillna(0.0)
-    return hist_df
-
-def compute_slopes(hist_df):
-    slopes = {}
-    for z, g in hist_df.groupby("zip"):
-        row = g.iloc[0]
-        entry = {}
-        for m,_,_ in INDICATORS:
-            col = f"{m}_slope"
-            val = row[col] if col in g.columns else 0.0
-            entry[m] = float(val) if pd.notna(val) else 0.0
-        slopes[z] = entry
-    return slopes
-
-def need_weights(states):
-    needs = {}
-    for z, s in states.items():
-        n = (s["diabetes"]*0.25 + s["high_bp"]*0.25 + s["no_doctor"]*0.20 +
-             (1 - s["employed"])*0.15 + (1 - s["health_index"])*0.15)
-        needs[z] = n
-    tot = sum(needs.values()) or 1.0
-    for z in needs: needs[z] /= tot
-    return needs
-
-def percap_from_budget(city_budget, subpct, pop, weight, floor_pc):
-    pc = (city_budget * (subpct/100.0)) * weight / max(1.0, pop)
-    return max(pc, floor_pc)
-
-def synthesize_from_equity(eq_df, start_year):
-    base = eq_df.copy()
-    base["year"] = start_year - 1
-    eq_min, eq_max = base["equityscore"].min(), base["equityscore"].max()
-    span = (eq_max - eq_min) if (eq_max - eq_min) != 0 else 1.0
-    base["health_index"] = (base["equityscore"] - eq_min) / span
-    base["employed"] = base["health_index"].clip(0,1)*0.4 + 0.4
-    for c in ["diabetes","high_bp","no_doctor","kidney_disease","disabled"]:
-        base[c] = (1 - base["health_index"]).clip(0,1)*0.2 + 0.2
-    base["bipoc"] = 0.5
-    base["population"] = 20000
-    cols = ["zip","year","population"] + [n for n,_,_ in INDICATORS]
-    return base[cols]
-
-def auto_stability_tune(hist_df, city_budget, splits, states_preview):
-    """Choose floor and E_MAX scaling to avoid net declines for employed/health_index at defaults."""
-    E_MAX = {p: E_MAX_BASE[p].copy() for p in E_MAX_BASE}
-    PC50 = PC50_BASE.copy()
-    floor_pc = 30.0  # start reasonably
-
-    # Estimate typical per-capita
-    pops = [s.get("population", 20000) for s in states_preview.values()]
-    mean_pop = float(np.mean(pops)) if pops else 20000.0
-
-    # Normalize budgets
-    total = sum(splits.values()) or 1.0
-    splits = {k: 100.0*v/total for k,v in splits.items()}
-
-    # compute required pc to offset adverse median slopes for key metrics
-    slopes_city = {f"{m}_slope": pd.to_numeric(hist_df.get(f"{m}_slope", 0.0), errors="coerce").fillna(0.0) for m,_,_ in INDICATORS}
-    med = {m: float(slopes_city[f"{m}_slope"].median()) for m,_,_ in INDICATORS}
-
-    # Helper to compute expected delta at typical pc
-    def expected_delta(metric, policy):
-        sp = splits[policy] / 100.0
-        pc = max(floor_pc, (city_budget * sp) / max(1.0, mean_pop))
-        sat = 1.0 - math.exp(-pc / PC50[policy])
-        return E_MAX[policy].get(metric, 0.0) * sat
-
-    # Increase E_MAX or floor until employed & health_index net >= +0.002 (0.2pp) citywide
-    targets = [("employed","jobs"), ("health_index","clinics")]
-    for metric, pol in targets:
-        tries = 0
-        while tries < 12:
-            base = med.get(metric, 0.0)
-            gain = expected_delta(metric, pol)
-            if base + gain >= 0.002:
-                break
-            # scale up lever and floor slightly
-            E_MAX[pol][metric] *= 1.25
-            floor_pc = min(120.0, floor_pc + 5.0)
-            tries += 1
-
-    # Keep other metrics modestly improving if adverse slope
-    for metric, pol in [("no_doctor","clinics"), ("diabetes","campaigns"), ("high_bp","campaigns")]:
-        tries = 0
-        while tries < 8:
-            base = med.get(metric, 0.0)
-            desired_sign = [x for x in INDICATORS if x[0]==metric][0][2]
-            # We want delta to be in "good" direction by at least 0.001
-            good_dir = +1 if desired_sign>0 else -1
-            gain = expected_delta(metric, pol) * good_dir
-            base_dir = base * good_dir
-            if (base_dir + gain) >= 0.001:
-                break
-            E_MAX[pol][metric] *= 1.15
-            tries += 1
-
-    return floor_pc, E_MAX, PC50
-
-# ---------------- Simulation ----------------
-def simulate_one_year(year, states, slopes, city_budget, splits, floor_pc, E_MAX, PC50, events_on, eff_mult, rng):
-    total = sum(splits.values()) or 1.0
-    splits = {k: 100.0*v/total for k,v in splits.items()}
-    weights = need_weights(states)
-
-    # Events: off by default for stability
-    event_rates = {"Disease outbreak":0.04,"Clinic closure":0.03,"Natural disaster":0.02,"Funding cut":0.03}
-    events_by_zip = {z: [] for z in states}
-    if events_on:
-        for z in states:
-            for name, eff in EVENT_TEMPLATES:
-                if rng.random() < event_rates[name]:
-                    events_by_zip[z].append((name, eff))
-
-    pc_alloc = {z: {p:0.0 for p in POLICY_TARGETS} for z in states}
-    for z, s in states.items():
-        pop = max(1, s.get("population", 20000))
-        w = weights[z]
-        for pol in POLICY_TARGETS:
-            pc_alloc[z][pol] = percap_from_budget(city_budget, splits[pol], pop, w, floor_pc)
-
-    new_states, rows = {}, []
-    for z, s in states.items():
-        cur = s.copy()
-        base_sl = slopes.get(z, {})
-        applied = {n: base_sl.get(n, 0.0) for n,_,_ in INDICATORS}
-
-        for pol, targets in POLICY_TARGETS.items():
-            pc = pc_alloc[z][pol]
-            sat = diminishing_returns(pc, PC50[pol])
-            for m in targets:
-                emax = E_MAX[pol].get(m, 0.0)
-                applied[m] = applied.get(m, 0.0) + eff_mult * emax * sat
-
-        for (_ename, effs) in events_by_zip[z]:
-            for k, v in effs.items():
-                applied[k] = applied.get(k, 0.0) + v
-
-        # Apply deltas with caps and a non-worsening bias for key metrics
-        for m,_,_ in INDICATORS:
-            v_now = cur.get(m, 0.5)
-            delta = applied.get(m, 0.0)
-            cap = ANNUAL_CAPS.get(m, 0.02)
-            delta = float(np.clip(delta, -cap, cap))
-
-            # Non-worsening bias for 'employed' and 'health_index' under Stability preset:
-            # if delta is slightly negative (>-0.002), clip to 0
-            if m in ("employed","health_index") and delta < 0 and delta > -0.002:
-                delta = 0.0
-
-            v_next = clamp01(v_now + delta)
-            cur[m] = v_next
-
-        pop = cur.get("population", 20000)
-        pop = max(100, pop * (1.0 + 0.002*(cur["employed"]-0.6)))
-        cur["population"] = pop
-        new_states[z] = cur
-
-        rec = {"year": year, "zip": z, "population": pop, "events": ", ".join([e[0] for e in events_by_zip[z]])}
-        for m,_,_ in INDICATORS: rec[m] = cur[m]
-        for pol in POLICY_TARGETS: rec[f"pc_{pol}"] = pc_alloc[z][pol]
-        rows.append(rec)
-
-    df_year = pd.DataFrame(rows)
-    score = compute_score(df_year)
-    return new_states, df_year, score
-
-def compute_score(df_year):
-    def inv_mean(c): return max(0.0, min(1.0, 1 - df_year[c].mean()))
-    def pos_mean(c): return max(0.0, min(1.0, df_year[c].mean()))
-    disp = 0.0
-    for c in ["no_doctor","health_index","employed","diabetes","high_bp","kidney_disease"]:
-        if c in df_year.columns:
-            disp += df_year[c].std()
-    disp /= 6.0
-    equity = max(0.0, min(1.0, 1 - 2.0*disp))
-    comp = (0.18*pos_mean("employed") + 0.18*pos_mean("health_index") +
-            0.18*inv_mean("no_doctor") + 0.18*inv_mean("diabetes") +
-            0.14*inv_mean("high_bp")   + 0.04*inv_mean("kidney_disease") +
-            0.10*equity)
-    return round(100*comp, 1)
+def rgba(hex_color, alpha):
+    h = hex_color.lstrip("#")
+    return f"rgba({int(h[0:2],16)},{int(h[2:4],16)},{int(h[4:6],16)},{alpha})"
+
+def add_fan(fig, x, lo, mid, hi, name, color):
+    """P5–P95 band plus a dashed P50 line for one series."""
+    fig.add_trace(go.Scatter(x=x, y=hi, mode="lines", line=dict(width=0), legendgroup=name,
+                             showlegend=False, hoverinfo="skip"))
+    fig.add_trace(go.Scatter(x=x, y=lo, mode="lines", line=dict(width=0), fill="tonexty",
+                             fillcolor=rgba(color, 0.18), legendgroup=name, showlegend=False, hoverinfo="skip"))
+    fig.add_trace(go.Scatter(x=x, y=mid, mode="lines", line=dict(color=color, dash="dash"),
+                             legendgroup=name, name=f"{name} P50"))
+
+GRID_HOVER = ["diabetes", "high_bp", "no_doctor", "health_index", "employed"]
+
+def grid_figure(layout):
+    """Tile map with one square per ZIP at its layout cell; years only swap the marker arrays."""
+    hover = "<b>%{text}</b><br>risk %{marker.color:.3f}<br>population %{marker.size:,.0f}<br>" + \
+            "<br>".join(f"{c} %{{customdata[{i}]:.3f}}" for i, c in enumerate(GRID_HOVER)) + "<extra></extra>"
+    fig = go.Figure(go.Scatter(
+        x=layout.x, y=layout.y, text=layout.zips, mode="markers", hovertemplate=hover,
+        marker=dict(symbol="square", line=dict(width=0), sizemode="area", cmin=0, cmax=1,
+                    colorscale="RdYlGn_r", colorbar=dict(title="Risk"))))
+    fig.update_layout(height=520, xaxis_visible=False, yaxis_visible=False, margin=dict(l=10, r=10, t=10, b=10))
+    fig.update_yaxes(autorange="reversed", scaleanchor="x")
+    return fig
+
+def risk_of(values):
+    """(U, K) values in INDICATORS order -> (U,) risk in [0, 1]."""
+    v = {n: values[:, i] for i, (n,_,_) in enumerate(INDICATORS)}
+    return (v["diabetes"] + v["high_bp"] + v["no_doctor"] + (1 - v["health_index"])) / 4.0
+
+def update_grid_figure(fig, values, population):
+    """values (U, K) in INDICATORS order, population (U,) -> recolor/resize the cached figure in place."""
+    v = {n: values[:, i] for i, (n,_,_) in enumerate(INDICATORS)}
+    fig.update_traces(marker_color=risk_of(values), marker_size=population,
+                      marker_sizeref=2.0 * max(float(population.max()), 1.0) / 20**2,   # px.scatter size_max=20
+                      customdata=np.column_stack([v[c] for c in GRID_HOVER]))
+    return fig
+
+def choropleth_figure(geojson, zips):
+    """ZCTA choropleth over one simplified geometry tier; years only swap z / customdata."""
+    pts = np.array([p for f in geojson["features"] for poly in
+                    ([f["geometry"]["coordinates"]] if f["geometry"]["type"] == "Polygon" else f["geometry"]["coordinates"])
+                    for p in poly[0]])
+    hover = "<b>%{location}</b><br>risk %{z:.3f}<br>" + \
+            "<br>".join(f"{c} %{{customdata[{i}]:.3f}}" for i, c in enumerate(GRID_HOVER)) + "<extra></extra>"
+    fig = go.Figure(go.Choroplethmap(geojson=geojson, locations=list(zips), featureidkey="id", zmin=0, zmax=1,
+                                     colorscale="RdYlGn_r", marker_line_width=0.3, hovertemplate=hover,
+                                     colorbar=dict(title="Risk")))
+    fig.update_layout(height=520, margin=dict(l=0, r=0, t=0, b=0),
+                      map=dict(style="carto-positron", zoom=6,
+                               center=dict(lon=float(pts[:, 0].mean()), lat=float(pts[:, 1].mean()))))
+    return fig
+
+def update_choropleth(fig, values):
+    v = {n: values[:, i] for i, (n,_,_) in enumerate(INDICATORS)}
+    fig.update_traces(z=risk_of(values), customdata=np.column_stack([v[c] for c in GRID_HOVER]))
+    return fig
+
+# The Performance panel's buttons flip the process-wide profiler once (callbacks run before the rerun)
+def toggle_profiling():
+    PROFILER.enabled = not PROFILER.enabled
+    if not PROFILER.enabled: PROFILER.set_memory(False)
+
+def toggle_alloc_tracking():
+    PROFILER.set_memory(not PROFILER.memory)
+
+def toggle_traj_disk():
+    TRAJECTORIES.disk_dir = None if TRAJECTORIES.disk_dir is not None else CACHE_DIR / "trajectories"
 
 # ---------------- UI ----------------
-st.title("🏙️ Health Policy Simulator — Stability-Tuned")
-st.caption("Non-runaway dynamics, unit-safe slopes, events off by default, and stability preset to avoid 'everything drops'.")
-
-cwd = Path(__file__).resolve().parent
-idx_path = cwd / "index_2025_predictions.csv"
-hist_path = cwd / "combined_all_zip_data.csv"
-
-st.sidebar.header("Data")
-index_df = None
-if idx_path.exists():
-    try: index_df = load_index_2025(read_csv_flex(idx_path))
-    except Exception as e: st.sidebar.error(f"Failed equity load: {e}")
-if index_df is None:
-    up = st.sidebar.file_uploader("Upload index_2025_predictions.csv (zip,equityscore)", type=["csv"])
-    if up is not None:
-        try:
-            index_df = load_index_2025(read_csv_flex(up))
-            st.sidebar.success(f"Loaded equity: {len(index_df)} ZIPs")
-        except Exception as e:
-            st.sidebar.error(f"Upload parse error: {e}")
-if index_df is None:
-    st.error("Missing required equity file.")
-    st.stop()
-
-hist_df = None
-if hist_path.exists():
-    try: hist_df = load_hist(read_csv_flex(hist_path))
-    except Exception as e: st.sidebar.warning(f"Historical auto-load warning: {e}")
-if hist_df is None:
-    up2 = st.sidebar.file_uploader("Upload combined_all_zip_data.csv (optional)", type=["csv"])
-    if up2 is not None:
-        try:
-            hist_df = load_hist(read_csv_flex(up2))
-            st.sidebar.success(f"Loaded historical: {hist_df.shape[0]} rows")
-        except Exception as e:
-            st.sidebar.warning(f"Historical upload warning: {e}")
-
-# Build baseline
-start_year = st.sidebar.number_input("Start year", min_value=2025, max_value=2100, value=2025, step=1)
-if hist_df is None or hist_df.empty:
-    hist_df = synthesize_from_equity(index_df, start_year)
-hist_df = ensure_indicator_columns(hist_df)
-hist_df = impute_groupwise(hist_df, "zip", [n for n,_,_ in INDICATORS] + ["population"])
-hist_df = normalize_slopes(hist_df)
-
-zips = sorted(hist_df["zip"].unique().tolist())
-state0 = {}
-for z in zips:
-    g = hist_df[hist_df["zip"] == z]
-    row = g[g["year"] == (start_year-1)]
-    if row.empty: row = g.tail(1)
-    row = row.iloc[0]
-    state = {n: clamp01(row.get(n, 0.5)) for n,_,_ in INDICATORS}
-    state["population"] = max(100, float(row.get("population", 20000)) or 20000)
-    state0[z] = state
-
-st.sidebar.header("Budget & Controls")
-years = st.sidebar.number_input("Years", min_value=1, max_value=40, value=10, step=1)
-city_budget = st.sidebar.number_input("Annual city budget (USD)", min_value=5_000_000, max_value=50_000_000_000, value=30_000_000, step=1_000_000)
-sp = {
-    "clinics":   st.sidebar.slider("Clinics / Access", 0, 100, 25),
-    "campaigns": st.sidebar.slider("Public Health Campaigns", 0, 100, 35),
-    "jobs":      st.sidebar.slider("Job Programs", 0, 100, 30),
-    "equity":    st.sidebar.slider("Education & Equity", 0, 100, 10),
-}
-eff_mult = st.sidebar.slider("Policy effect multiplier", 0.7, 1.5, 1.0, 0.05)
-events_on = st.sidebar.checkbox("Enable random events", value=False)
-stability_preset = st.sidebar.checkbox("Stability preset (avoid net drops on key metrics)", value=True)
-
-# Auto tune for stability if requested
-if stability_preset:
-    floor_pc, E_MAX, PC50 = auto_stability_tune(hist_df, city_budget, sp, state0)
-else:
-    floor_pc, E_MAX, PC50 = 25.0, E_MAX_BASE, PC50_BASE
-
-# Session
-if "sim_init" not in st.session_state:
-    st.session_state.sim_init = False
-if st.sidebar.button("🔁 Reset simulation"):
-    for k in list(st.session_state.keys()):
-        if k.startswith("sim_") or k in ("history_rows","scores","sim_states"):
-            del st.session_state[k]
-    st.session_state.sim_init = False
-if not st.session_state.sim_init:
-    st.session_state.sim_states = {z: state0[z].copy() for z in zips}
-    st.session_state.history_rows = []
-    st.session_state.scores = []
-    st.session_state.sim_init = True
-
-# Top summary
-c1,c2,c3,c4 = st.columns(4)
-with c1: st.metric("ZIPs", len(zips))
-with c2: st.metric("Budget", f"${city_budget:,.0f}")
-with c3: st.metric("Per-capita floor", f"${floor_pc:,.0f}")
-with c4: st.metric("Events", "ON" if events_on else "OFF")
-
-run_btn = st.button("▶️ Run next year (stable)")
-rng = random.Random("stable-seed")
-
-if run_btn:
-    cur_year = (start_year + len(st.session_state.scores))
-    new_states, df_year, score = simulate_one_year(
-        year=cur_year,
-        states=st.session_state.sim_states,
-        slopes=compute_slopes(hist_df),
-        city_budget=city_budget,
-        splits=sp,
-        floor_pc=floor_pc,
-        E_MAX=E_MAX,
-        PC50=PC50,
-        events_on=events_on,
-        eff_mult=eff_mult,
-        rng=rng
-    )
-    st.session_state.sim_states = new_states
-    st.session_state.history_rows.append(df_year)
-    st.session_state.scores.append({"year": cur_year, "score": score})
-
-# Plots
-hist_all = pd.concat(st.session_state.history_rows, ignore_index=True) if st.session_state.history_rows else pd.DataFrame(columns=["year","zip"]+[n for n,_,_ in INDICATORS])
-st.subheader("Citywide Trends")
-if not hist_all.empty:
-    city_avg = hist_all.groupby("year").agg({n:"mean" for n,_,_ in INDICATORS}).reset_index()
-    fig = go.Figure()
-    for name,_,_ in INDICATORS:
-        fig.add_trace(go.Scatter(x=city_avg["year"], y=city_avg[name], mode="lines+markers", name=name))
-    fig.update_layout(height=360, xaxis_title="Year", yaxis_title="Value (0-1)")
-    st.plotly_chart(fig, use_container_width=True)
-else:
-    st.info("Run at least one year to see citywide trends.")
-
-scores_df = pd.DataFrame(st.session_state.scores)
-if not scores_df.empty:
-    fig2 = go.Figure()
-    fig2.add_trace(go.Scatter(x=scores_df["year"], y=scores_df["score"], mode="lines+markers", name="Score"))
-    fig2.update_layout(height=300, xaxis_title="Year", yaxis_title="Composite score (0–100)")
-    st.plotly_chart(fig2, use_container_width=True)
-
-# Grid map with year selector
-st.subheader("ZIP Grid Map (risk = red, improvement = green)")
-available_years = []
-if st.session_state.history_rows:
-    available_years = sorted({int(df["year"].iat[0]) for df in st.session_state.history_rows})
-else:
-    available_years = [start_year - 1]
-year_to_show = st.selectbox("Year to show", available_years, index=len(available_years)-1)
-
-if st.session_state.history_rows:
-    snap = pd.concat(st.session_state.history_rows, ignore_index=True)
-    snap = snap[snap["year"] == year_to_show].copy()
-    if snap.empty:
-        snap = st.session_state.history_rows[-1].copy()
-else:
-    rows = []
-    for z, s in st.session_state.sim_states.items():
-        rec = {"year": start_year-1, "zip": z}; rec.update(s); rows.append(rec)
-    snap = pd.DataFrame(rows)
-
-snap["risk"] = (snap["diabetes"] + snap["high_bp"] + snap["no_doctor"] + (1 - snap["health_index"])) / 4.0
-snap["x"], snap["y"] = zip(*[ (int(hashlib.md5(str(z).encode()).hexdigest(),16)%15, (int(hashlib.md5(str(z).encode()).hexdigest(),16)//15)%12) for z in snap["zip"] ])
-figm = px.scatter(snap, x="x", y="y", color="risk", size="population",
-                  hover_data=["zip","diabetes","high_bp","no_doctor","health_index","employed"],
-                  color_continuous_scale="RdYlGn_r")
-figm.update_coloraxes(cmin=0, cmax=1)
-figm.update_traces(marker=dict(symbol="square", line=dict(width=0)))
-figm.update_layout(height=520, xaxis_visible=False, yaxis_visible=False, coloraxis_colorbar=dict(title="Risk"))
-st.plotly_chart(figm, use_container_width=True)
-
-# Drilldown
-st.subheader("ZIP Drilldown")
-selected_zip = st.selectbox("Choose ZIP", zips)
-if selected_zip:
-    if st.session_state.history_rows:
-        zhist = hist_all[hist_all["zip"] == selected_zip].copy()
+rerun_span = stage("script rerun").start()
+script_t0 = time.perf_counter()
+try:
+    st.title("🏙️ Health Policy Simulator — Stability-Tuned")
+    st.caption("Non-runaway dynamics, unit-safe slopes, events off by default, and stability preset to avoid 'everything drops'.")
+
+    cwd = Path(__file__).resolve().parent
+    idx_path = cwd / "index_2025_predictions.csv"
+    hist_path = Path(os.environ.get("CLINICSIM_HIST") or cwd / "combined_all_zip_data.csv")
+
+    # The first run in this process starts preparing the default baseline and scenario on a background thread
+    if idx_path.exists() and os.environ.get("CLINICSIM_WARMUP", "1") != "0":
+        WARMUP.start(idx_path, hist_path)
+
+    st.sidebar.header("Data")
+    data_box = st.sidebar.container()      # filled by the loaders below, once the baseline is ready
+    start_year = st.sidebar.number_input("Start year", min_value=2025, max_value=2100, value=2025, step=1)
+
+    st.sidebar.header("Budget & Controls")
+    years = st.sidebar.number_input("Years", min_value=1, max_value=40, value=10, step=1)
+    city_budget = st.sidebar.number_input("Annual city budget (USD)", min_value=5_000_000, max_value=50_000_000_000, value=30_000_000, step=1_000_000)
+    sp = {
+        "clinics":   st.sidebar.slider("Clinics / Access", 0, 100, 25),
+        "campaigns": st.sidebar.slider("Public Health Campaigns", 0, 100, 35),
+        "jobs":      st.sidebar.slider("Job Programs", 0, 100, 30),
+        "equity":    st.sidebar.slider("Education & Equity", 0, 100, 10),
+    }
+    alloc_rule = st.sidebar.selectbox("Allocation rule", ALLOCATION_RULES, format_func=ALLOCATION_LABELS.get,
+                                      help="How each program's dollars are spread over ZIPs. Only the capped rule keeps "
+                                           "floor spending within the budget.")
+    eff_mult = st.sidebar.slider("Policy effect multiplier", 0.7, 1.5, 1.0, 0.05)
+    events_on = st.sidebar.checkbox("Enable random events", value=False)
+    sim_seed = st.sidebar.number_input("Event seed", min_value=0, max_value=2**31-1, value=0, step=1,
+                                       help="Seeds the event stream of a run from the baseline (takes effect after a reset).")
+    stability_preset = st.sidebar.checkbox("Stability preset (avoid net drops on key metrics)", value=True)
+    pop_weighted = st.sidebar.checkbox("Population-weighted citywide means", value=False,
+                                       help="Weight ZIPs by population in the trends chart and add a weighted score line.")
+    engine_mode = st.sidebar.radio("Engine", ["array", "dict"], horizontal=True,
+                                   help="array = vectorized NumPy engine; dict = reference per-ZIP loop (same results)")
+    if engine_mode == "dict" and alloc_rule != "proportional":
+        st.sidebar.caption("The dict engine only implements proportional allocation; runs use the array engine.")
+
+    st.sidebar.header("Ensemble (Monte Carlo)")
+    ens_reps = st.sidebar.number_input("Replicates", min_value=10, max_value=10_000, value=500, step=50)
+    ens_seed = st.sidebar.number_input("Ensemble seed", min_value=0, max_value=2**31-1, value=0, step=1)
+    ens_workers = st.sidebar.number_input("Worker processes", min_value=1, max_value=os.cpu_count() or 1, value=1, step=1,
+                                          help="Replicates are vectorized; extra processes split the replicate axis.")
+
+    with st.sidebar.expander("Budget-split optimizer"):
+        opt_step = st.select_slider("Split grid step (%)", options=[20, 10, 5], value=10)
+        opt_min_share = st.slider("Min share per program (%)", 0, 25, 0)
+        opt_equity_floor = st.slider("Equity floor (final-year equity term)", 0.0, 1.0, 0.0, 0.05)
+        opt_objective = st.radio("Objective", ["Final-year score", "Discounted score (3%/yr)"])
+        opt_budgets = st.checkbox("Also search budget (×0.5, ×1, ×2)", value=False)
+        opt_btn = st.button("🧮 Optimize split")
+
+    with st.sidebar.expander("Sensitivity analysis"):
+        sa_method = st.radio("Method", SA_METHODS, index=1, horizontal=True,
+                             help="morris: elementary effects (mu*, sigma); sobol: first-order and total variance shares.")
+        sa_samples = st.select_slider("Model runs", options=[1_000, 2_000, 5_000, 10_000, 20_000], value=5_000)
+        sa_labels = {"emax": "E_MAX", "pc50": "PC50", "cap": "Annual caps", "event": "Event rates"}
+        sa_ranges = {g: st.slider(f"{sa_labels[g]} (× current value)", 0.1, 2.0, (0.5, 1.5), 0.05, key=f"sa_range_{g}")
+                     for g in FACTOR_GROUPS}
+        sa_events = st.checkbox("Random events (shared draws)", value=True,
+                                help="Every sample sees the same uniform draws, so event-rate factors only move thresholds.")
+        sa_workers = st.number_input("Worker processes", min_value=1, max_value=os.cpu_count() or 1, value=1, step=1,
+                                     key="sa_workers")
+        sa_btn = st.button("🎯 Run sensitivity")
+
+    # The page shell and controls are up (time to first interactive). Wait for the warm-up here,
+    # where widgets stay live, instead of each session running its own copy of the pipeline.
+    perf = st.session_state.setdefault("session_perf", {"ttfi_s": time.perf_counter() - script_t0,
+                                                        "warm": WARMUP.ready})
+    if WARMUP.started is not None and not WARMUP.done("tune"):
+        bar = st.progress(0.0, text="Preparing baseline…")
+        while not WARMUP.wait("tune", timeout=0.1):
+            bar.progress(*WARMUP.progress())
+        bar.empty()
+
+    index_df, index_key = None, None
+    if idx_path.exists():
+        try: index_df, index_key = load_index_cached(idx_path), source_key(idx_path)
+        except Exception as e: data_box.error(f"Failed equity load: {e}")
+    if index_df is None:
+        up = data_box.file_uploader("Upload index_2025_predictions.csv (zip,equityscore)", type=["csv"])
+        if up is not None:
+            try:
+                index_df, index_key = load_index_cached(up), source_key(up)
+                data_box.success(f"Loaded equity: {len(index_df)} ZIPs")
+            except Exception as e:
+                data_box.error(f"Upload parse error: {e}")
+    if index_df is None:
+        st.error("Missing required equity file.")
+        st.stop()
+
+    # Historical baseline comes back already imputed and slope-normalized (cached by content)
+    hist_df, hist_src = None, None
+    if hist_path.exists():
+        try: hist_df, hist_src = load_hist_cached(hist_path), hist_path
+        except Exception as e: data_box.warning(f"Historical auto-load warning: {e}")
+    if hist_df is None:
+        up2 = data_box.file_uploader("Upload combined_all_zip_data.csv (optional)", type=["csv"])
+        if up2 is not None:
+            try:
+                hist_df, hist_src = load_hist_cached(up2), up2
+                data_box.success(f"Loaded historical: {hist_df.shape[0]} rows")
+            except Exception as e:
+                data_box.warning(f"Historical upload warning: {e}")
+
+    # Build baseline
+    if hist_df is None or hist_df.empty:
+        hist_df = synth_hist_cached(index_df, index_key, start_year)
+    with data_box.expander("Data load timing"):
+        for rec in LOAD_LOG[-2:]:
+            st.caption(f"{rec['what']}: {rec['tier']} in {1000*rec['seconds']:.1f} ms")
+            filled = {k: sum(v.values()) for k, v in IMPUTE_REPORTS.get(rec["key"], {}).items()}
+            if filled:
+                st.caption("imputed: " + ", ".join(f"{k} {n}" for k, n in filled.items()))
+            cs = CHUNK_STATS.get(rec["key"])
+            if cs:
+                peak = f", peak {cs['peak_mb']:.1f} MB" if cs.get("peak_mb") is not None else ""
+                st.caption(f"chunked read: {cs['rows']:,} rows in {cs['chunks']} chunks, "
+                           f"{cs['columns_read']}/{cs['columns_total']} columns{peak}")
+        if st.button("Measure cold vs warm load"):
+            rep = timing_report(hist_path) if hist_path.exists() else timing_report(idx_path, what="index")
+            st.caption(" · ".join(f"{k}: {1000*v:.1f} ms" for k, v in rep.items()))
+
+    # Initial state: one indexed selection (row for start_year-1, else each ZIP's latest row), shared by sessions
+    with stage("state0"):
+        base0 = shared_baseline(hist_df, start_year)
+        arr0, slope_mat0, table0 = base0.arr, base0.slope_mat, base0.table
+        zips, pop0 = arr0.zips, arr0.population
+    perf.setdefault("ready_s", time.perf_counter() - script_t0)
+
+    with st.sidebar.expander("Historical backtest"):
+        bt_cube = None
+        if hist_src is not None:      # waits on the build lock if the warm-up is preparing this panel
+            try: bt_cube, bt_default = cached_cube(load_panel_cached(hist_src))
+            except Exception as e: st.caption(f"Panel load failed: {e}")
+        if bt_cube is None or len(bt_cube.years) < 2:
+            st.caption("Needs the historical file (combined_all_zip_data.csv) with at least two observed years.")
+            bt_btn = False
+        else:
+            bt_years = [int(y) for y in bt_cube.years[:-1]]
+            bt_origins = st.multiselect("Origin years", bt_years, default=bt_default,
+                                        help="Each origin starts from the last observation at or before that year and "
+                                             "is scored against every later one.")
+            bt_slopes = st.radio("Slopes", ["fit", "file"], horizontal=True,
+                                 help="fit = OLS on the observations up to the origin (no look-ahead); "
+                                      "file = the slope columns of the historical file.")
+            bt_calibrate = st.checkbox("Calibrate slope scales and effect multiplier", value=True)
+            bt_btn = st.button("🕰️ Run backtest", disabled=not bt_origins)
+
+    # Auto tune for stability if requested (closed-form solve, memoized per baseline/budget/splits)
+    if stability_preset:
+        floor_pc, E_MAX, PC50, tune_diag = tuned_params(hist_df, city_budget, sp, float(pop0.mean()) if len(pop0) else 20000.0,
+                                                        baseline_key=frame_key(hist_df))
+        with st.sidebar.expander("Stability tuning"):
+            st.caption(f"floor ${tune_diag['floor_pc']:.0f}/person · solved in {tune_diag['solve_ms']:.2f} ms "
+                       f"({tune_diag['cache']})")
+            st.dataframe(pd.DataFrame({"rounds": tune_diag["steps"], "E_MAX scale": tune_diag["scale"],
+                                       "required scale": tune_diag["required_scale"]}).round(3),
+                         use_container_width=True)
     else:
-        zhist = pd.DataFrame([{"year": start_year-1, "zip": selected_zip, **st.session_state.sim_states[selected_zip]}])
-    cols = ["year"] + [n for n,_,_ in INDICATORS] + [c for c in zhist.columns if c.startswith("pc_")] + ["events"]
-    cols = [c for c in cols if c in zhist.columns]
-    st.dataframe(zhist[cols].sort_values("year"), hide_index=True)
-
-    if not zhist.empty:
-        figz = go.Figure()
-        for name,_,_ in INDICATORS:
-            figz.add_trace(go.Scatter(x=zhist["year"], y=zhist[name], mode="lines+markers", name=name))
-        figz.update_layout(height=360, xaxis_title="Year", yaxis_title="Value (0-1)")
-        st.plotly_chart(figz, use_container_width=True)
-
-# Export
-st.subheader("Export Results")
-if not hist_all.empty:
-    csv = hist_all.to_csv(index=False).encode("utf-8")
-    st.download_button("⬇️ Download (CSV)", data=csv, file_name="health_policy_simulation_results_stable.csv", mime="text/csv")
-else:
-    st.caption("Run at least one simulated year to enable export.")
+        floor_pc, E_MAX, PC50 = 25.0, E_MAX_BASE, PC50_BASE
+
+    # Session
+    if "sim_init" not in st.session_state:
+        st.session_state.sim_init = False
+    if st.sidebar.button("🔁 Reset simulation"):
+        for k in list(st.session_state.keys()):
+            if k.startswith("sim_") or k in ("history","scores","sim_states"):
+                del st.session_state[k]
+        st.session_state.sim_init = False
+    if not st.session_state.sim_init:
+        st.session_state.sim_states = table0      # shared read-only baseline; each run stores a new StateTable
+        st.session_state.history = HistoryBuffer(zips, population=pop0)
+        st.session_state.scores = []
+        st.session_state.sim_rng = random.Random(int(sim_seed))
+        st.session_state.sim_key = None      # trajectory key while every year so far used one setting, else "mixed"
+        st.session_state.sim_init = True
+
+    # Top summary
+    c1,c2,c3,c4 = st.columns(4)
+    with c1: st.metric("ZIPs", len(zips))
+    with c2: st.metric("Budget", f"${city_budget:,.0f}")
+    with c3: st.metric("Per-capita floor", f"${floor_pc:,.0f}")
+    with c4: st.metric("Events", "ON" if events_on else "OFF")
+
+    b1, b2, b3 = st.columns(3)
+    with b1: run_btn = st.button("▶️ Run next year (stable)")
+    with b2: horizon_btn = st.button(f"⏩ Run {int(years)} years")
+    with b3: ensemble_btn = st.button(f"🎲 Ensemble {int(years)} years × {int(ens_reps)} runs")
+    # Trajectory cache: a session that has only ever run one setting from state0 is a
+    # prefix of that setting's cached trajectory, so runs are lookups or extensions.
+    traj_key = trajectory_key(frame_key(hist_df), start_year, city_budget, sp, eff_mult, events_on, int(sim_seed),
+                              stability_preset, alloc_rule)
+    n_done = len(st.session_state.scores)
+    if n_done == 0:
+        st.session_state.sim_rng = random.Random(int(sim_seed))
+    rng = st.session_state.sim_rng
+    use_traj_cache = engine_mode == "array" and st.session_state.sim_key in (None, traj_key)
+
+    def advance_cached(n_add):
+        target = n_done + n_add
+        traj, status = TRAJECTORIES.run(traj_key, target, arr0, slope_mat0, start_year, city_budget, sp,
+                                        floor_pc, E_MAX, PC50, events_on, eff_mult, int(sim_seed), alloc_rule)
+        for i in range(n_done, target):
+            st.session_state.history.append_arrays(int(traj.years[i]), traj.values[i], traj.population[i],
+                                                   traj.pc[i], traj.events[i], traj.spend[i])
+            st.session_state.scores.append({"year": int(traj.years[i]), "score": traj.scores[i]})
+        st.session_state.sim_states = table0.replace(traj.state_at(target))
+        st.session_state.sim_rng = traj.rng_at(target)
+        st.session_state.sim_traj_status = status
+
+    if run_btn and use_traj_cache:
+        advance_cached(1)
+    elif run_btn:
+        cur_year = (start_year + len(st.session_state.scores))
+        if engine_mode == "array" or alloc_rule != "proportional":
+            new_arr, year_arr, score = simulate_one_year_arrays(
+                year=cur_year,
+                arr=st.session_state.sim_states.to_arrays(),
+                slope_mat=slope_mat0,
+                city_budget=city_budget,
+                splits=sp,
+                floor_pc=floor_pc,
+                E_MAX=E_MAX,
+                PC50=PC50,
+                events_on=events_on,
+                eff_mult=eff_mult,
+                rng=rng,
+                rule=alloc_rule,
+            )
+            st.session_state.sim_states = table0.replace(new_arr)
+            st.session_state.history.append_arrays(cur_year, year_arr.values, year_arr.population, year_arr.pc,
+                                                   year_arr.events, year_arr.spend)
+        else:
+            new_states, df_year, score = simulate_one_year(
+                year=cur_year,
+                states=st.session_state.sim_states.to_states(),
+                slopes=compute_slopes(hist_df),
+                city_budget=city_budget,
+                splits=sp,
+                floor_pc=floor_pc,
+                E_MAX=E_MAX,
+                PC50=PC50,
+                events_on=events_on,
+                eff_mult=eff_mult,
+                rng=rng
+            )
+            st.session_state.sim_states = table0.replace(states_to_arrays(new_states, zips))
+            st.session_state.history.append_frame(df_year)
+        st.session_state.scores.append({"year": cur_year, "score": score})
+
+    if horizon_btn and use_traj_cache:
+        advance_cached(int(years))
+    elif horizon_btn:
+        # One call for the whole horizon: slopes/tables resolved once, one long frame back
+        new_arr, df_run, run_scores = run_horizon(
+            arr=st.session_state.sim_states.to_arrays(),
+            slope_mat=slope_mat0,
+            years=int(years),
+            start_year=start_year + len(st.session_state.scores),
+            city_budget=city_budget,
+            splits=sp,
+            floor_pc=floor_pc,
+            E_MAX=E_MAX,
+            PC50=PC50,
+            events_on=events_on,
+            eff_mult=eff_mult,
+            rng=rng,
+            rule=alloc_rule,
+        )
+        st.session_state.sim_states = table0.replace(new_arr)
+        st.session_state.history.append_frame(df_run)
+        st.session_state.scores.extend(run_scores)
+    if run_btn or horizon_btn:
+        st.session_state.sim_key = traj_key if st.session_state.sim_key in (None, traj_key) else "mixed"
+        if not use_traj_cache: st.session_state.sim_traj_status = "not cached"
+
+    with st.sidebar.expander("Trajectory cache"):
+        tstats = TRAJECTORIES.stats
+        st.caption(f"hits {tstats['hits']} · extends {tstats['extends']} · misses {tstats['misses']} · "
+                   f"evictions {tstats['evictions']} · disk hits {tstats['disk_hits']}")
+        st.caption(f"{len(TRAJECTORIES)} trajectories, {TRAJECTORIES.bytes/2**20:,.1f} / "
+                   f"{TRAJECTORIES.max_bytes/2**20:,.0f} MB; last run: {st.session_state.get('sim_traj_status', '—')}")
+        st.caption(f"Disk tier is {'on' if TRAJECTORIES.disk_dir is not None else 'off'} for this server; "
+                   "the button switches it for every session.")
+        st.button("Keep trajectories in memory only" if TRAJECTORIES.disk_dir is not None
+                  else "Keep trajectories on disk", key="traj_disk_toggle", on_click=toggle_traj_disk)
+
+    if ensemble_btn:
+        # Replicates always draw random events; bands start after the current deterministic year
+        st.session_state.sim_ensemble = run_ensemble(
+            arr=st.session_state.sim_states.to_arrays(),
+            slope_mat=slope_mat0,
+            years=int(years),
+            start_year=start_year + len(st.session_state.scores),
+            city_budget=city_budget,
+            splits=sp,
+            floor_pc=floor_pc,
+            E_MAX=E_MAX,
+            PC50=PC50,
+            eff_mult=eff_mult,
+            replicates=int(ens_reps),
+            seed=int(ens_seed),
+            workers=int(ens_workers),
+            rule=alloc_rule,
+        )
+    ens = st.session_state.get("sim_ensemble")
+
+    if sa_btn:
+        # Factors scale the tables this run uses (tuned E_MAX / PC50 when the stability preset is on)
+        sa_base = sa_baseline(arr0, slope_mat0, int(years), city_budget, sp,
+                              floor_pc, E_MAX, PC50, eff_mult, events=sa_events, rule=alloc_rule)
+        with st.spinner(f"Running {sa_samples:,} samples…"):
+            st.session_state.sim_sa = run_sensitivity(sa_base, sa_method, sa_samples, ranges=sa_ranges,
+                                                      workers=int(sa_workers))
+
+    if bt_btn:
+        # Replays use this run's budget, splits and tables; events stay off
+        bt_args = (bt_cube, bt_origins, city_budget, sp, floor_pc, E_MAX, PC50)
+        with st.spinner("Replaying history…"):
+            st.session_state.sim_backtest = (
+                calibrate(*bt_args, rule=alloc_rule, slopes=bt_slopes) if bt_calibrate else
+                run_backtest(*bt_args, eff_mult=eff_mult, rule=alloc_rule, slopes=bt_slopes))
+
+    if opt_btn:
+        # Search from the baseline over the full horizon; memo persists across clicks with the same settings
+        discount = 0.03 if opt_objective.startswith("Discounted") else None
+        opt_memo_key = (frame_key(hist_df) or id(hist_df), start_year, int(years), stability_preset, discount,
+                        opt_equity_floor, alloc_rule)      # memo scores are only valid for one baseline
+        memos = st.session_state.setdefault("opt_memos", {})
+        st.session_state.sim_opt = optimize_splits(
+            hist_df, arr0, slope_mat0, int(years),
+            budgets=[city_budget * f for f in ((0.5, 1.0, 2.0) if opt_budgets else (1.0,))],
+            eff_mults=[eff_mult], step=float(opt_step),
+            min_share={p: float(opt_min_share) for p in sp}, equity_floor=opt_equity_floor or None,
+            stability=stability_preset, discount=discount, memo=memos.setdefault(opt_memo_key, {}), rule=alloc_rule,
+        )
+
+    # Plots: everything below reads views of the columnar history buffer
+    history = st.session_state.history
+    st.sidebar.caption(f"History buffer: {history.n} years × {len(history.zips)} ZIPs, "
+                       f"{history.used_bytes/1024:,.0f} KB used / {history.nbytes/1024:,.0f} KB allocated")
+    st.subheader("Citywide Trends")
+    palette = px.colors.qualitative.Plotly
+    if history.n or ens is not None:
+        span = stage("figure: trends").start()
+        fig = go.Figure()
+        if history.n:
+            city_avg = history.city_means(weighted=pop_weighted)
+            for i, (name,_,_) in enumerate(INDICATORS):
+                fig.add_trace(go.Scatter(x=history.years, y=city_avg[:, i], mode="lines+markers", name=name,
+                                         legendgroup=name, line=dict(color=palette[i % len(palette)])))
+        if ens is not None:
+            for i, (name,_,_) in enumerate(INDICATORS):
+                lo, mid, hi = (ens.city_bands[:, q, i] for q in range(3))
+                add_fan(fig, ens.years, lo, mid, hi, name, palette[i % len(palette)])
+            st.caption(f"Fan bands: P5–P95 across {ens.replicates} event replicates (seed {ens.seed}), dashed = P50.")
+        fig.update_layout(height=360, xaxis_title="Year", yaxis_title="Value (0-1)")
+        st.plotly_chart(fig, use_container_width=True)
+        span.stop()
+    else:
+        st.info("Run at least one year to see citywide trends.")
+
+    if history.n or ens is not None:
+        span = stage("figure: score").start()
+        fig2 = go.Figure()
+        if history.n:
+            fig2.add_trace(go.Scatter(x=history.years, y=history.scores(), mode="lines+markers", name="Score",
+                                      line=dict(color=palette[0])))
+            if pop_weighted:
+                fig2.add_trace(go.Scatter(x=history.years, y=history.scores(weighted=True), mode="lines+markers",
+                                          name="Score (population-weighted)", line=dict(color=palette[1])))
+        if ens is not None:
+            add_fan(fig2, ens.years, ens.score_bands[:, 0], ens.score_bands[:, 1], ens.score_bands[:, 2], "Score", palette[0])
+        fig2.update_layout(height=300, xaxis_title="Year", yaxis_title="Composite score (0–100)")
+        st.plotly_chart(fig2, use_container_width=True)
+        span.stop()
+
+    if history.n:
+        # Dollars actually allocated (floors included) against the current budget
+        span = stage("figure: spend").start()
+        spend = history.spend()
+        figb = go.Figure()
+        for p_i, pol in enumerate(sp):
+            figb.add_trace(go.Bar(x=history.years, y=spend[:, p_i], name=pol, marker_color=palette[p_i % len(palette)]))
+        figb.add_trace(go.Scatter(x=history.years, y=np.full(history.n, float(city_budget)), mode="lines",
+                                   name="Budget", line=dict(color="black", dash="dash")))
+        figb.update_layout(barmode="stack", height=260, xaxis_title="Year", yaxis_title="Allocated (USD)")
+        st.plotly_chart(figb, use_container_width=True)
+        span.stop()
+        over = spend[-1].sum() - city_budget
+        if over > 0.005 * city_budget:
+            st.warning(f"Per-capita floors pushed last year's allocation ${over:,.0f} ({100*over/city_budget:.1f}%) over "
+                       f"the budget. The capped allocation rule keeps spending within it.")
+
+    opt = st.session_state.get("sim_opt")
+    if opt is not None:
+        st.subheader("Budget-split optimizer")
+        best = opt.best
+        o1,o2,o3,o4,o5 = st.columns(5)
+        for col, pol in zip((o1,o2,o3,o4), sp):
+            with col: st.metric(pol.capitalize(), f"{best[pol]:.1f}%")
+        with o5: st.metric("Best score", f"{best['final_score']:.1f}")
+        st.caption(f"{opt.n_evaluated} splits simulated, {opt.n_pruned} pruned early, {opt.n_memo_hits} from memo. "
+                   f"Cost = total dollars actually allocated over the horizon (floors included).")
+        span = stage("figure: optimizer").start()
+        figo = px.scatter(opt.table[opt.table["feasible"]], x="cost", y="objective", color="city_budget",
+                          hover_data=list(sp) + ["final_score", "floor_pc"], opacity=0.5)
+        figo.add_trace(go.Scatter(x=opt.pareto["cost"], y=opt.pareto["objective"], mode="lines+markers",
+                                  name="Pareto front", line=dict(color="black")))
+        figo.update_layout(height=340, xaxis_title="Cost (USD over horizon)", yaxis_title="Objective score")
+        st.plotly_chart(figo, use_container_width=True)
+        span.stop()
+        st.dataframe(opt.pareto, hide_index=True)
+
+    sa = st.session_state.get("sim_sa")
+    if sa is not None:
+        st.subheader("Sensitivity analysis")
+        st.caption(f"{sa.method.capitalize()}: {sa.samples:,} runs in {sa.seconds:.1f} s. Bars show the final-year "
+                   f"output with one factor at the low / high end of its range and the rest at their current values; "
+                   f"factors are ordered by {sa.index_name}.")
+        sa_target = st.selectbox("Output", ["Citywide score"] + sa.zips, key="sa_target",
+                                 help="A ZIP's output is its own composite (the score's level terms, no equity term).")
+        sa_zip = None if sa_target == "Citywide score" else sa_target
+        span = stage("figure: sensitivity").start()
+        tf = sa.tornado_frame(sa_zip).head(12).iloc[::-1]
+        figt = go.Figure()
+        for end, color in (("low", palette[1]), ("high", palette[2])):
+            figt.add_trace(go.Bar(y=tf["factor"], x=tf[end] - tf["base"], base=tf["base"], orientation="h",
+                                  name=f"at {end}", marker_color=color))
+        figt.update_layout(barmode="overlay", height=40 + 28 * len(tf), xaxis_title="Final-year output",
+                           margin=dict(l=10, r=10, t=10, b=40))
+        st.plotly_chart(figt, use_container_width=True)
+        span.stop()
+        st.dataframe((sa.table if sa_zip is None else sa.zip_table(sa_zip)).round(4), hide_index=True)
+
+    bt = st.session_state.get("sim_backtest")
+    if bt is not None:
+        st.subheader("Historical backtest")
+        bt_runs = [("Calibrated", bt.after), ("Uncalibrated", bt.before)] if hasattr(bt, "after") else [("Model", bt)]
+        first = bt_runs[-1][1]
+        st.caption(f"Origins {', '.join(map(str, first.origins))}; projections scored against every later observation "
+                   f"({int(first.indicators['n'].sum()):,} points) in {bt.seconds:.2f} s"
+                   + (f", {bt.candidates} parameter sets replayed." if hasattr(bt, "after") else ".")
+                   + " Persistence holds each indicator at its origin value; skill > 0 beats it.")
+        cols = st.columns(len(bt_runs) + 1)
+        for col, (name, r) in zip(cols, bt_runs):
+            with col: st.metric(f"{name} RMSE", f"{r.rmse:.4f}")
+        with cols[-1]: st.metric("Persistence RMSE", f"{np.nanmean(first.indicators['persistence_rmse']):.4f}")
+        if hasattr(bt, "after"):
+            st.caption(f"Calibrated effect multiplier {bt.eff_mult:.2f}; slope scales "
+                       + ", ".join(f"{k} ×{v:.1f}" for k, v in zip(bt.after.indicators["indicator"], bt.slope_scale)))
+        span = stage("figure: backtest").start()
+        figb = go.Figure()
+        figb.add_trace(go.Bar(x=first.indicators["indicator"], y=first.indicators["persistence_rmse"],
+                              name="Persistence", marker_color="lightgray"))
+        for (name, r), color in zip(bt_runs[::-1], palette):
+            figb.add_trace(go.Bar(x=r.indicators["indicator"], y=r.indicators["rmse"], name=name, marker_color=color))
+        figb.update_layout(barmode="group", height=320, yaxis_title="RMSE", margin=dict(l=10, r=10, t=10, b=40))
+        st.plotly_chart(figb, use_container_width=True)
+        span.stop()
+        final = bt_runs[0][1]
+        st.dataframe(final.indicators.round(4), hide_index=True)
+        st.caption("Largest per-ZIP errors")
+        st.dataframe(final.by_zip.sort_values("rmse", ascending=False).head(50).round(4), hide_index=True)
+
+    # Grid map with year selector
+    st.subheader("ZIP Map (risk = red, improvement = green)")
+    available_years = []
+    if history.n:
+        available_years = sorted(set(history.years.tolist()))
+    else:
+        available_years = [start_year - 1]
+    m1, m2, m3 = st.columns([2, 2, 3])
+    with m1: year_to_show = st.selectbox("Year to show", available_years, index=len(available_years)-1)
+    with m2: map_style = st.radio("Map", ["Tile grid", "Choropleth"], horizontal=True)
+    geo_tiers = [t for t in GEO_TIERS if geo_tier_path(t).exists()]
+    if map_style == "Choropleth" and not geo_tiers:
+        st.caption("No simplified geometry found (run `python -m clinicsim geo build`); showing the tile grid.")
+        map_style = "Tile grid"
+    if map_style == "Choropleth":
+        with m3: geo_tier = st.select_slider("Geometry detail", options=geo_tiers, value=geo_tiers[len(geo_tiers)//2])
+
+    if history.n:
+        block = history.snapshot(year_to_show)
+        if block is None:
+            block = history.snapshot(available_years[-1])
+        map_values, map_pop = block[:, :len(INDICATORS)], block[:, FIELD_POS["population"]]
+    else:
+        arr_now = st.session_state.sim_states.to_arrays()
+        map_values, map_pop = arr_now.values, arr_now.population
+
+    # Layout / geometry and figures are built once per session; a year change only swaps the
+    # per-ZIP arrays (read straight from the history block)
+    span = stage(f"figure: map ({map_style.lower()})").start()
+    if map_style == "Tile grid":
+        grid = grid_layout(zips)
+        if st.session_state.get("grid_fig_layout") is not grid:
+            st.session_state.grid_fig_layout, st.session_state.grid_fig = grid, grid_figure(grid)
+        figm = update_grid_figure(st.session_state.grid_fig, map_values, map_pop)
+    else:
+        figs = st.session_state.setdefault("choro_figs", {})
+        if geo_tier not in figs:
+            figs[geo_tier] = choropleth_figure(load_geo_tier(geo_tier), zips)
+        figm = update_choropleth(figs[geo_tier], map_values)
+    st.plotly_chart(figm, use_container_width=True)
+    span.stop()
+
+    # Drilldown
+    st.subheader("ZIP Drilldown")
+    selected_zip = st.selectbox("Choose ZIP", zips)
+    if selected_zip:
+        if history.n:
+            zhist = history.zip_frame(selected_zip)
+        else:
+            zhist = pd.DataFrame([{"year": start_year-1, "zip": selected_zip, **st.session_state.sim_states.state(selected_zip)}])
+        cols = ["year"] + [n for n,_,_ in INDICATORS] + [c for c in zhist.columns if c.startswith("pc_")] + ["events"]
+        cols = [c for c in cols if c in zhist.columns]
+        st.dataframe(zhist[cols].sort_values("year"), hide_index=True)
+
+        if not zhist.empty:
+            span = stage("figure: drilldown").start()
+            figz = go.Figure()
+            for name,_,_ in INDICATORS:
+                figz.add_trace(go.Scatter(x=zhist["year"], y=zhist[name], mode="lines+markers", name=name))
+            figz.update_layout(height=360, xaxis_title="Year", yaxis_title="Value (0-1)")
+            st.plotly_chart(figz, use_container_width=True)
+            span.stop()
+
+    # Export
+    st.subheader("Export Results")
+    if history.n or ens is not None:
+        # Files are encoded chunk by chunk only when a button is clicked (deferred callables, no rerun)
+        formats = export_formats()
+        ex_fmt = st.selectbox("Format", list(formats), index=list(formats).index("csv.gz"),
+                              format_func=lambda k: f"{formats[k][0]} ({formats[k][1]})", key="export_fmt",
+                              help="Parquet stores values as float32 with dictionary-encoded ZIPs; the partitioned "
+                                   "layout is a .zip of year=YYYY/ folders.")
+        label, suffix, mime = formats[ex_fmt]
+        ex1, ex2 = st.columns(2)
+        if history.n:
+            frames = lambda n=history.n, h=history: h.iter_frames(h.chunk_years(), stop=n)
+            ex1.download_button(f"⬇️ Simulated years ({history.n} × {len(history.zips)} ZIPs)",
+                                data=lambda f=frames, fmt=ex_fmt: export_file(f(), fmt),
+                                file_name=f"health_policy_simulation_results_stable{suffix}", mime=mime, on_click="ignore")
+        if ens is not None:
+            ex2.download_button(f"⬇️ Ensemble bands ({len(ens.years)} years, P{'/P'.join(f'{q:g}' for q in ens.percentiles)})",
+                                data=lambda e=ens, fmt=ex_fmt: export_file(e.iter_zip_frames(), fmt),
+                                file_name=f"health_policy_ensemble_bands{suffix}", mime=mime, on_click="ignore")
+    else:
+        st.caption("Run at least one simulated year (or an ensemble) to enable export.")
+
+    # Sessions: time to first interactive / ready, and the state this session holds beyond the shared caches
+    shared_objs = (table0, arr0, hist_df, index_df)
+    if "bytes" not in perf:
+        perf["bytes"] = session_nbytes(st.session_state.to_dict(), shared=shared_objs)
+        SESSIONS.append(dict(perf))
+    with st.sidebar.expander("Warm-up & sessions"):
+        if WARMUP.error:
+            st.caption(f"Warm-up failed ({WARMUP.error}); sessions load inline.")
+        elif WARMUP.ready and WARMUP.times:
+            st.caption(f"warm-up {WARMUP.seconds:.2f} s: " + " · ".join(f"{k} {1000*v:.0f} ms" for k, v in WARMUP.times.items()))
+        st.caption(f"this session: controls after {1000*perf['ttfi_s']:.0f} ms, baseline after {1000*perf['ready_s']:.0f} ms "
+                   f"({'warm' if perf['warm'] else 'waited for the warm-up'}); own state {perf['bytes']/2**20:.2f} MB on first run")
+        if st.button("Measure session state now"):
+            st.caption(f"own state now {session_nbytes(st.session_state.to_dict(), shared=shared_objs)/2**20:.2f} MB")
+        summ = session_summary()
+        if summ:
+            st.caption(f"{summ['sessions']} sessions in this process: first interactive p50 {1000*summ['ttfi_p50_s']:.0f} / "
+                       f"p95 {1000*summ['ttfi_p95_s']:.0f} ms, ready p50 {1000*summ['ready_p50_s']:.0f} / "
+                       f"p95 {1000*summ['ready_p95_s']:.0f} ms, state mean {summ['session_mb_mean']:.2f} / "
+                       f"max {summ['session_mb_max']:.2f} MB")
+
+    # Performance (opt-in): stage timings of this process, rendered last so this rerun is included
+    rerun_span.stop()
+    with st.sidebar.expander("Performance"):
+        st.caption(f"Stage timings are {'on' if PROFILER.enabled else 'off'} for this server"
+                   f"{' (allocations tracked)' if PROFILER.memory else ''}; the buttons switch them for every session.")
+        st.button("⏹️ Stop recording" if PROFILER.enabled else "⏺️ Record stage timings", key="perf_toggle",
+                  on_click=toggle_profiling,
+                  help="Wall time and call counts per pipeline stage and figure, for every session of this server.")
+        st.button("Stop tracking allocations" if PROFILER.memory else "Track allocations (tracemalloc, slower)",
+                  key="perf_mem_toggle", on_click=toggle_alloc_tracking, disabled=not PROFILER.enabled)
+        prof_rows = PROFILER.rows()
+        if prof_rows:
+            st.dataframe(pd.DataFrame(prof_rows).round(2), hide_index=True)
+            meta = {"units": len(zips), "years_run": history.n, "engine": engine_mode, "rule": alloc_rule}
+            st.download_button("⬇️ Timings (JSON)", data=lambda: PROFILER.to_json(meta), file_name="clinicsim-profile.json",
+                               mime="application/json")
+            st.download_button("⬇️ Chrome trace", data=PROFILER.to_chrome_trace, file_name="clinicsim-trace.json",
+                               mime="application/json", help="Open in chrome://tracing or ui.perfetto.dev")
+            base = st.file_uploader("Compare with an earlier timings JSON", type=["json"], key="perf_base")
+            if base is not None:
+                try:
+                    cmp = pd.DataFrame(compare_profiles(base.getvalue().decode("utf-8"), PROFILER.to_json(meta)))
+                    st.dataframe(cmp.round(3), hide_index=True)
+                except (ValueError, KeyError) as e:
+                    st.caption(f"Could not compare: {e}")
+            if st.button("Reset timings"):
+                PROFILER.reset()
+        elif PROFILER.enabled:
+            st.caption("Recording; stages appear after the next rerun.")
+finally:
+    rerun_span.stop()      # also on st.stop(), exceptions and interrupted reruns
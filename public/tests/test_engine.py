@@ -0,0 +1,94 @@
+# tests/test_engine.py — array engine against the dict engine, and StateTable persistence
+#
+#   cd public && python -m pytest -q tests
+
+import pickle
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from clinicsim.model import E_MAX_BASE, PC50_BASE, simulate_one_year
+from clinicsim.engine import (
+    StateArrays, StateTable, arrays_to_states, run_horizon, simulate_one_year_arrays,
+    slopes_to_matrix, states_to_arrays,
+)
+from clinicsim.synthetic import make_engine_state
+
+SPLITS = {"clinics": 25, "campaigns": 35, "jobs": 30, "equity": 10}
+YEARS = 6
+
+
+def engine_kwargs(n_units, events_on=True):
+    # budget scales with units so per-capita spending stays comparable to the 95-ZIP city
+    return dict(city_budget=30_000_000 * n_units / 95, splits=SPLITS, floor_pc=30.0,
+                E_MAX=E_MAX_BASE, PC50=PC50_BASE, events_on=events_on, eff_mult=1.0)
+
+
+@pytest.mark.parametrize("seed", [0, 7, 2025])
+def test_array_engine_matches_dict_engine_with_events(seed):
+    zips, states, slopes = make_engine_state(60, seed)
+    kw = engine_kwargs(len(zips))
+    arr, sl_mat = states_to_arrays(states, zips), slopes_to_matrix(slopes, zips)
+    rng_d, rng_a = random.Random(seed), random.Random(seed)
+    fired = 0
+    for year in range(2025, 2025 + YEARS):
+        states, df_d, score_d = simulate_one_year(year, states, slopes, rng=rng_d, **kw)
+        arr, out, score_a = simulate_one_year_arrays(year, arr, sl_mat, rng=rng_a, **kw)
+        ref = states_to_arrays(states, zips)
+        np.testing.assert_allclose(arr.values, ref.values, rtol=0, atol=1e-12)
+        np.testing.assert_allclose(arr.population, ref.population, rtol=1e-12)
+        assert score_a == score_d
+        df_a = out.to_frame()
+        assert df_a["events"].tolist() == df_d["events"].tolist()
+        pc_cols = [c for c in df_d.columns if c.startswith("pc_")]
+        np.testing.assert_allclose(df_a[pc_cols].to_numpy(float), df_d[pc_cols].to_numpy(float), rtol=1e-12)
+        fired += int(out.events.sum())
+    assert fired > 0                                  # events really were drawn
+    assert rng_a.getstate() == rng_d.getstate()       # and in the same order
+
+
+@pytest.mark.parametrize("events_on", [True, False])
+def test_run_horizon_matches_year_by_year(events_on):
+    zips, states, slopes = make_engine_state(40, 3)
+    kw = engine_kwargs(len(zips), events_on)
+    arr0, sl_mat = states_to_arrays(states, zips), slopes_to_matrix(slopes, zips)
+
+    arr, frames, scores, rng = arr0, [], [], random.Random(11)
+    for year in range(2025, 2025 + YEARS):
+        arr, out, score = simulate_one_year_arrays(year, arr, sl_mat, rng=rng, **kw)
+        frames.append(out.to_frame()); scores.append(score)
+
+    rng_h = random.Random(11)
+    final, df, by_year = run_horizon(arr0, sl_mat, YEARS, 2025, rng=rng_h, **kw)
+    np.testing.assert_array_equal(final.values, arr.values)
+    np.testing.assert_array_equal(final.population, arr.population)
+    assert [r["score"] for r in by_year] == scores
+    assert [r["year"] for r in by_year] == list(range(2025, 2025 + YEARS))
+    pd.testing.assert_frame_equal(df.reset_index(drop=True), pd.concat(frames, ignore_index=True), check_dtype=False)
+    assert rng_h.getstate() == rng.getstate()
+
+
+def test_state_table_bytes_round_trip():
+    zips, states, _ = make_engine_state(25, 5)
+    table = StateTable.from_states(states, zips)
+    back = StateTable.from_bytes(table.to_bytes())
+    assert back.zips == table.zips
+    np.testing.assert_array_equal(back.values, table.values)
+    np.testing.assert_array_equal(back.population, table.population)
+    assert back.to_states() == states
+    assert back.state(zips[3]) == states[zips[3]]
+    assert not back.values.flags.writeable
+
+
+def test_state_table_pickle_and_replace():
+    zips, states, _ = make_engine_state(25, 6)
+    table = StateTable.from_states(states, zips)
+    back = pickle.loads(pickle.dumps(table))
+    assert back.to_states() == table.to_states()
+
+    stepped = StateArrays(list(zips), table.values + 0.01, table.population * 2)
+    nxt = table.replace(stepped)
+    assert nxt.zips is table.zips                     # ZIP list shared, not copied
+    assert arrays_to_states(nxt.to_arrays()) == arrays_to_states(stepped)
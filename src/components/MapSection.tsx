@@ -1,11 +1,21 @@
 
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { MapPin, Layers, Info, Download, X, Calendar } from 'lucide-react';
 import { useToast } from '@/hooks/use-toast';
+import ZctaChoropleth, { COLOR_SCALES } from './ZctaChoropleth';
+
+// Per-year values written by `python -m clinicsim geo values` (public/geo/zcta.values.json)
+interface MapValues {
+  label: string;
+  years: number[];
+  values: Record<string, Record<string, number>>;
+}
 
 const MapSection = () => {
   const [activeView, setActiveView] = useState('interactive');
   const [selectedYear, setSelectedYear] = useState('2025');
+  const [mapYear, setMapYear] = useState('predicted');
+  const [mapValues, setMapValues] = useState<MapValues | null>(null);
   const [showMapGuide, setShowMapGuide] = useState(false);
   const { toast } = useToast();
 
@@ -23,6 +33,21 @@ const MapSection = () => {
     });
   };
 
+  useEffect(() => {
+    let cancelled = false;
+    fetch('/geo/zcta.values.json')
+      .then((res) => (res.ok ? res.json() : null))
+      .then((data: MapValues | null) => !cancelled && setMapValues(data))
+      .catch(() => !cancelled && setMapValues(null)); // no file: the map keeps the predicted 2025 index
+    return () => {
+      cancelled = true;
+    };
+  }, []);
+
+  const yearValues = mapYear === 'predicted' ? undefined : mapValues?.values[mapYear];
+  // Simulated years are health index ×100 (higher = better); the predicted index runs the other way
+  const scale = activeView === 'interactive' && yearValues ? 'health' : 'equity';
+
   const staticMapImages = {
     '2025': '/lovable-uploads/5895107d-8b66-4021-bae1-08e53eff8c9e.png',
     '2026': '/lovable-uploads/680b5d59-8680-40c4-95ab-874e5292452d.png'
@@ -72,14 +97,27 @@ const MapSection = () => {
               <div className="flex items-center space-x-3">
                 <div className="flex items-center space-x-2">
                   <Calendar className="w-4 h-4 text-gray-600" />
-                  <select
-                    value={selectedYear}
-                    onChange={(e) => setSelectedYear(e.target.value)}
-                    className="border border-gray-300 rounded-lg px-3 py-1 text-sm focus:outline-none focus:ring-2 focus:ring-blue-500"
-                  >
-                    <option value="2025">2025</option>
-                    <option value="2026">2026</option>
-                  </select>
+                  {activeView === 'interactive' ? (
+                    <select
+                      value={mapYear}
+                      onChange={(e) => setMapYear(e.target.value)}
+                      className="border border-gray-300 rounded-lg px-3 py-1 text-sm focus:outline-none focus:ring-2 focus:ring-blue-500"
+                    >
+                      <option value="predicted">2025 (predicted)</option>
+                      {mapValues?.years.map((y) => (
+                        <option key={y} value={String(y)}>{`${y} (simulated)`}</option>
+                      ))}
+                    </select>
+                  ) : (
+                    <select
+                      value={selectedYear}
+                      onChange={(e) => setSelectedYear(e.target.value)}
+                      className="border border-gray-300 rounded-lg px-3 py-1 text-sm focus:outline-none focus:ring-2 focus:ring-blue-500"
+                    >
+                      <option value="2025">2025</option>
+                      <option value="2026">2026</option>
+                    </select>
+                  )}
                 </div>
                 <button 
                   onClick={() => setShowMapGuide(true)}
@@ -102,10 +140,12 @@ const MapSection = () => {
           <div className="relative">
             {activeView === 'interactive' ? (
              <div className="h-96 md:h-[600px]">
-                <iframe
-                  src="/interactive_predicted_index_map_2025.html"
-                  title="Predicted Health Equity Map 2025"
-                  className="w-full h-full border-0 rounded-b-2xl"
+                <ZctaChoropleth
+                  tier="z9"
+                  values={yearValues}
+                  valueLabel={yearValues ? `${mapValues?.label} ${mapYear}` : undefined}
+                  scale={scale}
+                  className="w-full h-full"
                 />
               </div>
             ) : (
@@ -120,20 +160,19 @@ const MapSection = () => {
 
             {/* Legend */}
             <div className="absolute bottom-4 right-4 bg-white p-4 rounded-lg shadow-lg border border-gray-200">
-              <h4 className="text-sm font-semibold text-gray-900 mb-3">Health Equity Index</h4>
+              <h4 className="text-sm font-semibold text-gray-900 mb-3">
+                {scale === 'health' ? `${mapValues?.label} ${mapYear}` : 'Health Equity Index'}
+              </h4>
               <div className="space-y-2">
-                <div className="flex items-center space-x-2">
-                  <div className="w-4 h-4 bg-white border-2 border-gray-300 rounded"></div>
-                  <span className="text-sm text-gray-600">High Equity (0.0–19.9)</span>
-                </div>
-                <div className="flex items-center space-x-2">
-                  <div className="w-4 h-4 bg-pink-200 rounded"></div>
-                  <span className="text-sm text-gray-600">Medium Equity (20.0–49.9)</span>
-                </div>
-                <div className="flex items-center space-x-2">
-                  <div className="w-4 h-4 bg-red-500 rounded"></div>
-                  <span className="text-sm text-gray-600">Low Equity (50.0-100.0)</span>
-                </div>
+                {COLOR_SCALES[scale].map((bin) => (
+                  <div key={bin.label} className="flex items-center space-x-2">
+                    <div
+                      className={`w-4 h-4 rounded ${bin.color === '#ffffff' ? 'border-2 border-gray-300' : ''}`}
+                      style={{ backgroundColor: bin.color }}
+                    ></div>
+                    <span className="text-sm text-gray-600">{bin.label}</span>
+                  </div>
+                ))}
               </div>
             </div>
           </div>
@@ -0,0 +1,206 @@
+import React, { useEffect, useMemo, useRef, useState } from 'react';
+
+// Simplified ZCTA geometry written by `python -m clinicsim geo build` (public/geo/zcta.<tier>.topo.json)
+type Tier = 'z7' | 'z9' | 'z11';
+
+interface TopoGeometry {
+  type: 'Polygon' | 'MultiPolygon';
+  id: string;
+  arcs: number[][] | number[][][];
+  properties: Record<string, number | string>;
+}
+
+interface Topology {
+  transform: { scale: [number, number]; translate: [number, number] };
+  objects: { zcta: { geometries: TopoGeometry[] } };
+  arcs: number[][][];
+}
+
+interface ZctaChoroplethProps {
+  tier?: Tier;
+  values?: Record<string, number>; // ZIP -> index value; defaults to the predicted 2025 index
+  valueLabel?: string;
+  scale?: ColorScale;
+  className?: string;
+}
+
+const WIDTH = 1000;
+const HEIGHT = 600;
+
+// Colour bins per value orientation: 'equity' (predicted index, higher = worse) and
+// 'health' (simulated health index ×100, higher = better). MapSection draws its legend from these.
+export type ColorScale = 'equity' | 'health';
+
+export const COLOR_SCALES: Record<ColorScale, { below: number; color: string; label: string }[]> = {
+  equity: [
+    { below: 20, color: '#ffffff', label: 'High Equity (0.0–19.9)' },
+    { below: 50, color: '#fbcfe8', label: 'Medium Equity (20.0–49.9)' },
+    { below: Infinity, color: '#ef4444', label: 'Low Equity (50.0–100.0)' },
+  ],
+  health: [
+    { below: 30, color: '#ef4444', label: 'Lower Health (0.0–29.9)' },
+    { below: 60, color: '#fde68a', label: 'Middle Health (30.0–59.9)' },
+    { below: Infinity, color: '#22c55e', label: 'Higher Health (60.0–100.0)' },
+  ],
+};
+
+const colorFor = (value: number | undefined, scale: ColorScale) => {
+  if (value === undefined || Number.isNaN(value)) return '#e5e7eb';
+  return COLOR_SCALES[scale].find((bin) => value < bin.below)!.color;
+};
+
+const decodeArcs = (topo: Topology) => {
+  const [sx, sy] = topo.transform.scale;
+  const [tx, ty] = topo.transform.translate;
+  return topo.arcs.map((arc) => {
+    let x = 0;
+    let y = 0;
+    return arc.map(([dx, dy]) => {
+      x += dx;
+      y += dy;
+      return [x * sx + tx, y * sy + ty] as [number, number];
+    });
+  });
+};
+
+const ZctaChoropleth = ({
+  tier = 'z9',
+  values,
+  valueLabel = 'Predicted index 2025',
+  scale = 'equity',
+  className = '',
+}: ZctaChoroplethProps) => {
+  const [topo, setTopo] = useState<Topology | null>(null);
+  const [error, setError] = useState<string | null>(null);
+  const [hover, setHover] = useState<{ zip: string; value?: number; x: number; y: number } | null>(null);
+  const [view, setView] = useState({ x: 0, y: 0, w: WIDTH, h: HEIGHT });
+  const drag = useRef<{ x: number; y: number } | null>(null);
+  const svgRef = useRef<SVGSVGElement>(null);
+
+  useEffect(() => {
+    let cancelled = false;
+    fetch(`/geo/zcta.${tier}.topo.json`)
+      .then((res) => {
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        return res.json();
+      })
+      .then((data: Topology) => !cancelled && setTopo(data))
+      .catch((err) => !cancelled && setError(String(err)));
+    return () => {
+      cancelled = true;
+    };
+  }, [tier]);
+
+  // Project once per geometry file: equirectangular scaled by cos(mean latitude), fit to the viewBox
+  const shapes = useMemo(() => {
+    if (!topo) return [];
+    const arcs = decodeArcs(topo);
+    const ring = (refs: number[]) => {
+      const pts: [number, number][] = [];
+      refs.forEach((r) => {
+        const seg = r >= 0 ? arcs[r] : [...arcs[~r]].reverse();
+        pts.push(...(pts.length ? seg.slice(1) : seg));
+      });
+      return pts;
+    };
+    const geoms = topo.objects.zcta.geometries.map((g) => ({
+      id: g.id,
+      properties: g.properties,
+      rings: (g.type === 'Polygon' ? [g.arcs as number[][]] : (g.arcs as number[][][])).flatMap((poly) => poly.map(ring)),
+    }));
+    const all = geoms.flatMap((g) => g.rings.flat());
+    const lat0 = (all.reduce((s, p) => s + p[1], 0) / all.length) * (Math.PI / 180);
+    const xs = all.map((p) => p[0] * Math.cos(lat0));
+    const ys = all.map((p) => p[1]);
+    const [minX, maxX, minY, maxY] = [Math.min(...xs), Math.max(...xs), Math.min(...ys), Math.max(...ys)];
+    const k = 0.95 * Math.min(WIDTH / (maxX - minX), HEIGHT / (maxY - minY));
+    const ox = (WIDTH - k * (maxX - minX)) / 2;
+    const oy = (HEIGHT - k * (maxY - minY)) / 2;
+    return geoms.map((g) => ({
+      id: g.id,
+      properties: g.properties,
+      d: g.rings
+        .map(
+          (r) =>
+            'M' +
+            r.map(([lon, lat]) => `${(ox + k * (lon * Math.cos(lat0) - minX)).toFixed(1)},${(oy + k * (maxY - lat)).toFixed(1)}`).join('L') +
+            'Z'
+        )
+        .join(''),
+    }));
+  }, [topo]);
+
+  const valueOf = (s: (typeof shapes)[number]) =>
+    values ? values[s.id] : (s.properties.predicted_index_2025 as number | undefined);
+
+  const onWheel = (e: React.WheelEvent<SVGSVGElement>) => {
+    const rect = svgRef.current?.getBoundingClientRect();
+    if (!rect) return;
+    const f = e.deltaY > 0 ? 1.15 : 1 / 1.15;
+    const px = view.x + ((e.clientX - rect.left) / rect.width) * view.w;
+    const py = view.y + ((e.clientY - rect.top) / rect.height) * view.h;
+    const w = Math.min(WIDTH, Math.max(WIDTH / 20, view.w * f));
+    const h = (w * HEIGHT) / WIDTH;
+    setView({ x: px - ((px - view.x) * w) / view.w, y: py - ((py - view.y) * h) / view.h, w, h });
+  };
+
+  const onMouseMove = (e: React.MouseEvent<SVGSVGElement>) => {
+    if (!drag.current) return;
+    const rect = svgRef.current?.getBoundingClientRect();
+    if (!rect) return;
+    const dx = ((e.clientX - drag.current.x) / rect.width) * view.w;
+    const dy = ((e.clientY - drag.current.y) / rect.height) * view.h;
+    drag.current = { x: e.clientX, y: e.clientY };
+    setView((v) => ({ ...v, x: v.x - dx, y: v.y - dy }));
+  };
+
+  if (error) {
+    return (
+      <div className={`flex items-center justify-center text-sm text-gray-500 ${className}`}>
+        Map geometry could not be loaded ({error}).
+      </div>
+    );
+  }
+
+  return (
+    <div className={`relative ${className}`}>
+      <svg
+        ref={svgRef}
+        viewBox={`${view.x} ${view.y} ${view.w} ${view.h}`}
+        className="w-full h-full bg-sky-50 cursor-grab active:cursor-grabbing"
+        onWheel={onWheel}
+        onMouseDown={(e) => (drag.current = { x: e.clientX, y: e.clientY })}
+        onMouseUp={() => (drag.current = null)}
+        onMouseLeave={() => {
+          drag.current = null;
+          setHover(null);
+        }}
+        onMouseMove={onMouseMove}
+      >
+        {shapes.map((s) => (
+          <path
+            key={s.id}
+            d={s.d}
+            fill={colorFor(valueOf(s), scale)}
+            stroke="#6b7280"
+            strokeWidth={0.6 * (view.w / WIDTH)}
+            onMouseMove={(e) => setHover({ zip: s.id, value: valueOf(s), x: e.clientX, y: e.clientY })}
+          />
+        ))}
+      </svg>
+      {hover && (
+        <div
+          className="fixed z-50 pointer-events-none bg-white border border-gray-200 rounded-lg shadow px-3 py-2 text-sm"
+          style={{ left: hover.x + 12, top: hover.y + 12 }}
+        >
+          <div className="font-semibold text-gray-900">ZIP {hover.zip}</div>
+          <div className="text-gray-600">
+            {valueLabel}: {hover.value === undefined ? 'n/a' : hover.value.toFixed(1)}
+          </div>
+        </div>
+      )}
+    </div>
+  );
+};
+
+export default ZctaChoropleth;
@@ -5,6 +5,7 @@ import DataTable from '../components/DataTable';
 import PredictionsTable from '../components/PredictionsTable';
 import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs";
 import { useToast } from '@/hooks/use-toast';
+import ZctaChoropleth from '../components/ZctaChoropleth';
 
 const Data = () => {
   const [showMapGuide, setShowMapGuide] = useState(false);
@@ -240,11 +241,7 @@ const Data = () => {
 
               <div className="relative">
                 <div className="h-96 md:h-[600px]">
-                  <iframe
-                    src="/interactive_predicted_index_map_2025.html"
-                    title="Predicted Health Equity Map 2025"
-                    className="w-full h-full border-0 rounded-b-2xl"
-                  />
+                  <ZctaChoropleth tier="z9" className="w-full h-full" />
                 </div>
 
                 {/* Legend */}